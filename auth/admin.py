@@ -0,0 +1,17 @@
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+from core.config_loader import settings
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    """Whether a key matches ADMIN_API_KEY (never, while it's not configured)"""
+    return bool(settings.ADMIN_API_KEY and key) and secrets.compare_digest(key, settings.ADMIN_API_KEY)
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    """Dependency for operator endpoints: requires the X-Admin-Key header"""
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
@@ -0,0 +1,85 @@
+"""
+Password hashing calibration: measure hashing time on this host and pick the cost meeting a latency target.
+
+Usage (from the project root, on the hardware the API runs on):
+    python -m auth.calibrate
+    python -m auth.calibrate --target-ms 250 --scheme argon2
+
+Prints the settings to put in the environment. Every login pays one verification at that cost, so the
+target bounds login latency and how many logins a worker can serve per second. Existing hashes move to
+the new cost as their owners log in.
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2, bcrypt
+
+PASSWORD = "calibration-password"
+BCRYPT_ROUNDS = range(10, 17)  # Below 10, offline guessing gets too cheap
+ARGON2_TIME_COSTS = range(2, 9)
+
+
+def measure(handler, samples: int) -> float:
+    """Median milliseconds to hash (and so to verify) a password with an already configured handler"""
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(PASSWORD)
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int) -> dict:
+    chosen, measurements = None, []
+    for rounds in BCRYPT_ROUNDS:
+        elapsed = measure(bcrypt.using(rounds=rounds), samples)
+        measurements.append((f"rounds={rounds}", elapsed))
+        if elapsed > target_ms:
+            break  # Each round doubles the time: higher costs are slower still
+        chosen = rounds
+    settings = {"PASSWORD_HASH_SCHEME": "bcrypt", "BCRYPT_ROUNDS": chosen or BCRYPT_ROUNDS[0]}
+    return {"settings": settings, "measurements": measurements, "met": chosen is not None}
+
+
+def calibrate_argon2(target_ms: float, samples: int, memory_kib: int, parallelism: int) -> dict:
+    chosen, measurements = None, []
+    for time_cost in ARGON2_TIME_COSTS:
+        handler = argon2.using(rounds=time_cost, memory_cost=memory_kib, parallelism=parallelism)
+        elapsed = measure(handler, samples)
+        measurements.append((f"time_cost={time_cost} memory={memory_kib}KiB", elapsed))
+        if elapsed > target_ms:
+            break
+        chosen = time_cost
+    settings = {"PASSWORD_HASH_SCHEME": "argon2", "ARGON2_TIME_COST": chosen or ARGON2_TIME_COSTS[0],
+                "ARGON2_MEMORY_KIB": memory_kib, "ARGON2_PARALLELISM": parallelism}
+    return {"settings": settings, "measurements": measurements, "met": chosen is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the password hashing cost meeting a latency target on this host")
+    parser.add_argument("--target-ms", type=float, default=250, help="Milliseconds one login may spend hashing")
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--samples", type=int, default=5, help="Hashes measured per cost (the median counts)")
+    parser.add_argument("--argon2-memory-kib", type=int, default=65536, help="Memory per argon2 hash")
+    parser.add_argument("--argon2-parallelism", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.scheme == "argon2":
+        if not argon2.has_backend():
+            raise SystemExit("argon2 needs the argon2-cffi package: pip install argon2-cffi")
+        result = calibrate_argon2(args.target_ms, args.samples, args.argon2_memory_kib, args.argon2_parallelism)
+    else:
+        result = calibrate_bcrypt(args.target_ms, args.samples)
+
+    for cost, elapsed in result["measurements"]:
+        print(f"{args.scheme} {cost}: {elapsed:.1f} ms")
+    if not result["met"]:
+        print(f"Even the lowest cost takes over {args.target_ms:g} ms here; using it anyway")
+    print()
+    for name, value in result["settings"].items():
+        print(f"{name}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from core.config_loader import settings
+from database.connection import SessionLocal
+from models.refresh_token import RefreshToken
+
+# Refresh tokens live on the main database, next to the entity directory: requests refreshing a
+# session carry no access token to route them to a shard with.
+
+
+def hash_refresh_token(token: str) -> str:
+    """SHA-256 of a refresh token: they're random 256-bit secrets, so a fast hash is enough (no bcrypt)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _invalid_refresh_token():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _owner_filter(entity_id: int, manager_number: Optional[int]):
+    if manager_number is None:
+        return [RefreshToken.entity_id == entity_id, RefreshToken.manager_number.is_(None)]
+    return [RefreshToken.entity_id == entity_id, RefreshToken.manager_number == manager_number]
+
+
+def _add_token(directory: Session, entity_id: int, manager_number: Optional[int], family_id: str, now: datetime) -> str:
+    token = secrets.token_urlsafe(32)
+    directory.add(RefreshToken(
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        entity_id=entity_id,
+        manager_number=manager_number,
+        created_at=now,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+def _revoke_family(directory: Session, family_id: str, now: datetime):
+    directory.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+
+
+def issue_refresh_token(entity_id: int, manager_number: Optional[int] = None) -> str:
+    """Start a session for an entity (or one of its managers) after a password login"""
+    now = datetime.utcnow()
+    with SessionLocal() as directory:
+        # The owner's expired sessions go away here, through the owner index
+        directory.query(RefreshToken).filter(
+            *_owner_filter(entity_id, manager_number), RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+        token = _add_token(directory, entity_id, manager_number, secrets.token_hex(16), now)
+        directory.commit()
+    return token
+
+
+def rotate_refresh_token(token: str) -> Tuple[int, Optional[int], str]:
+    """
+    Exchange a refresh token for the next one of its session: (entity_id, manager_number, new token).
+    A token presented twice means it leaked (or the client replayed it): the session is revoked.
+    """
+    now = datetime.utcnow()
+    with SessionLocal() as directory:
+        record = directory.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+        if record is None or record.expires_at <= now:
+            raise _invalid_refresh_token()
+
+        # Claimed with a conditional update, so two concurrent refreshes can't both rotate it
+        claimed = directory.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == record.id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        ).rowcount
+        if not claimed:
+            _revoke_family(directory, record.family_id, now)
+            directory.commit()
+            raise _invalid_refresh_token()
+
+        entity_id, manager_number = record.entity_id, record.manager_number
+        new_token = _add_token(directory, entity_id, manager_number, record.family_id, now)
+        directory.commit()
+    return entity_id, manager_number, new_token
+
+
+def revoke_refresh_token(token: str) -> bool:
+    """Log out: revoke the session a refresh token belongs to. False if the token is unknown."""
+    now = datetime.utcnow()
+    with SessionLocal() as directory:
+        record = directory.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+        if record is None:
+            return False
+        _revoke_family(directory, record.family_id, now)
+        directory.commit()
+    return True
+
+
+def revoke_sessions(entity_id: int, manager_number: Optional[int] = None, all_managers: bool = False) -> int:
+    """
+    Revoke the sessions of a manager, of the entity itself, or (all_managers) of the entity and
+    every one of its managers. Access tokens already issued stay valid until they expire.
+    """
+    criteria = [RefreshToken.entity_id == entity_id] if all_managers else _owner_filter(entity_id, manager_number)
+    with SessionLocal() as directory:
+        revoked = directory.execute(
+            update(RefreshToken)
+            .where(*criteria, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        ).rowcount
+        directory.commit()
+    return revoked
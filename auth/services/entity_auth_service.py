@@ -1,17 +1,19 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from database.connection import get_db
 from models.entity import Entity
 from models.manager import Manager
-from auth.utils import ALGORITHM, verify_password, SECRET_KEY
+from auth.utils import ALGORITHM, verify_and_update_password, SECRET_KEY
 from auth.models.token import TokenData
 from core.config_loader import settings
+from core.batch import get_batch
 from datetime import datetime, timedelta
 from typing import Optional, Union
+import logging
 
 bearer_scheme = HTTPBearer()
+logger = logging.getLogger(__name__)
 
 
 def get_entity(db: Session, name: str):
@@ -45,12 +47,28 @@ def get_manager_by_entity_and_username(db: Session, entity_id: int, username: st
     ).first()
 
 
+def check_password(db: Session, account: Union[Entity, Manager], password: str) -> bool:
+    """Verify an account's password, storing a new hash when its scheme or cost is outdated"""
+    verified, new_hash = verify_and_update_password(password, str(account.hashed_password))
+    if verified and new_hash:
+        try:
+            account.hashed_password = new_hash
+            db.commit()
+            db.refresh(account)
+        except Exception as e:
+            # The login goes on: the hash will be upgraded on a later one
+            db.rollback()
+            db.refresh(account)
+            logger.warning(f"Couldn't rehash password of {type(account).__name__.lower()}: {e}")
+    return verified
+
+
 def authenticate_entity(db: Session, name: str, password: str):
     """Authenticate entity by name and password"""
     entity = get_entity(db, name)
     if not entity:
         return False
-    if not verify_password(password, str(entity.hashed_password)):
+    if not check_password(db, entity, password):
         return False
     return entity
 
@@ -60,7 +78,7 @@ def authenticate_manager(db: Session, username: str, password: str):
     manager = get_manager(db, username)
     if not manager:
         return False
-    if not verify_password(password, str(manager.hashed_password)):
+    if not check_password(db, manager, password):
         return False
     return manager
 
@@ -70,7 +88,7 @@ def authenticate_manager_by_entity(db: Session, entity_id: int, username: str, p
     manager = get_manager_by_entity_and_username(db, entity_id, username)
     if not manager:
         return False
-    if not verify_password(password, str(manager.hashed_password)):
+    if not check_password(db, manager, password):
         return False
     return manager
 
@@ -87,14 +105,17 @@ def create_access_token(subject: str, subject_type: str, entity_id: Optional[int
         "sub": str(subject),
         "type": subject_type  # "entity" or "manager"
     }
-    if subject_type == "manager" and entity_id is not None:
+    if entity_id is not None:
+        # Lets the database layer route the request to the entity's shard
         to_encode["entity_id"] = entity_id
+    from jose import jwt  # Imported on first use: keeps it off the startup path
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def verify_token(token: str, credentials_exception):
     """Verify and decode JWT token"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         subject: str = payload.get("sub")
@@ -108,15 +129,30 @@ def verify_token(token: str, credentials_exception):
         raise credentials_exception
 
 
+def require_principal_type(batch, principal_type: str):
+    """Principal of a /batch request, if it's of the given type"""
+    user, user_type = batch.principal
+    if user_type != principal_type:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"{principal_type.capitalize()} access required"
+        )
+    return user
+
+
 def get_current_entity(token: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
     """Get current entity from JWT token"""
+    batch = get_batch()
+    if batch is not None:
+        return require_principal_type(batch, "entity")  # Resolved once by the /batch request
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_data, subject_type = verify_token(token.credentials, credentials_exception)
+    token_data, subject_type, _ = verify_token(token.credentials, credentials_exception)
 
     if subject_type != "entity":
         raise HTTPException(
@@ -132,6 +168,10 @@ def get_current_entity(token: HTTPAuthorizationCredentials = Depends(bearer_sche
 
 def get_current_manager(token: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
     """Get current manager from JWT token"""
+    batch = get_batch()
+    if batch is not None:
+        return require_principal_type(batch, "manager")  # Resolved once by the /batch request
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -152,15 +192,15 @@ def get_current_manager(token: HTTPAuthorizationCredentials = Depends(bearer_sch
     return manager
 
 
-def get_current_entity_or_manager(token: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
-    """Get current entity or manager from JWT token"""
+def get_principal(db: Session, credentials: str):
+    """Resolve a JWT token to (entity, "entity") or (manager, "manager")"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_data, subject_type, entity_id = verify_token(token.credentials, credentials_exception)
+    token_data, subject_type, entity_id = verify_token(credentials, credentials_exception)
 
     if subject_type == "entity":
         entity = get_entity(db, name=token_data.username)
@@ -176,6 +216,13 @@ def get_current_entity_or_manager(token: HTTPAuthorizationCredentials = Depends(
         raise credentials_exception
 
 
+def get_current_entity_or_manager(token: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)):
+    """Get current entity or manager from JWT token"""
+    batch = get_batch()
+    if batch is not None:
+        return batch.principal  # Resolved once by the /batch request
+    return get_principal(db, token.credentials)
+
 
 def get_current_active_manager(current_manager: Manager = Depends(get_current_manager)):
     """Get current active manager"""
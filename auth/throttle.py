@@ -0,0 +1,80 @@
+import math
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from core.config_loader import settings
+from core.local_store import get_local_store
+
+# (store key, burst capacity, tokens refilled per minute)
+Bucket = Tuple[str, float, float]
+
+
+def _take(value: Optional[str], now: float, capacity: float, per_minute: float, cost: float):
+    """Refill a bucket and take `cost` tokens if at least one is available"""
+    if value is None:
+        tokens, updated = capacity, now
+    else:
+        tokens, updated = (float(part) for part in value.split(":"))
+    tokens = min(capacity, tokens + (now - updated) * per_minute / 60)
+    if tokens < 1:
+        retry_after = (1 - tokens) * 60 / per_minute
+        return f"{tokens:.3f}:{now:.3f}", (False, retry_after)
+    tokens -= cost
+    return f"{tokens:.3f}:{now:.3f}", (True, 0.0)
+
+
+def _bucket_ttl(capacity: float, per_minute: float) -> float:
+    # Past this, a bucket is full again and can be forgotten
+    return capacity * 60 / per_minute + 60
+
+
+def client_ip(request: Request) -> str:
+    """Client address as seen by uvicorn (which applies trusted proxy headers)"""
+    return request.client.host if request.client else "unknown"
+
+
+def login_buckets(entity_name: str, username: Optional[str] = None) -> List[Bucket]:
+    """Failure buckets of a login: the account itself and, for managers, their whole entity"""
+    if username is None:
+        return [(f"login:entity:{entity_name}", settings.LOGIN_ACCOUNT_BURST, settings.LOGIN_ACCOUNT_PER_MINUTE)]
+    return [
+        (f"login:manager:{entity_name}:{username}", settings.LOGIN_ACCOUNT_BURST, settings.LOGIN_ACCOUNT_PER_MINUTE),
+        (f"login:managers:{entity_name}", settings.LOGIN_ENTITY_BURST, settings.LOGIN_ENTITY_PER_MINUTE),
+    ]
+
+
+def check_login_allowed(request: Request, buckets: List[Bucket]):
+    """
+    Reject a login attempt before any password hashing if it's being throttled.
+
+    Every attempt takes a token from its client IP bucket. Account and entity buckets are only
+    drained by failed attempts (record_login_failure), but an empty one blocks further attempts
+    until it refills. Buckets live in the local store, so with LOCAL_STORE_URL all workers of a
+    host share them.
+    """
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return
+    store, now = get_local_store(), time.time()
+    ip_bucket = (f"login:ip:{client_ip(request)}", settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE)
+    checks = [(ip_bucket, 1)] + [(bucket, 0) for bucket in buckets]
+
+    for (key, capacity, per_minute), cost in checks:
+        allowed, retry_after = store.update(
+            key, lambda value: _take(value, now, capacity, per_minute, cost), _bucket_ttl(capacity, per_minute))
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+def record_login_failure(buckets: List[Bucket]):
+    """Take a token from each account and entity bucket after a failed login"""
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return
+    store, now = get_local_store(), time.time()
+    for key, capacity, per_minute in buckets:
+        store.update(key, lambda value: _take(value, now, capacity, per_minute, 1), _bucket_ttl(capacity, per_minute))
@@ -1,8 +1,8 @@
-from passlib.context import CryptContext
+from typing import Optional, Tuple
 from core.config_loader import settings
 
-# Configuración para hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configuración para hashing de contraseñas (passlib se importa en el primer uso: acelera el arranque)
+_pwd_context = None
 
 # Constantes JWT
 SECRET_KEY = settings.JWT_SECRET_KEY
@@ -10,11 +10,41 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
+def get_pwd_context():
+    """
+    Contexto de hashing de passlib, creado en el primer uso.
+    Los hashes nuevos usan PASSWORD_HASH_SCHEME con el costo configurado; los de otro esquema o
+    costo quedan desactualizados (needs_update) y se rehashean en el próximo login.
+    """
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(
+            schemes=["bcrypt", "argon2"],  # argon2 necesita argon2-cffi, solo si se usa
+            default=settings.PASSWORD_HASH_SCHEME,
+            deprecated="auto",
+            bcrypt__rounds=settings.BCRYPT_ROUNDS,
+            bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+            bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+            argon2__rounds=settings.ARGON2_TIME_COST,
+            argon2__min_rounds=settings.ARGON2_TIME_COST,
+            argon2__max_rounds=settings.ARGON2_TIME_COST,
+            argon2__memory_cost=settings.ARGON2_MEMORY_KIB,
+            argon2__parallelism=settings.ARGON2_PARALLELISM,
+        )
+    return _pwd_context
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar si la contraseña en texto plano coincide con el hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verificar la contraseña y, si su hash está desactualizado, devolver uno nuevo para guardar"""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Generar hash de la contraseña"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
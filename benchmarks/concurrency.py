@@ -0,0 +1,254 @@
+"""
+Concurrency stress test: fire many concurrent clients at one project and count what goes wrong.
+
+Usage (from the project root, with the API running against a local database, e.g. `uvicorn main:app`):
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --base-url http://127.0.0.1:8000 --threads 32 --raffles 200
+    python benchmarks/concurrency.py --scenarios sell,buyers --threads 64
+
+It registers a throwaway entity with a few managers, a project and some buyers, then runs each scenario
+with all threads released at once:
+
+    sell    every thread tries to sell every ticket of a set, in its own order, to its own buyer.
+            Each ticket must be sold exactly once, to the buyer its one successful sale names.
+    buyers  threads create buyers in parallel (numbers come from MAX()+1 per entity).
+            Every create must succeed, with its own buyer number.
+    sets    threads create raffle sets in the same project (set and raffle numbers from MAX()+1).
+            Every create must succeed, and no two sets may share a set number or raffle numbers.
+
+Each scenario reports throughput, latency, response codes and its anomalies: double sells, lost or
+mismatched sales, primary key collisions (400 "already exists"), duplicate numbers and 5xx responses.
+Exits with status 1 when any anomaly was seen.
+"""
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+PASSWORD = "stress-password"
+COLLISION_DETAIL = "Record already exists or violates constraints"
+
+
+class Api:
+    """Thin client of the API; one per thread, as each keeps its own connections"""
+
+    def __init__(self, base_url: str, token: str = None, timeout: float = 60):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.http = httpx.Client(base_url=base_url, headers=headers, timeout=timeout)
+
+    def call(self, method: str, path: str, **kwargs):
+        """(status, JSON body or None, seconds); connection errors count as status 0"""
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            return 0, {"detail": str(e)}, time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, elapsed
+
+
+def expect(result, what: str):
+    status, body, _ = result
+    if status != 200:
+        raise SystemExit(f"Setup failed, {what}: {status} {body}")
+    return body
+
+
+class Fixture:
+    """A throwaway entity with managers, a project and buyers to stress"""
+
+    def __init__(self, args):
+        self.args = args
+        name = f"stress-{uuid.uuid4().hex[:10]}"
+        anonymous = Api(args.base_url)
+        expect(anonymous.call("POST", "/auth/entity/register", json={"name": name, "password": PASSWORD}),
+               "registering the entity")
+        self.entity_token = expect(anonymous.call("POST", "/auth/entity/login",
+                                                  data={"username": name, "password": PASSWORD}),
+                                   "logging in the entity")["access_token"]
+        entity = self.api()
+
+        self.manager_tokens = []
+        for number in range(1, args.managers + 1):
+            expect(entity.call("POST", "/auth/manager/register", json={"username": f"seller{number}",
+                                                                      "password": PASSWORD}),
+                   "registering a manager")
+            login = {"entity_name": name, "username": f"seller{number}", "password": PASSWORD}
+            self.manager_tokens.append(expect(anonymous.call("POST", "/auth/manager/login", json=login),
+                                              "logging in a manager")["access_token"])
+
+        self.project_number = expect(entity.call("POST", "/project", json={"name": "Stress test"}),
+                                     "creating the project")["project_number"]
+        manager = self.api(self.manager_tokens[0])
+        self.buyer_numbers = [expect(manager.call("POST", "/buyer", json=buyer_payload(f"seed-{index}")),
+                                     "creating a buyer")["buyer_number"]
+                              for index in range(args.threads)]
+        print(f"Entity {name}: {args.managers} managers, project {self.project_number}, "
+              f"{len(self.buyer_numbers)} buyers")
+
+    def api(self, token: str = None) -> Api:
+        return Api(self.args.base_url, token or self.entity_token, self.args.timeout)
+
+    def manager_api(self, worker: int) -> Api:
+        return self.api(self.manager_tokens[worker % len(self.manager_tokens)])
+
+
+def buyer_payload(label: str) -> dict:
+    return {"name": f"Buyer {label}", "phone": f"+54911{random.randrange(10 ** 7, 10 ** 8)}"}
+
+
+def run_workers(threads: int, work):
+    """Run work(worker) on every thread, released together; (results of all workers, seconds)"""
+    barrier = threading.Barrier(threads)
+
+    def start(worker: int):
+        barrier.wait()
+        return work(worker)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = [result for worker_results in pool.map(start, range(threads)) for result in worker_results]
+    return results, time.perf_counter() - started
+
+
+def report(name: str, calls: list, elapsed: float, anomalies: Counter):
+    statuses = Counter(status for status, _, _ in calls)
+    latencies = sorted(seconds for _, _, seconds in calls)
+    server_errors = sum(count for status, count in statuses.items() if status >= 500 or status == 0)
+    if server_errors:
+        anomalies["server errors (5xx or no response)"] += server_errors
+
+    print(f"\n[{name}] {len(calls)} requests in {elapsed:.2f}s: {len(calls) / elapsed:,.0f} req/s")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"  latency: median {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+    print(f"  responses: {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))}")
+    if anomalies:
+        for anomaly, count in anomalies.items():
+            print(f"  ANOMALY {anomaly}: {count}")
+    else:
+        print("  no anomalies")
+    return sum(anomalies.values())
+
+
+def scenario_sell(fixture: Fixture, args) -> int:
+    """Every thread sells every ticket of one set: each must end up sold exactly once"""
+    entity = fixture.api()
+    project = fixture.project_number
+    raffle_set = expect(entity.call("POST", f"/project/{project}/raffleset", json={
+        "name": "Sell race", "project_number": project, "type": "online", "quantity": args.raffles,
+        "unit_price": 100}), "creating the raffle set")
+    tickets = list(range(raffle_set["init"], raffle_set["final"] + 1))
+
+    def work(worker: int):
+        api = fixture.manager_api(worker)
+        order = tickets[:]
+        random.Random(worker).shuffle(order)
+        sale = {"buyer_number": fixture.buyer_numbers[worker], "payment_method": "cash"}
+        return [(ticket, sale["buyer_number"], api.call("POST", f"/project/{project}/raffle/{ticket}/sell",
+                                                        json=sale))
+                for ticket in order]
+
+    results, elapsed = run_workers(args.threads, work)
+    anomalies = Counter()
+    winners = defaultdict(list)
+    for ticket, buyer_number, (status, body, _) in results:
+        if status == 200:
+            winners[ticket].append(buyer_number)
+        elif status == 400 and body and body.get("detail") == COLLISION_DETAIL:
+            anomalies["primary key collisions"] += 1
+
+    for ticket in tickets:
+        sales = winners.get(ticket, [])
+        if len(sales) > 1:
+            anomalies["double sells (more than one 200 for a ticket)"] += 1
+        status, body, _ = entity.call("GET", f"/project/{project}/raffle/{ticket}")
+        if status != 200 or body["state"] != "sold":
+            anomalies["tickets left unsold"] += 1
+        elif not sales:
+            anomalies["sold tickets without a successful sale"] += 1
+        elif len(sales) == 1 and body["buyer_number"] != sales[0]:
+            anomalies["tickets sold to another buyer than the successful sale's"] += 1
+    return report("sell", [call for _, _, call in results], elapsed, anomalies)
+
+
+def scenario_buyers(fixture: Fixture, args) -> int:
+    """Threads create buyers at once: every create must get its own buyer number"""
+    def work(worker: int):
+        api = fixture.manager_api(worker)
+        return [api.call("POST", "/buyer", json=buyer_payload(f"{worker}-{index}"))
+                for index in range(args.per_thread)]
+
+    results, elapsed = run_workers(args.threads, work)
+    anomalies = Counter()
+    numbers = Counter(body["buyer_number"] for status, body, _ in results if status == 200)
+    anomalies["primary key collisions"] += sum(1 for status, body, _ in results
+                                               if status == 400 and body and body.get("detail") == COLLISION_DETAIL)
+    anomalies["duplicate buyer numbers"] += sum(count - 1 for count in numbers.values() if count > 1)
+    anomalies = +anomalies
+    return report("buyers", results, elapsed, anomalies)
+
+
+def scenario_sets(fixture: Fixture, args) -> int:
+    """Threads create raffle sets in one project: no shared set numbers or raffle ranges"""
+    project = fixture.project_number
+
+    def work(worker: int):
+        api = fixture.api()
+        return [api.call("POST", f"/project/{project}/raffleset", json={
+            "name": f"Set {worker}-{index}", "project_number": project, "type": "physical",
+            "quantity": args.set_size, "unit_price": 100}) for index in range(args.per_thread)]
+
+    results, elapsed = run_workers(args.threads, work)
+    anomalies = Counter()
+    created = [body for status, body, _ in results if status == 200]
+    anomalies["primary key collisions"] += sum(1 for status, body, _ in results
+                                               if status == 400 and body and body.get("detail") == COLLISION_DETAIL)
+    set_numbers = Counter(body["set_number"] for body in created)
+    anomalies["duplicate set numbers"] += sum(count - 1 for count in set_numbers.values() if count > 1)
+    ranges = sorted((body["init"], body["final"]) for body in created)
+    anomalies["overlapping raffle ranges"] += sum(1 for previous, current in zip(ranges, ranges[1:])
+                                                  if current[0] <= previous[1])
+    anomalies = +anomalies
+    return report("sets", results, elapsed, anomalies)
+
+
+SCENARIOS = {"sell": scenario_sell, "buyers": scenario_buyers, "sets": scenario_sets}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent sells and number allocation, counting anomalies")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: sell, buyers, sets")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--managers", type=int, default=4, help="Managers the clients log in as")
+    parser.add_argument("--raffles", type=int, default=100, help="Tickets every client tries to sell")
+    parser.add_argument("--per-thread", type=int, default=10, help="Buyers or sets each client creates")
+    parser.add_argument("--set-size", type=int, default=50, help="Raffles per created set")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    fixture = Fixture(args)
+    anomalies = sum(SCENARIOS[name](fixture, args) for name in scenarios)
+    sys.exit(1 if anomalies else 0)
+
+
+if __name__ == "__main__":
+    main()
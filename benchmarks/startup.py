@@ -0,0 +1,121 @@
+"""
+Cold start benchmark: how long a new worker takes to import the app and to answer /health.
+
+Usage (from the project root):
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 5 --import-budget 1.5 --startup-budget 3
+
+Each run uses a fresh interpreter, so nothing is cached in memory between runs. Exits with
+status 1 when the median of a measurement is over its budget, so it can gate a deploy.
+`--ready-budget` also checks /ready, which needs a reachable database.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def measure_import() -> float:
+    """Seconds it takes a fresh interpreter to import main"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=PROJECT_ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, process: subprocess.Popen, log, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"Server exited with status {process.returncode}: {log.read().strip()}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def measure_startup(check_ready: bool, timeout: float) -> tuple:
+    """Seconds from launching uvicorn until /health (and /ready, if asked) answer 200"""
+    port = _free_port()
+    log = tempfile.TemporaryFile(mode="w+")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(port), "--log-level", "warning"],
+                               cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=log, text=True)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        if not _wait_for(f"{base}/health", process, log, timeout):
+            raise RuntimeError(f"/health did not answer within {timeout}s")
+        healthy = time.perf_counter() - started
+        ready = None
+        if check_ready:
+            if not _wait_for(f"{base}/ready", process, log, timeout):
+                raise RuntimeError(f"/ready did not answer within {timeout}s")
+            ready = time.perf_counter() - started
+        return healthy, ready
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+
+def check(name: str, samples: list, budget: float) -> bool:
+    median = statistics.median(samples)
+    within = median <= budget
+    print(f"{name:<10} median {median:6.3f}s  min {min(samples):6.3f}s  max {max(samples):6.3f}s  "
+          f"budget {budget:6.3f}s  {'OK' if within else 'OVER BUDGET'}")
+    return within
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and startup time of the API against a budget")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--import-budget", type=float, default=float(os.environ.get("IMPORT_BUDGET", 1.5)),
+                        help="Seconds to import main (env IMPORT_BUDGET)")
+    parser.add_argument("--startup-budget", type=float, default=float(os.environ.get("STARTUP_BUDGET", 3.0)),
+                        help="Seconds from launch until /health answers (env STARTUP_BUDGET)")
+    parser.add_argument("--ready-budget", type=float, default=None,
+                        help="Seconds from launch until /ready answers; needs the database")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    imports, startups, readies = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        healthy, ready = measure_startup(args.ready_budget is not None, args.timeout)
+        startups.append(healthy)
+        if ready is not None:
+            readies.append(ready)
+
+    results = [check("import", imports, args.import_budget), check("health", startups, args.startup_budget)]
+    if readies:
+        results.append(check("ready", readies, args.ready_budget))
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
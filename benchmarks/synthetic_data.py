@@ -0,0 +1,237 @@
+"""
+Synthetic data generator: fill a database with production-scale, realistic data for benchmarks and EXPLAIN checks.
+
+Usage (from the project root):
+    python benchmarks/synthetic_data.py --entities 10
+    python benchmarks/synthetic_data.py --entities 2000 --raffles-per-set 5000 --max-set-size 1000000 --seed 7
+    python benchmarks/synthetic_data.py --url sqlite:///synthetic.db --create-tables --entities 3
+
+Data is generated from the models in `models/` and written with multi-row bulk inserts, in chunks. Everything
+derives from --seed: the same seed and options always produce the same rows, so measurements taken on
+different machines or days are comparable. Each entity has its own random stream, so changing --entities
+doesn't change the entities already there.
+
+Sizes are skewed like real tenants: set sizes follow a Pareto distribution (a few huge sets, many small
+ones), each project sells its own share of its raffles, and a few buyers and managers account for most sales.
+Entities are written to one database (the main one unless --url is given); spread them over shards
+afterwards with `python -m database.shards move`.
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import func, select, text  # noqa: E402
+
+import models  # noqa: E402,F401  (registers every table)
+from database.connection import Base, create_database_engine, engine as main_engine  # noqa: E402
+from routes.sales import get_bucket_start  # noqa: E402
+
+PASSWORD = "synthetic"
+FIRST_NAMES = ["Ana", "Juan", "Lucía", "Martín", "Sofía", "Diego", "Valentina", "Pablo", "Camila", "Tomás",
+               "Julieta", "Mateo", "Florencia", "Nicolás", "Agustina", "Santiago", "Micaela", "Joaquín"]
+LAST_NAMES = ["González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez", "García",
+              "Sánchez", "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Acosta"]
+UNIT_PRICES = [100, 200, 500, 1000, 2000, 5000]
+PAYMENT_METHODS = ["cash", "card", "transfer"]
+PAYMENT_WEIGHTS = [5, 2, 3]
+
+
+def zipf_weights(count: int, exponent: float) -> list:
+    """Cumulative weights of a Zipf distribution over `count` ranks: the first few take most draws"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def set_size(rng: random.Random, mean: int, skew: float, maximum: int) -> int:
+    """Pareto-distributed set size with the given mean (for skew > 1), capped at `maximum`"""
+    scale = mean * (skew - 1) / skew if skew > 1 else mean
+    return max(1, min(maximum, int(scale * rng.paretovariate(skew))))
+
+
+class Generator:
+    def __init__(self, args, hashed_password: str):
+        self.args = args
+        self.hashed_password = hashed_password
+        self.until = datetime.fromisoformat(args.until)
+        self.since = self.until - timedelta(days=args.days)
+
+    def timestamp(self, rng: random.Random, since: datetime = None) -> datetime:
+        since = since or self.since
+        return since + timedelta(seconds=rng.uniform(0, (self.until - since).total_seconds()))
+
+    def entity(self, index: int, entity_id: int):
+        """Rows of one entity, table by table, in insert (foreign key) order"""
+        args = self.args
+        rng = random.Random(f"{args.seed}:{index}")
+        created_at = self.timestamp(rng)
+
+        yield "entities", [{"id": entity_id, "name": f"synthetic-{args.seed}-{index}",
+                            "hashed_password": self.hashed_password,
+                            "description": "Synthetic data", "created_at": created_at}]
+
+        manager_count = max(1, int(rng.expovariate(1 / args.managers)) + 1)
+        yield "managers", [{"entity_id": entity_id, "manager_number": number, "username": f"seller{number}",
+                            "hashed_password": self.hashed_password, "is_active": rng.random() > 0.05,
+                            "created_at": created_at}
+                           for number in range(1, manager_count + 1)]
+
+        buyer_count = max(1, int(rng.expovariate(1 / args.buyers)) + 1)
+        buyers = []
+        for number in range(1, buyer_count + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            buyers.append({"entity_id": entity_id, "buyer_number": number, "name": f"{first} {last} {number}",
+                           "phone": f"+549{rng.randrange(10 ** 9, 10 ** 10)}",
+                           "email": f"{first.lower()}.{number}@example.com" if rng.random() < 0.5 else None,
+                           "created_by_manager_number": rng.randint(1, manager_count),
+                           "created_at": self.timestamp(rng, created_at)})
+        yield "buyers", buyers
+
+        buyer_weights = zipf_weights(buyer_count, args.zipf)
+        manager_weights = zipf_weights(manager_count, args.zipf)
+        project_count = max(1, int(rng.expovariate(1 / args.projects)) + 1)
+        yield "projects", [{"entity_id": entity_id, "project_number": number, "name": f"Project {number}",
+                            "description": None, "created_at": created_at}
+                           for number in range(1, project_count + 1)]
+
+        purchases, sales = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+        for project_number in range(1, project_count + 1):
+            yield from self.project(rng, entity_id, project_number, buyer_weights, manager_weights, purchases, sales)
+
+        yield "buyer_stats", [{"entity_id": entity_id, "buyer_number": number,
+                               "tickets_bought": purchases[number][0], "total_spent": purchases[number][1]}
+                              for number in range(1, buyer_count + 1)]
+        yield "sales_rollups", [{"entity_id": entity_id, "period": period, "bucket_start": bucket_start,
+                                 "project_number": project_number, "set_number": set_number,
+                                 "manager_number": manager_number, "payment_method": payment_method,
+                                 "tickets": tickets, "amount": amount}
+                                for (period, bucket_start, project_number, set_number, manager_number, payment_method),
+                                    (tickets, amount) in sorted(sales.items())]
+
+    def project(self, rng: random.Random, entity_id: int, project_number: int, buyer_weights, manager_weights,
+                purchases, sales):
+        args = self.args
+        # Each project sells its own share: a beta distribution around --sold-ratio
+        concentration = 4
+        sold_share = rng.betavariate(max(args.sold_ratio, 0.01) * concentration,
+                                     max(1 - args.sold_ratio, 0.01) * concentration)
+
+        sets, next_number = [], 1
+        for set_number in range(1, max(1, int(rng.expovariate(1 / args.sets)) + 1) + 1):
+            size = set_size(rng, args.raffles_per_set, args.skew, args.max_set_size)
+            sets.append({"entity_id": entity_id, "project_number": project_number, "set_number": set_number,
+                         "name": f"Set {set_number}", "type": rng.choice(["online", "physical"]),
+                         "init": next_number, "final": next_number + size - 1,
+                         "unit_price": rng.choice(UNIT_PRICES), "created_at": self.since})
+            next_number += size
+        yield "raffle_sets", sets
+
+        buyer_numbers = range(1, len(buyer_weights) + 1)
+        manager_numbers = range(1, len(manager_weights) + 1)
+        chunk = []
+        for raffle_set in sets:
+            for raffle_number in range(raffle_set["init"], raffle_set["final"] + 1):
+                roll = rng.random()
+                row = {"entity_id": entity_id, "project_number": project_number, "raffle_number": raffle_number,
+                       "set_number": raffle_set["set_number"], "buyer_entity_id": None, "buyer_number": None,
+                       "sold_by_entity_id": None, "sold_by_manager_number": None, "payment_method": None,
+                       "state": "available", "created_at": self.since, "updated_at": None}
+                if roll < sold_share + args.reserved_ratio:
+                    row["state"] = "sold" if roll < sold_share else "reserved"
+                    row["buyer_entity_id"] = entity_id
+                    row["buyer_number"] = rng.choices(buyer_numbers, cum_weights=buyer_weights)[0]
+                    row["updated_at"] = self.timestamp(rng)
+                    if row["state"] == "sold":
+                        row["sold_by_entity_id"] = entity_id
+                        row["sold_by_manager_number"] = rng.choices(manager_numbers, cum_weights=manager_weights)[0]
+                        row["payment_method"] = rng.choices(PAYMENT_METHODS, weights=PAYMENT_WEIGHTS)[0]
+                        purchases[row["buyer_number"]][0] += 1
+                        purchases[row["buyer_number"]][1] += raffle_set["unit_price"]
+                        for period in ("hour", "day"):
+                            key = (period, get_bucket_start(row["updated_at"], period), project_number,
+                                   raffle_set["set_number"], row["sold_by_manager_number"], row["payment_method"])
+                            sales[key][0] += 1
+                            sales[key][1] += raffle_set["unit_price"]
+                chunk.append(row)
+                if len(chunk) >= args.chunk_size:
+                    yield "raffles", chunk
+                    chunk = []
+        if chunk:
+            yield "raffles", chunk
+
+
+def load(args):
+    target = create_database_engine(args.url) if args.url else main_engine
+    if args.create_tables:
+        Base.metadata.create_all(bind=target)
+    tables = Base.metadata.tables
+
+    # Synthetic data needs no real passwords: one hash for every account, so no per-row hashing
+    from auth.utils import get_password_hash
+    generator = Generator(args, get_password_hash(PASSWORD))
+
+    with target.connect() as conn:
+        first_id = args.first_entity_id or (conn.execute(select(func.max(tables["entities"].c.id))).scalar() or 0) + 1
+        names = [f"synthetic-{args.seed}-{index}" for index in range(args.entities)]
+        existing = conn.execute(select(func.count()).select_from(tables["entities"])
+                                .where(tables["entities"].c.name.in_(names[:1000]))).scalar()
+        if existing:
+            raise SystemExit(f"Seed {args.seed} is already loaded here; use another --seed")
+
+        if conn.dialect.name in ("mysql", "mariadb"):
+            # The generated rows are consistent by construction: skip per-row constraint checks
+            conn.execute(text("SET SESSION foreign_key_checks = 0, unique_checks = 0"))
+        conn.commit()
+
+        counts, started = {}, time.perf_counter()
+        for index in range(args.entities):
+            with conn.begin():
+                for table_name, rows in generator.entity(index, first_id + index):
+                    if rows:
+                        conn.execute(tables[table_name].insert(), rows)
+                        counts[table_name] = counts.get(table_name, 0) + len(rows)
+            if (index + 1) % args.progress == 0 or index + 1 == args.entities:
+                elapsed = time.perf_counter() - started
+                print(f"{index + 1}/{args.entities} entities, {sum(counts.values())} rows, "
+                      f"{sum(counts.values()) / elapsed:,.0f} rows/s", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print()
+    for table_name, count in counts.items():
+        print(f"{table_name}: {count}")
+    print(f"Entity ids {first_id}..{first_id + args.entities - 1} in {elapsed:.1f}s. "
+          f"Log in as synthetic-{args.seed}-N (or manager sellerN of it) with password '{PASSWORD}'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic, production-scale synthetic data")
+    parser.add_argument("--seed", type=int, default=1, help="Same seed and options, same data")
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--managers", type=float, default=5, help="Average managers per entity")
+    parser.add_argument("--buyers", type=float, default=500, help="Average buyers per entity")
+    parser.add_argument("--projects", type=float, default=3, help="Average projects per entity")
+    parser.add_argument("--sets", type=float, default=3, help="Average raffle sets per project")
+    parser.add_argument("--raffles-per-set", type=int, default=1000, help="Average raffles per set")
+    parser.add_argument("--max-set-size", type=int, default=1000000)
+    parser.add_argument("--skew", type=float, default=1.5, help="Pareto shape of set sizes: lower is more skewed")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of sales per buyer and manager")
+    parser.add_argument("--sold-ratio", type=float, default=0.6, help="Average share of raffles sold per project")
+    parser.add_argument("--reserved-ratio", type=float, default=0.02)
+    parser.add_argument("--until", default="2025-01-01", help="Sales happen in the --days before this date")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--first-entity-id", type=int, default=None, help="Defaults to the next free id")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per bulk insert")
+    parser.add_argument("--progress", type=int, default=10, help="Report every N entities")
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL; the configured main database by default")
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables first (e.g. SQLite)")
+    load(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import bisect
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+# Archive layout: zlib-compressed JSON with the raffle sets as rows and the raffles as columns.
+# Every raffle column is run-length encoded (state, set_number, price... repeat for long runs);
+# raffle_number is delta encoded first, so a whole set of consecutive numbers is a single run.
+ARCHIVE_FORMAT = "columnar-v1"
+DELTA_COLUMNS = {"raffle_number"}
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+class _RunLengthColumn:
+    def __init__(self, delta: bool):
+        self.delta = delta
+        self.runs: List[list] = []
+        self._previous = 0
+
+    def append(self, value: Any):
+        if self.delta:
+            value, self._previous = value - self._previous, value
+        if self.runs and self.runs[-1][0] == value:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([value, 1])
+
+
+class ArchiveWriter:
+    """Encode a project's raffles one row at a time, in raffle_number order"""
+
+    def __init__(self, raffle_columns: List[str]):
+        self.raffle_columns = raffle_columns
+        self.count = 0
+        self._columns = {name: _RunLengthColumn(name in DELTA_COLUMNS) for name in raffle_columns}
+
+    def add_raffle(self, row: Dict[str, Any]):
+        for name, column in self._columns.items():
+            column.append(_plain(row[name]))
+        self.count += 1
+
+    def finish(self, raffle_sets: List[Dict[str, Any]]) -> bytes:
+        document = {
+            "format": ARCHIVE_FORMAT,
+            "raffle_sets": [{name: _plain(value) for name, value in row.items()} for row in raffle_sets],
+            "raffles": {"count": self.count,
+                        "columns": {name: {"delta": column.delta, "runs": column.runs}
+                                    for name, column in self._columns.items()}},
+        }
+        return zlib.compress(json.dumps(document, separators=(",", ":")).encode(), 6)
+
+
+def _expand(column: Dict[str, Any]) -> list:
+    values = []
+    for value, count in column["runs"]:
+        values.extend([value] * count)
+    if column["delta"]:
+        total = 0
+        for i, value in enumerate(values):
+            total += value
+            values[i] = total
+    return values
+
+
+class ArchivedProject:
+    """A decoded archive: read-only raffle sets and raffles of one project"""
+
+    def __init__(self, entity_id: int, project_number: int, data: bytes):
+        document = json.loads(zlib.decompress(data))
+        if document.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"Unsupported archive format: {document.get('format')}")
+        self.entity_id = entity_id
+        self.project_number = project_number
+        self.raffle_sets: List[Dict[str, Any]] = document["raffle_sets"]
+        self.count: int = document["raffles"]["count"]
+        self.columns: Dict[str, list] = {name: _expand(column)
+                                         for name, column in document["raffles"]["columns"].items()}
+
+    def _raffle(self, index: int) -> Dict[str, Any]:
+        row = {name: values[index] for name, values in self.columns.items()}
+        row["entity_id"] = self.entity_id
+        row["project_number"] = self.project_number
+        return row
+
+    def raffle(self, raffle_number: int) -> Optional[Dict[str, Any]]:
+        numbers = self.columns["raffle_number"]
+        index = bisect.bisect_left(numbers, raffle_number)
+        if index < len(numbers) and numbers[index] == raffle_number:
+            return self._raffle(index)
+        return None
+
+    def raffles(self, filters: Dict[str, Any], limit: int = 0, offset: int = 0) -> List[Dict[str, Any]]:
+        """Raffles matching every filter by equality, in raffle_number order"""
+        checks = [(self.columns[name], value) for name, value in filters.items() if name in self.columns]
+        matches = (index for index in range(self.count) if all(values[index] == value for values, value in checks))
+        rows = []
+        for position, index in enumerate(matches):
+            if position < offset:
+                continue
+            if limit > 0 and len(rows) >= limit:
+                break
+            rows.append(self._raffle(index))
+        return rows
+
+    def raffle_set(self, set_number: int) -> Optional[Dict[str, Any]]:
+        return next((row for row in self.raffle_sets if row["set_number"] == set_number), None)
+
+
+class ArchiveCache:
+    """Decoded archives of this process, least recently used first out, bounded by their total raffles"""
+
+    def __init__(self, max_raffles: int):
+        self.max_raffles = max_raffles
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, ArchivedProject]" = OrderedDict()
+        self._raffles = 0
+
+    def get(self, key: Hashable) -> Optional[ArchivedProject]:
+        with self._lock:
+            archive = self._entries.get(key)
+            if archive is not None:
+                self._entries.move_to_end(key)
+            return archive
+
+    def put(self, key: Hashable, archive: ArchivedProject):
+        if archive.count > self.max_raffles:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._raffles -= previous.count
+            self._entries[key] = archive
+            self._raffles += archive.count
+            while self._raffles > self.max_raffles:
+                _, evicted = self._entries.popitem(last=False)
+                self._raffles -= evicted.count
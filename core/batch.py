@@ -0,0 +1,63 @@
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class BatchContext:
+    """
+    State shared by the sub-requests of a /batch request: one session and one principal.
+
+    In an all-or-nothing batch the session runs inside one outer transaction, so effects outside
+    the database (ledger rows, live events, cached responses) wait until it commits and are
+    dropped if it rolls back.
+    """
+
+    def __init__(self, db: Session, principal: Tuple[Any, str], atomic: bool):
+        self.db = db
+        self.principal = principal
+        self.atomic = atomic
+        self._on_commit: List[Callable[[], None]] = []
+        self._on_rollback: List[Callable[[], None]] = []
+
+    def committed(self):
+        self._run(self._on_commit)
+
+    def rolled_back(self):
+        self._run(self._on_rollback)
+
+    def _run(self, callbacks: List[Callable[[], None]]):
+        self._on_commit, self._on_rollback = [], []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                # The transaction is already settled; a failed side effect can't change it
+                logger.error(f"Batch callback failed: {e}")
+
+
+current_batch: ContextVar[Optional[BatchContext]] = ContextVar("current_batch", default=None)
+
+
+def get_batch() -> Optional[BatchContext]:
+    """The /batch request the current request runs in, if any"""
+    return current_batch.get()
+
+
+def after_commit(callback: Callable[[], None]):
+    """Run callback now, or once the enclosing all-or-nothing batch commits"""
+    batch = current_batch.get()
+    if batch is not None and batch.atomic:
+        batch._on_commit.append(callback)
+    else:
+        callback()
+
+
+def after_rollback(callback: Callable[[], None]):
+    """Run callback if the enclosing all-or-nothing batch rolls back; otherwise never"""
+    batch = current_batch.get()
+    if batch is not None and batch.atomic:
+        batch._on_rollback.append(callback)
@@ -0,0 +1,95 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Attempts to write a batch before its rows are dropped (and logged)
+WRITE_ATTEMPTS = 3
+
+
+class BatchWriter:
+    """
+    Inserts rows of one table from a background thread, many rows per statement.
+
+    Callers only enqueue, so writes add no round trip to their request. Rows are flushed
+    every `flush_interval` seconds or once `batch_size` are waiting, grouped by the engine
+    they belong to (rows of each shard go to that shard). When the queue is full, the caller
+    writes its row synchronously instead of dropping it. Rows still queued when the process
+    is killed are lost; a normal shutdown flushes them.
+    """
+
+    def __init__(self, table, batch_size: int, flush_interval: float, queue_size: int):
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Tuple[Any, Dict[str, Any]]]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def add(self, engine, rows: List[Dict[str, Any]]):
+        """Queue rows to be inserted through `engine`"""
+        self._ensure_thread()
+        for position, row in enumerate(rows):
+            try:
+                self._queue.put_nowait((engine, row))
+            except queue.Full:
+                self._insert(engine, rows[position:])
+                return
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=f"{self.table.name}-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _insert(self, engine, rows: List[Dict[str, Any]]):
+        with engine.begin() as conn:
+            conn.execute(self.table.insert(), rows)
+
+    def _write(self, batch: List[Tuple[Any, Dict[str, Any]]]):
+        by_engine = defaultdict(list)
+        for engine, row in batch:
+            by_engine[engine].append(row)
+        for engine, rows in by_engine.items():
+            for attempt in range(1, WRITE_ATTEMPTS + 1):
+                try:
+                    self._insert(engine, rows)
+                    break
+                except Exception as e:
+                    if attempt == WRITE_ATTEMPTS:
+                        logger.error(f"Dropped {len(rows)} {self.table.name} rows after {attempt} attempts: {e}")
+                    else:
+                        time.sleep(0.5 * attempt)
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def close(self, timeout: float = 5):
+        """Flush queued rows and stop the background thread"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
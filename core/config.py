@@ -55,6 +55,106 @@ class Settings(BaseSettings):
     def BACKEND_CORS_ORIGINS(self) -> list[str]:
         return parse_cors(self.backend_cors_origins_raw)
 
+    # Key-value store for idempotency keys and throttling. Empty keeps it inside each process,
+    # "sqlite:///path/to/store.db" shares it between every worker on the host
+    LOCAL_STORE_URL: str = ""
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # How long responses are kept for retries
+
+    # Password hashing: scheme of new hashes ("argon2" needs argon2-cffi) and its cost. Measure the
+    # cost for a host with `python -m auth.calibrate`; hashes with other settings are rehashed at login
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt"
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_KIB: int = 65536
+    ARGON2_PARALLELISM: int = 2
+
+    # Refresh tokens: sessions last this long without a password login, rotating on every refresh
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+
+    # Login throttling (token buckets in the local store)
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_IP_BURST: float = 20  # Attempts per client IP
+    LOGIN_IP_PER_MINUTE: float = 20
+    LOGIN_ACCOUNT_BURST: float = 5  # Failed attempts per entity or manager account
+    LOGIN_ACCOUNT_PER_MINUTE: float = 1
+    LOGIN_ENTITY_BURST: float = 50  # Failed attempts across all managers of an entity
+    LOGIN_ENTITY_PER_MINUTE: float = 10
+
+    # Live events: broker shared by the workers of one host. Empty keeps events inside each process,
+    # "sqlite:///path/to/events.db" lets every worker on the host see every event
+    EVENTS_BROKER_URL: str = ""
+    EVENTS_BACKLOG_SIZE: int = 500  # Events kept per project for reconnecting clients
+    EVENTS_POLL_INTERVAL: float = 0.2  # Seconds between broker polls
+
+    # Read replicas: comma-separated SQLAlchemy URLs. Read-only routes use them, except for
+    # clients that wrote something in the last READ_STICKINESS_SECONDS (read-your-writes)
+    read_replica_urls_raw: str = Field(default="", alias="READ_REPLICA_URLS")
+    READ_STICKINESS_SECONDS: float = 5
+
+    @computed_field
+    @property
+    def READ_REPLICA_URLS(self) -> list[str]:
+        return parse_cors(self.read_replica_urls_raw)
+
+    # Tenant shards next to the main database, as JSON: {"name": "url"} or {"name": ["primary url",
+    # "replica url", ...]}. The main database keeps the entity directory and unmapped entities.
+    shards_raw: str = Field(default="", alias="SHARDS")
+    SHARD_MAP_CACHE_SECONDS: float = 10  # How long workers cache an entity's shard
+
+    @computed_field
+    @property
+    def SHARDS(self) -> dict[str, list[str]]:
+        if not self.shards_raw:
+            return {}
+        import json
+        return {name: [urls] if isinstance(urls, str) else list(urls)
+                for name, urls in json.loads(self.shards_raw).items()}
+
+    # Archived projects: decoded archives kept in memory per worker, bounded by their total raffles
+    ARCHIVE_CACHE_RAFFLES: int = 500000
+
+    # Project dashboards are cached in the local store per project data version; this bounds
+    # how long one can outlive a lost version bump
+    DASHBOARD_CACHE_SECONDS: int = 300
+
+    # Sales ledger: events are inserted in batches from a background thread
+    LEDGER_BATCH_SIZE: int = 500
+    LEDGER_FLUSH_INTERVAL: float = 0.2  # Seconds an event may wait before being written
+    LEDGER_QUEUE_SIZE: int = 100000  # Past this, requests write their events themselves
+
+    # Admin endpoints and diagnostics, authorized with the X-Admin-Key header. Empty disables them.
+    ADMIN_API_KEY: str = ""
+
+    # Request profiling: requests sent with "X-Profile: 1" and the admin key, plus a random
+    # PROFILE_SAMPLE_RATE of all requests, are profiled into PROFILE_DIR (temp dir if empty)
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL: float = 0.005  # Seconds between stack samples
+    PROFILE_DIR: str = ""
+    PROFILE_MAX_CAPTURES: int = 100  # Older captures are deleted
+    PROFILE_MAX_CONCURRENT: int = 2  # Requests profiled at the same time per worker
+
+    # Slow query log: statements slower than this are aggregated for /admin/slow-queries, 0 disables it
+    SLOW_QUERY_MS: float = 200
+    SLOW_QUERY_MAX_ENTRIES: int = 500  # Distinct (statement, route) pairs kept per worker
+
+    # Statement timeouts per route class in milliseconds (0: none), applied to every statement a request
+    # runs (MariaDB: all of them, MySQL: SELECTs). Over it the request gets a 504. Export routes read
+    # or write whole projects.
+    STATEMENT_TIMEOUT_AUTH_MS: int = 2000
+    STATEMENT_TIMEOUT_READ_MS: int = 10000
+    STATEMENT_TIMEOUT_WRITE_MS: int = 15000
+    STATEMENT_TIMEOUT_EXPORT_MS: int = 120000
+    # Per-route timeouts as JSON, by method and route path: {"GET /projects": 2000}
+    statement_timeout_routes_raw: str = Field(default="", alias="STATEMENT_TIMEOUT_ROUTES")
+
+    @computed_field
+    @property
+    def STATEMENT_TIMEOUT_ROUTES(self) -> dict[str, int]:
+        if not self.statement_timeout_routes_raw:
+            return {}
+        import json
+        return {route: int(timeout) for route, timeout in json.loads(self.statement_timeout_routes_raw).items()}
+
     # Railway MySQL variables
     DATABASE_URL: Optional[str] = None
     MYSQL_URL: Optional[str] = None
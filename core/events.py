@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from core.config_loader import settings
+from core.batch import after_commit
+from core.local_store import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Events waiting for a slow client before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# (event id, channel, JSON payload)
+BrokerEvent = Tuple[int, str, str]
+
+
+def project_channel(entity_id: int, project_number: int) -> str:
+    """Channel name for a project's events"""
+    return f"{entity_id}:{project_number}"
+
+
+class InProcessBroker:
+    """Broker for a single worker: events only reach subscribers of this process"""
+
+    def __init__(self, backlog_size: int):
+        self.backlog_size = backlog_size
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._channels: Dict[str, Deque[BrokerEvent]] = defaultdict(lambda: deque(maxlen=backlog_size))
+        self._evicted: Dict[str, int] = {}  # Highest id per channel no longer kept
+        self._recent: Deque[BrokerEvent] = deque(maxlen=backlog_size * 16)
+
+    def publish(self, channel: str, payload: str) -> int:
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, channel, payload)
+            events = self._channels[channel]
+            if len(events) == events.maxlen:
+                self._evicted[channel] = events[0][0]
+            events.append(event)
+            self._recent.append(event)
+            return self._last_id
+
+    def fetch(self, after_id: int, limit: int = 1000) -> List[BrokerEvent]:
+        with self._lock:
+            return [event for event in self._recent if event[0] > after_id][:limit]
+
+    def backlog(self, channel: str, since: int, until: int) -> Optional[List[BrokerEvent]]:
+        """A channel's events with since < id <= until, or None if some of them are no longer kept"""
+        with self._lock:
+            if since < self._evicted.get(channel, 0):
+                return None
+            return [event for event in self._channels.get(channel, ()) if since < event[0] <= until]
+
+    def last_id(self) -> int:
+        return self._last_id
+
+
+class SQLiteBroker:
+    """
+    Local broker stand-in shared by every worker on the host through one SQLite file.
+
+    Event ids come from the table's AUTOINCREMENT, so all workers see the same order.
+    Old events are trimmed to keep the file bounded, recording per channel the last id trimmed.
+    """
+
+    def __init__(self, path: str, backlog_size: int):
+        self.path = path
+        self.backlog_size = backlog_size
+        self.retention = backlog_size * 16
+        self._local = threading.local()
+        self._published = 0
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS events ("
+                     "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+                     "payload TEXT NOT NULL, created_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_channel ON events (channel, id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS trimmed (channel TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_sqlite(self.path)
+        return conn
+
+    def publish(self, channel: str, payload: str) -> int:
+        conn = self._connection()
+        event_id = conn.execute("INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)",
+                                (channel, payload, time.time())).lastrowid
+        self._published += 1
+        if self._published % 256 == 0:
+            self._trim(conn, event_id - self.retention)
+        return event_id
+
+    def _trim(self, conn: sqlite3.Connection, up_to: int):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO trimmed (channel, last_id) "
+                         "SELECT channel, MAX(id) FROM events WHERE id <= ? GROUP BY channel", (up_to,))
+            conn.execute("DELETE FROM events WHERE id <= ?", (up_to,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def fetch(self, after_id: int, limit: int = 1000) -> List[BrokerEvent]:
+        return self._connection().execute(
+            "SELECT id, channel, payload FROM events WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        ).fetchall()
+
+    def backlog(self, channel: str, since: int, until: int) -> Optional[List[BrokerEvent]]:
+        """
+        A channel's events with since < id <= until, or None if some were trimmed or there are more than
+        backlog_size of them. Trims record what they delete in the same transaction, so reading the rows
+        before the trim mark never misses one.
+        """
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, channel, payload FROM events WHERE channel = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (channel, since, until, self.backlog_size + 1)
+        ).fetchall()
+        trimmed = conn.execute("SELECT last_id FROM trimmed WHERE channel = ?", (channel,)).fetchone()
+        if len(rows) > self.backlog_size or (trimmed and since < trimmed[0]):
+            return None
+        return rows
+
+    def last_id(self) -> int:
+        return self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+
+def create_broker(url: str, backlog_size: int):
+    """Build the broker configured in EVENTS_BROKER_URL"""
+    if not url:
+        return InProcessBroker(backlog_size)
+    if url.startswith("sqlite:///"):
+        return SQLiteBroker(url[len("sqlite:///"):], backlog_size)
+    raise ValueError(f"Unsupported events broker: {url}")
+
+
+class Subscription:
+    """A client listening to one channel"""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagging = False
+        self.after_id = 0  # Events up to this id were already sent as backlog
+
+    async def get(self) -> Optional[str]:
+        """Next encoded event, or None once the client fell too far behind"""
+        return await self.queue.get()
+
+    def drop(self):
+        """Replace everything pending with the end-of-stream marker"""
+        self.lagging = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventHub:
+    """
+    Fans broker events out to the WebSocket clients of this worker.
+
+    Publishing is synchronous and thread-safe, so routes running in the threadpool can call
+    it after their commit. A poller on the event loop reads new broker events (woken up
+    immediately for local events, every EVENTS_POLL_INTERVAL for other workers' ones) and
+    encodes each event once for all its subscribers.
+    """
+
+    def __init__(self, broker, poll_interval: float):
+        self.broker = broker
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> int:
+        event_id = self.broker.publish(channel, json.dumps(event, separators=(",", ":")))
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return event_id
+
+    async def subscribe(self, channel: str,
+                        since: Optional[int] = None) -> Tuple[Subscription, Optional[List[str]]]:
+        """
+        Start listening to a channel; events after `since` are returned as backlog, or None when
+        they are no longer all kept and the client must resync.
+        """
+        self._ensure_poller()
+        subscription = Subscription(channel)
+        # The poller delivers what comes after this snapshot, the backlog covers the rest
+        snapshot = self._last_id
+        if since is not None:
+            subscription.after_id = max(since, snapshot)
+        self._subscribers[channel].add(subscription)
+        backlog = []
+        if since is not None and since < snapshot:
+            events = await asyncio.to_thread(self.broker.backlog, channel, since, snapshot)
+            if events is None:
+                return subscription, None
+            backlog = [self._encode(event_id, payload) for event_id, _, payload in events]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._last_id = self.broker.last_id()
+            self._task = self._loop.create_task(self._poll())
+
+    @staticmethod
+    def _encode(event_id: int, payload: str) -> str:
+        # Payloads are JSON objects: splice the id in instead of decoding and re-encoding them
+        return f'{{"id":{event_id},{payload[1:]}' if payload != "{}" else f'{{"id":{event_id}}}'
+
+    async def _poll(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                events = await asyncio.to_thread(self.broker.fetch, self._last_id)
+            except Exception as e:
+                logger.error(f"Could not read events from broker: {e}")
+                continue
+            for event_id, channel, payload in events:
+                self._last_id = event_id
+                subscribers = self._subscribers.get(channel)
+                if not subscribers:
+                    continue
+                message = self._encode(event_id, payload)
+                for subscription in list(subscribers):
+                    if event_id <= subscription.after_id:
+                        continue
+                    try:
+                        subscription.queue.put_nowait(message)
+                    except asyncio.QueueFull:
+                        # Drop slow clients; they reconnect with ?since= and replay the backlog
+                        subscription.drop()
+                        self.unsubscribe(subscription)
+
+
+_event_hub: Optional[EventHub] = None
+_event_hub_lock = threading.Lock()
+
+
+def get_event_hub() -> EventHub:
+    """Process-wide event hub, created on first use"""
+    global _event_hub
+    if _event_hub is None:
+        with _event_hub_lock:
+            if _event_hub is None:
+                broker = create_broker(settings.EVENTS_BROKER_URL, settings.EVENTS_BACKLOG_SIZE)
+                _event_hub = EventHub(broker, settings.EVENTS_POLL_INTERVAL)
+    return _event_hub
+
+
+def publish_project_event(entity_id: int, project_number: int, event_type: str, **fields):
+    """
+    Publish a compact event to a project's channel. Never fails the calling request.
+    Inside an all-or-nothing batch, it's published once the batch commits.
+    """
+    event = {"type": event_type}
+    event.update({key: value for key, value in fields.items() if value is not None})
+
+    def publish():
+        try:
+            get_event_hub().publish(project_channel(entity_id, project_number), event)
+        except Exception as e:
+            logger.error(f"Could not publish {event_type} event for project {project_number}: {e}")
+
+    after_commit(publish)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from core.batch import after_commit, after_rollback
+from core.config_loader import settings
+from core.local_store import get_local_store
+
+logger = logging.getLogger(__name__)
+
+# A claimed key whose request never finished is released after this many seconds
+PENDING_TTL_SECONDS = 60
+# How long a concurrent retry waits for the first request to finish
+WAIT_SECONDS = 10
+WAIT_INTERVAL = 0.05
+
+
+def _fingerprint(payload: Any) -> str:
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump(mode="json")
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def _encode(entry: dict) -> str:
+    return json.dumps(entry, separators=(",", ":"))
+
+
+def _wait_for_result(store, key: str) -> Optional[dict]:
+    """Wait for a concurrent request with the same key to store its result"""
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        value = store.get(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        if entry["state"] == "done" or time.monotonic() >= deadline:
+            return entry
+        time.sleep(WAIT_INTERVAL)
+
+
+def run_idempotent(idempotency_key: Optional[str], scope: str, payload: Any, response_model,
+                   handler: Callable[[], Any]):
+    """
+    Run handler() at most once per Idempotency-Key and replay its stored response on retries.
+
+    `scope` identifies the caller and the operation, so keys from different users or endpoints
+    never collide. The key is claimed atomically before the handler runs: a retry arriving while
+    the first request is still running waits for its result instead of running it twice. Client
+    errors are stored and replayed too; server errors release the key so the retry runs again.
+    Inside an all-or-nothing batch, the result is only stored if the batch commits.
+    """
+    if not idempotency_key:
+        return handler()
+    if len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+
+    store = get_local_store()
+    key = f"idem:{scope}:{idempotency_key}"
+    fingerprint = _fingerprint(payload)
+    ttl = settings.IDEMPOTENCY_TTL_SECONDS
+
+    if not store.add(key, _encode({"state": "pending", "fingerprint": fingerprint}), PENDING_TTL_SECONDS):
+        entry = _wait_for_result(store, key)
+        if entry is not None:
+            if entry["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=422,
+                                    detail="Idempotency-Key was already used with a different request")
+            if entry["state"] != "done":
+                raise HTTPException(status_code=409,
+                                    detail="A request with this Idempotency-Key is still being processed")
+            return JSONResponse(status_code=entry["status"], content=entry["body"],
+                                headers={"Idempotent-Replayed": "true"})
+        # The first request failed and released the key in the meantime
+        return run_idempotent(idempotency_key, scope, payload, response_model, handler)
+
+    # A rolled back batch undoes the operation: release the key so a retry runs it again
+    after_rollback(lambda: store.delete(key))
+    try:
+        result = handler()
+    except HTTPException as e:
+        if e.status_code < 500:
+            entry = _encode({"state": "done", "fingerprint": fingerprint, "status": e.status_code,
+                             "body": {"detail": e.detail}})
+            after_commit(lambda: store.set(key, entry, ttl))
+        else:
+            store.delete(key)
+        raise
+    except Exception:
+        store.delete(key)
+        raise
+
+    try:
+        body = response_model.model_validate(result).model_dump(mode="json")
+        entry = _encode({"state": "done", "fingerprint": fingerprint, "status": 200, "body": body})
+        after_commit(lambda: store.set(key, entry, ttl))
+    except Exception as e:
+        # The operation succeeded; only its replay is lost
+        logger.error(f"Could not store idempotent response for {scope}: {e}")
+        store.delete(key)
+    return result
@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple, TypeVar
+
+from core.config_loader import settings
+
+T = TypeVar("T")
+
+# Expired keys are swept every this many writes
+SWEEP_EVERY = 1024
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """SQLite connection tuned for several processes writing small rows"""
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class MemoryStore:
+    """Key-value store with TTLs inside this process, evicting the least recently written keys"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def _write(self, key: str, value: str, ttl: float, now: float):
+        self._data[key] = (value, now + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._write(key, value, ttl, time.time())
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        """Set the key only if it's absent or expired. Returns whether it was set."""
+        with self._lock:
+            now = time.time()
+            if self._live(key, now) is not None:
+                return False
+            self._write(key, value, ttl, now)
+            return True
+
+    def update(self, key: str, function: Callable[[Optional[str]], Tuple[str, T]], ttl: float) -> T:
+        """Atomically replace the key with function(current value) and return its result"""
+        with self._lock:
+            now = time.time()
+            value, result = function(self._live(key, now))
+            self._write(key, value, ttl, now)
+            return result
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteStore:
+    """Key-value store with TTLs shared by every worker on the host through one SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute("CREATE TABLE IF NOT EXISTS kv ("
+                                   "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL"
+                                   ") WITHOUT ROWID")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_sqlite(self.path)
+        return conn
+
+    def _wrote(self, conn: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?",
+                                         (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float):
+        conn, now = self._connection(), time.time()
+        conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl))
+        self._wrote(conn, now)
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        """Set the key only if it's absent or expired. Returns whether it was set."""
+        conn, now = self._connection(), time.time()
+        cursor = conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at <= ?", (key, value, now + ttl, now))
+        self._wrote(conn, now)
+        return cursor.rowcount == 1
+
+    def update(self, key: str, function: Callable[[Optional[str]], Tuple[str, T]], ttl: float) -> T:
+        """Atomically replace the key with function(current value) and return its result"""
+        conn, now = self._connection(), time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            value, result = function(row[0] if row else None)
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, value, now + ttl))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wrote(conn, now)
+        return result
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+def create_store(url: str):
+    """Build the store configured in LOCAL_STORE_URL"""
+    if not url:
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported local store: {url}")
+
+
+_local_store = None
+_local_store_lock = threading.Lock()
+
+
+def get_local_store():
+    """Process-wide local store, created on first use"""
+    global _local_store
+    if _local_store is None:
+        with _local_store_lock:
+            if _local_store is None:
+                _local_store = create_store(settings.LOCAL_STORE_URL)
+    return _local_store
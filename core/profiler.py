@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+
+from auth.admin import is_admin_key
+from core.config_loader import settings
+
+logger = logging.getLogger(__name__)
+
+# Frames a thread sits in while it has nothing to do (threadpool workers, the event loop's select)
+IDLE_FRAMES = {("threading", "wait"), ("selectors", "select"), ("queue", "get")}
+MAX_STACK_DEPTH = 128
+
+CAPTURE_ID = re.compile(r"^[0-9]{13}-[0-9a-f]{8}$")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """
+    Statistical profiler: samples the stack of every busy thread of the process every `interval` seconds.
+
+    Sync routes run in threadpool workers and async code on the event loop, so all threads are
+    sampled; idle ones are skipped. On a busy worker, concurrent requests show up too.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                names = []
+                while frame is not None and len(names) < MAX_STACK_DEPTH:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+
+class ProfileStore:
+    """
+    Profiles on disk as collapsed stacks (flamegraph.pl, speedscope) plus a JSON sidecar.
+    Only the newest `max_captures` are kept.
+    """
+
+    def __init__(self, directory: str, max_captures: int):
+        self.directory = Path(directory)
+        self.max_captures = max_captures
+        self._lock = threading.Lock()
+
+    def save(self, metadata: Dict[str, Any], stacks: Counter) -> str:
+        capture_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        metadata = dict(metadata, id=capture_id, stacks=len(stacks), total_samples=sum(stacks.values()))
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            (self.directory / f"{capture_id}.collapsed").write_text(collapsed)
+            (self.directory / f"{capture_id}.json").write_text(json.dumps(metadata))
+            self._trim()
+        return capture_id
+
+    def _trim(self):
+        captures = sorted(self.directory.glob("*.json"))
+        for sidecar in captures[:max(0, len(captures) - self.max_captures)]:
+            sidecar.with_suffix(".collapsed").unlink(missing_ok=True)
+            sidecar.unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Captures, newest first"""
+        if not self.directory.exists():
+            return []
+        captures = []
+        for sidecar in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                captures.append(json.loads(sidecar.read_text()))
+            except (OSError, ValueError):
+                continue  # Trimmed by another worker meanwhile
+        return captures
+
+    def path(self, capture_id: str) -> Optional[Path]:
+        if not CAPTURE_ID.match(capture_id):
+            return None
+        path = self.directory / f"{capture_id}.collapsed"
+        return path if path.exists() else None
+
+
+_profile_store: Optional[ProfileStore] = None
+_profiling_slots = threading.BoundedSemaphore(settings.PROFILE_MAX_CONCURRENT)
+
+
+def get_profile_store() -> ProfileStore:
+    """Process-wide profile store, created on first use"""
+    global _profile_store
+    if _profile_store is None:
+        directory = settings.PROFILE_DIR or os.path.join(tempfile.gettempdir(), "raffles-profiles")
+        _profile_store = ProfileStore(directory, settings.PROFILE_MAX_CAPTURES)
+    return _profile_store
+
+
+def should_profile(request: Request) -> bool:
+    """Profile requests asking for it with `X-Profile: 1` and a valid admin key, and a random sample of the rest"""
+    if request.headers.get("x-profile") == "1" and is_admin_key(request.headers.get("x-admin-key")):
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+async def profile_requests(request: Request, call_next):
+    """HTTP middleware: run selected requests under the stack sampler and store the result"""
+    if not should_profile(request) or not _profiling_slots.acquire(blocking=False):
+        return await call_next(request)
+    try:
+        sampler = StackSampler(settings.PROFILE_INTERVAL)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            stacks = await asyncio.to_thread(sampler.stop)
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            capture_id = await asyncio.to_thread(get_profile_store().save, {
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(duration_ms, 2),
+                "interval_ms": settings.PROFILE_INTERVAL * 1000,
+                "created_at": time.time(),
+            }, stacks)
+            response.headers["X-Profile-Id"] = capture_id
+        except OSError as e:
+            logger.error(f"Could not store profile of {request.url.path}: {e}")
+        return response
+    finally:
+        _profiling_slots.release()
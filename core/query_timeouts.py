@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import re
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from core.config_loader import settings
+
+logger = logging.getLogger(__name__)
+
+# Routes that legitimately read or write a whole project or tenant
+EXPORT_ROUTES = {
+    "GET /project/{project_number}/ledger",
+    "POST /project/{project_number}/archive",
+}
+
+# Error codes of a statement stopped by its time limit (MariaDB, MySQL) or by KILL QUERY
+TIMEOUT_ERRORS = {1969, 3024}
+INTERRUPTED_ERRORS = {1317}
+
+_MARIADB_PREFIX = re.compile(r"^SET STATEMENT max_statement_time=[\d.]+ FOR ", re.IGNORECASE)
+_MYSQL_HINT = re.compile(r"/\*\+ MAX_EXECUTION_TIME\(\d+\) \*/ ", re.IGNORECASE)
+
+
+class QueryCancelled(Exception):
+    """The client went away: the request's remaining statements aren't run"""
+
+
+def route_class(method: str, path: str) -> str:
+    """"auth", "export", "read" or "write": the statement timeout class of a route"""
+    if path.startswith("/auth"):
+        return "auth"
+    if f"{method} {path}" in EXPORT_ROUTES:
+        return "export"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+def route_timeout_ms(method: str, path: str) -> int:
+    """Statement timeout of a route: its own from STATEMENT_TIMEOUT_ROUTES, else its class's"""
+    override = settings.STATEMENT_TIMEOUT_ROUTES.get(f"{method} {path}")
+    if override is not None:
+        return override
+    return {
+        "auth": settings.STATEMENT_TIMEOUT_AUTH_MS,
+        "export": settings.STATEMENT_TIMEOUT_EXPORT_MS,
+        "read": settings.STATEMENT_TIMEOUT_READ_MS,
+        "write": settings.STATEMENT_TIMEOUT_WRITE_MS,
+    }[route_class(method, path)]
+
+
+class RequestQueries:
+    """
+    Statements a request has running, so they can be cancelled when its client disconnects.
+    Shared between the event loop (which notices the disconnect) and the threads running the route.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.cancelled = False
+        self._timeout_ms: Optional[int] = None
+        self._lock = threading.Lock()
+        self._running: Dict[int, Tuple[Engine, object]] = {}
+
+    @property
+    def timeout_ms(self) -> int:
+        # Resolved on the first statement: by then the router has put the route in the scope
+        if self._timeout_ms is None:
+            route = self.scope.get("route")
+            path = getattr(route, "path", None) or self.scope.get("path", "")
+            self._timeout_ms = route_timeout_ms(self.scope.get("method", "GET"), path)
+        return self._timeout_ms
+
+    def started(self, engine: Engine, dbapi_connection):
+        with self._lock:
+            self._running[id(dbapi_connection)] = (engine, dbapi_connection)
+
+    def finished(self, dbapi_connection):
+        with self._lock:
+            self._running.pop(id(dbapi_connection), None)
+
+    def cancel(self):
+        """Stop the running statements and refuse new ones (blocking: call it from a thread)"""
+        self.cancelled = True
+        with self._lock:
+            running = list(self._running.values())
+        token = current_queries.set(None)  # KILL QUERY itself isn't one of the request's statements
+        try:
+            self._kill(running)
+        finally:
+            current_queries.reset(token)
+
+    @staticmethod
+    def _kill(running):
+        for engine, dbapi_connection in running:
+            try:
+                if engine.dialect.name == "sqlite":
+                    dbapi_connection.interrupt()
+                elif engine.dialect.name in ("mysql", "mariadb"):
+                    # From another connection: the request's one is busy running the statement
+                    with engine.connect() as conn:
+                        conn.exec_driver_sql(f"KILL QUERY {int(dbapi_connection.thread_id())}")
+            except Exception as e:
+                logger.error(f"Could not cancel query: {e}")
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def with_statement_timeout(dialect, statement: str, timeout_ms: int) -> str:
+    """The statement limited to timeout_ms, in the dialect's syntax; unchanged where there's none"""
+    verb = statement.lstrip()[:6].upper()
+    if dialect.name not in ("mysql", "mariadb") or verb not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        return statement
+    if getattr(dialect, "is_mariadb", False):
+        return f"SET STATEMENT max_statement_time={timeout_ms / 1000:g} FOR {statement}"
+    if verb == "SELECT":
+        # MySQL only limits SELECTs
+        start = statement.upper().index("SELECT") + len("SELECT")
+        return f"{statement[:start]} /*+ MAX_EXECUTION_TIME({timeout_ms}) */ {statement[start:].lstrip()}"
+    return statement
+
+
+def without_statement_timeout(statement: str) -> str:
+    """Original statement of one rewritten by with_statement_timeout"""
+    return _MYSQL_HINT.sub("", _MARIADB_PREFIX.sub("", statement))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    if queries is None:
+        return statement, parameters  # Not serving a request (startup, background jobs, scripts)
+    if queries.cancelled:
+        raise QueryCancelled()
+    queries.started(conn.engine, conn.connection.dbapi_connection)
+    # executemany statements stay as they are: PyMySQL only turns a bare INSERT ... VALUES into one
+    # multi-row INSERT, and a prefixed one would cost a round trip per row. They can still be cancelled.
+    if queries.timeout_ms > 0 and not executemany:
+        statement = with_statement_timeout(conn.dialect, statement, queries.timeout_ms)
+    return statement, parameters
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    if queries is not None:
+        queries.finished(conn.connection.dbapi_connection)
+
+
+def _handle_error(context):
+    queries = current_queries.get()
+    if queries is not None and context.connection is not None:
+        try:
+            queries.finished(context.connection.connection.dbapi_connection)
+        except Exception:
+            pass  # The connection is gone (invalidated): nothing left to cancel on it
+
+
+_installed = False
+
+
+def install_statement_timeouts():
+    """Limit and track the statements of every engine run on behalf of a request"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute, retval=True)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _installed = True
+
+
+def interruption(error: BaseException) -> Optional[str]:
+    """"timeout" or "cancelled" when a statement was stopped by its limit or by a disconnect"""
+    if isinstance(error, QueryCancelled):
+        return "cancelled"
+    if isinstance(error, exc.DBAPIError):
+        if error.orig is not None and error.orig.args:
+            code = error.orig.args[0]
+            if code in TIMEOUT_ERRORS:
+                return "timeout"
+            if code in INTERRUPTED_ERRORS:
+                return "cancelled"
+        if type(error.orig).__module__ == "sqlite3" and "interrupted" in str(error.orig):
+            return "cancelled"  # interrupt(), the SQLite equivalent of KILL QUERY
+    return None
+
+
+def raise_if_interrupted(error: BaseException):
+    """Let a stopped statement reach the app's handler instead of becoming a generic error"""
+    if interruption(error):
+        raise error
+
+
+async def interrupted_query_handler(request: Request, error: Exception):
+    """504 for statements over their time limit, 503 for those cancelled with the request"""
+    kind = interruption(error)
+    if kind is None:
+        raise error
+    route = request.scope.get("route")
+    logger.warning(f"Query {kind} on {request.method} {getattr(route, 'path', request.url.path)}")
+    if kind == "timeout":
+        return JSONResponse(status_code=504, content={"detail": "The request took too long and was cancelled"})
+    return JSONResponse(status_code=503, content={"detail": "The request was cancelled"})
+
+
+class QueryCancellationMiddleware:
+    """ASGI middleware cancelling a request's running statements when its client disconnects"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries(scope)
+        token = current_queries.set(queries)
+        messages: asyncio.Queue = asyncio.Queue()
+        response_done = False
+
+        async def watch():
+            # The only reader of the client's messages: passes them on and notices a disconnect
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not response_done:
+                        logger.info(f"Client disconnected: cancelling {scope['method']} {scope['path']}")
+                        await run_in_threadpool(queries.cancel)
+                    return
+
+        async def tracked_send(message):
+            nonlocal response_done
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, messages.get, tracked_send)
+        finally:
+            response_done = True
+            watcher.cancel()
+            current_queries.reset(token)
@@ -0,0 +1,102 @@
+import json
+import typing
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+# Media types list endpoints can answer with, besides plain JSON (a list of objects)
+COLUMNAR_JSON = "application/vnd.raffles.columnar+json"
+MSGPACK = "application/msgpack"
+COLUMNAR_MSGPACK = "application/vnd.raffles.columnar+msgpack"
+
+# (layout, encoding) of each accepted media type
+MEDIA_TYPES = {
+    "application/json": ("rows", "json"),
+    COLUMNAR_JSON: ("columnar", "json"),
+    MSGPACK: ("rows", "msgpack"),
+    "application/x-msgpack": ("rows", "msgpack"),
+    COLUMNAR_MSGPACK: ("columnar", "msgpack"),
+}
+
+# OpenAPI description of the extra encodings, for the routes that support them
+LIST_ENCODING_RESPONSES = {200: {"content": {COLUMNAR_JSON: {}, MSGPACK: {}, COLUMNAR_MSGPACK: {}}}}
+
+
+def parse_fields(fields: Optional[str], Schema) -> Optional[List[str]]:
+    """Comma-separated `fields=` parameter, validated against the response schema, in schema order"""
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    if not requested:
+        raise HTTPException(status_code=400, detail="fields can't be empty")
+    unknown = requested - set(Schema.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [name for name in Schema.model_fields if name in requested]
+
+
+def negotiate(request: Request) -> Tuple[str, str]:
+    """(layout, encoding) of the most preferred media type in the Accept header; plain JSON by default"""
+    candidates = []
+    for position, part in enumerate(request.headers.get("accept", "").split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type.lower() in MEDIA_TYPES and quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+    if not candidates:
+        return MEDIA_TYPES["application/json"]
+    return MEDIA_TYPES[min(candidates)[2]]
+
+
+def _is_temporal(annotation) -> bool:
+    return annotation in (datetime, date) or any(_is_temporal(arg) for arg in typing.get_args(annotation))
+
+
+def _to_iso(value):
+    # Archived projects already hold their timestamps as ISO strings
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def encode_rows(request: Request, rows: List[Dict[str, Any]], Schema, fields: Optional[List[str]]) -> Optional[Response]:
+    """
+    Encode a listing as the client asked: only `fields`, as a list of objects or one array per field
+    (columnar), in JSON or MessagePack. Rows are plain dicts of the schema's fields.
+
+    Returns None when the client wants the full objects as plain JSON, so the route returns the rows
+    through its response_model as usual.
+    """
+    layout, encoding = negotiate(request)
+    if fields is None and layout == "rows" and encoding == "json":
+        return None
+
+    names = fields or list(Schema.model_fields)
+    columns = {}
+    for name in names:
+        values = [row[name] for row in rows]
+        if _is_temporal(Schema.model_fields[name].annotation):
+            values = [_to_iso(value) for value in values]
+        columns[name] = values
+
+    if layout == "columnar":
+        content = {"count": len(rows), "columns": columns}
+    else:
+        content = [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    if encoding == "msgpack":
+        try:
+            import msgpack  # Optional: only needed by clients asking for MessagePack
+        except ImportError:
+            raise HTTPException(status_code=406, detail="MessagePack encoding is not available")
+        body = msgpack.packb(content, use_bin_type=True)
+        media_type = COLUMNAR_MSGPACK if layout == "columnar" else MSGPACK
+    else:
+        body = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        media_type = COLUMNAR_JSON if layout == "columnar" else "application/json"
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
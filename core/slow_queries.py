@@ -0,0 +1,174 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.config_loader import settings
+from core.query_timeouts import without_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request being served; the router fills in its route once it's matched
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+MAX_PENDING_EXPLAINS = 100
+
+_PLACEHOLDER = re.compile(r"%\([^)]*\)s|%s|\?|:\w+")
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Statement with every literal and placeholder replaced by ?, and IN lists collapsed"""
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("?, ...", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def parameters_shape(parameters: Any, executemany: bool) -> str:
+    """Types of the parameters, without their values"""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {parameters_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def current_route() -> str:
+    scope = current_scope.get()
+    if scope is None:
+        return "-"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "?")
+    return f"{scope.get('method', '')} {path}".strip()
+
+
+class SlowQueryLog:
+    """
+    Slow statements of this worker aggregated by (normalized SQL, route).
+    Only the `max_entries` with the most total time are kept.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, Dict[str, Any]] = {}
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._pending_explains = 0
+        self._explaining = threading.local()
+
+    def record(self, engine, statement: str, parameters: Any, executemany: bool, duration_ms: float):
+        sql = normalize_sql(statement)
+        key = (sql, current_route())
+        explain = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k]["total_ms"])]
+                entry = self._entries[key] = {
+                    "sql": sql, "route": key[1], "parameters": parameters_shape(parameters, executemany),
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_seen": 0.0, "plan": None,
+                }
+                explain = not executemany and sql[:6].upper() == "SELECT"
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = time.time()
+            if explain and self._pending_explains < MAX_PENDING_EXPLAINS:
+                self._pending_explains += 1
+                self._explainer.submit(self._explain, entry, engine, statement, parameters)
+        logger.warning(f"Slow query ({duration_ms:.0f} ms) on {key[1]}: {sql[:500]}")
+
+    def _explain(self, entry: Dict[str, Any], engine, statement: str, parameters: Any):
+        """Capture the plan of a slow SELECT, with its original parameters, off the request path"""
+        self._explaining.active = True
+        try:
+            prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+            with engine.connect() as conn:
+                result = conn.exec_driver_sql(prefix + statement, parameters)
+                columns = list(result.keys())
+                plan = [dict(zip(columns, (str(value) if value is not None else None for value in row)))
+                        for row in result]
+            with self._lock:
+                entry["plan"] = plan
+        except Exception as e:
+            logger.error(f"Could not explain slow query: {e}")
+        finally:
+            self._explaining.active = False
+            with self._lock:
+                self._pending_explains -= 1
+
+    def is_explaining(self) -> bool:
+        return getattr(self._explaining, "active", False)
+
+    def top(self, limit: int, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [dict(entry, avg_ms=entry["total_ms"] / entry["count"]) for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: entry[order_by], reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_MAX_ENTRIES)
+_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS and not slow_query_log.is_explaining():
+        # Logged (and explained) as written, without the request's statement timeout
+        slow_query_log.record(conn.engine, without_statement_timeout(statement), parameters, executemany, duration_ms)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute: drop its start time
+    if context.connection is not None and context.connection.info.get("query_start_time"):
+        context.connection.info["query_start_time"].pop()
+
+
+def install_slow_query_log():
+    """Time every statement of every engine (shards and replicas included). SLOW_QUERY_MS <= 0 disables it."""
+    global _installed
+    if _installed or settings.SLOW_QUERY_MS <= 0:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _installed = True
+
+
+class QueryContextMiddleware:
+    """ASGI middleware exposing the request's scope to the slow query log"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
@@ -1,11 +1,21 @@
-from database.create import create_database_if_not_exists, create_tables_sql, check_tables_exist
-from database.connection import engine, SessionLocal, Base
+import threading
+import time
+from database.connection import engine, SessionLocal, Base, DEFAULT_SHARD, shards
 
 # Initialize database only when explicitly called
 # Only use SQL file for table creation
 
+# Seconds between attempts of the background initialization, doubled up to the maximum
+INITIALIZATION_RETRY_SECONDS = 1
+INITIALIZATION_MAX_RETRY_SECONDS = 30
+
+database_ready = threading.Event()
+_initialization_thread = None
+
+
 def initialize_database():
     """Initialize database and tables - call this explicitly when needed"""
+    from database.create import create_database_if_not_exists, create_tables_sql, check_tables_exist, upgrade_database
     try:
         # First ensure database exists (Railway: just prints structure)
         if create_database_if_not_exists():
@@ -15,10 +25,38 @@ def initialize_database():
                 print("Database tables created successfully using SQL file")
             else:
                 print("Database and tables already exist. Skipping creation.")
-            return True
+            # Every shard has the same schema; their databases must already exist
+            for name, shard in shards.items():
+                if name != DEFAULT_SHARD and not check_tables_exist(bind=shard.engine):
+                    create_tables_sql(bind=shard.engine)
+                    print(f"Tables created on shard '{name}'")
+            # Then bring existing tables up to date, everywhere
+            return all(upgrade_database(bind=shard.engine) for shard in shards.values())
     except Exception as e:
         print(f"Warning: Could not create database/tables: {e}")
         return False
 
+
+def _initialize_until_ready():
+    delay = INITIALIZATION_RETRY_SECONDS
+    while not initialize_database():
+        print(f"Retrying database initialization in {delay}s")
+        time.sleep(delay)
+        delay = min(delay * 2, INITIALIZATION_MAX_RETRY_SECONDS)
+    database_ready.set()
+    print("Database initialization completed")
+
+
+def start_database_initialization():
+    """
+    Initialize the database in a background thread, retrying until it succeeds.
+    The app serves meanwhile; `database_ready` is set once it's done.
+    """
+    global _initialization_thread
+    if _initialization_thread is None:
+        _initialization_thread = threading.Thread(target=_initialize_until_ready, name="database-init", daemon=True)
+        _initialization_thread.start()
+    return _initialization_thread
+
 # Remove any automatic SQLAlchemy table creation
 # Only use SQL file for table creation
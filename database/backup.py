@@ -0,0 +1,239 @@
+"""
+Per-entity backups: one entity's data streamed to a compressed file, and restored from it.
+
+    python -m database.backup dump ENTITY_ID FILE [--chunk-size N]
+    python -m database.backup restore FILE [--shard SHARD] [--replace] [--chunk-size N]
+
+A backup holds every table of TENANT_TABLES, parents first, each in primary key order, as gzip-compressed
+JSON lines: a header, then for every table its columns, its rows (a JSON array each) and its row count.
+It's read in a single transaction, so on InnoDB it is a consistent snapshot of the entity.
+
+A restore loads the rows with bulk inserts of --chunk-size rows in one transaction on the target shard:
+nothing is written unless the whole file is read and every table's row count matches.
+An entity that still exists is only overwritten with --replace, and its sessions are revoked afterwards.
+"""
+from sqlalchemy import DateTime, LargeBinary
+from database.connection import Base, DEFAULT_SHARD, SessionLocal, forget_entity_shard, shards
+from database.shards import DEFAULT_CHUNK_SIZE, TENANT_TABLES, delete_tenant, delete_tenant_rows, iter_tenant_rows
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, TextIO, Tuple
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import time
+
+import models  # noqa: F401  (registers every table in Base.metadata)
+from models.entity import Entity
+from models.entity_shard import EntityShard
+
+logger = logging.getLogger(__name__)
+
+BACKUP_FORMAT = "raffles-entity-backup"
+BACKUP_VERSION = 1
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Can't back up a {type(value).__name__} value")
+
+
+def _decoder(column):
+    """Inverse of _encode for a column's values, or None when JSON already gives them back as they were"""
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode
+    return None
+
+
+def _write(out: TextIO, item):
+    out.write(json.dumps(item, default=_encode) + "\n")
+
+
+def dump_tenant(entity_id: int, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Write an entity's backup to path, reading from the shard holding its data.
+    The file only appears once complete. Returns the rows written per table.
+    """
+    with SessionLocal() as directory:
+        if directory.get(Entity, entity_id) is None:
+            raise ValueError(f"Entity {entity_id} does not exist")
+        mapping = directory.get(EntityShard, entity_id)
+        shard = mapping.shard if mapping else DEFAULT_SHARD
+        if mapping and mapping.state == "moving":
+            raise ValueError(f"Entity {entity_id} is being moved between shards, try again later")
+
+    counts = {}
+    partial = f"{path}.partial"
+    with shards[shard].engine.connect() as conn, conn.begin(), gzip.open(partial, "wt", encoding="utf-8") as out:
+        _write(out, {"format": BACKUP_FORMAT, "version": BACKUP_VERSION, "entity_id": entity_id,
+                     "shard": shard, "created_at": datetime.utcnow()})
+        for table_name, entity_column in TENANT_TABLES:
+            columns = [column.name for column in Base.metadata.tables[table_name].columns]
+            _write(out, {"table": table_name, "columns": columns})
+            counts[table_name] = 0
+            for rows in iter_tenant_rows(conn, table_name, entity_column, entity_id, chunk_size):
+                out.writelines(json.dumps([row[name] for name in columns], default=_encode) + "\n" for row in rows)
+                counts[table_name] += len(rows)
+            _write(out, {"end": table_name, "rows": counts[table_name]})
+        _write(out, {"end_of_backup": True})
+    os.replace(partial, path)
+    return counts
+
+
+def read_backup_header(source: TextIO) -> dict:
+    """First line of an open backup, checking it is one this code can restore"""
+    line = source.readline()
+    header = json.loads(line) if line else {}
+    if header.get("format") != BACKUP_FORMAT:
+        raise ValueError("Not an entity backup")
+    if header.get("version") != BACKUP_VERSION:
+        raise ValueError(f"Unsupported backup version {header.get('version')}")
+    return header
+
+
+def read_backup(source: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, List[dict]]]:
+    """Rows of an open backup after its header, table by table, in chunks. Checks every table's row count."""
+    table, rows, count = None, [], 0
+    for line in source:
+        item = json.loads(line)
+        if isinstance(item, list):
+            if table is None:
+                raise ValueError("Row outside of a table in the backup")
+            rows.append({name: decode(value) if decode and value is not None else value
+                         for (name, decode), value in zip(columns, item)})
+            count += 1
+            if len(rows) >= chunk_size:
+                yield table.name, rows
+                rows = []
+        elif "table" in item:
+            table = Base.metadata.tables.get(item["table"])
+            if table is None:
+                raise ValueError(f"Unknown table {item['table']} in the backup")
+            unknown = [name for name in item["columns"] if name not in table.c]
+            if unknown:
+                raise ValueError(f"Columns {', '.join(unknown)} of {table.name} no longer exist")
+            columns = [(name, _decoder(table.c[name])) for name in item["columns"]]
+            count = 0
+        elif "end" in item:
+            if rows:
+                yield table.name, rows
+                rows = []
+            if count != item["rows"]:
+                raise ValueError(f"Read {count} rows of {item['end']}, the backup has {item['rows']}")
+            table = None
+        elif item.get("end_of_backup"):
+            return
+    raise ValueError("The backup is truncated")
+
+
+@contextmanager
+def _bulk_load(conn):
+    """Skip per-row constraint checks while loading rows that were consistent when backed up (MySQL)"""
+    mysql = conn.dialect.name in ("mysql", "mariadb")
+    if mysql:
+        conn.exec_driver_sql("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+    try:
+        yield
+    finally:
+        if mysql:
+            conn.exec_driver_sql("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+
+
+def restore_tenant(path: str, shard: str = None, replace: bool = False,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Load an entity's backup, on its current shard or (for entities that no longer exist) on the given one.
+    With replace, the entity's current data is deleted in the same transaction. Returns the rows loaded per table.
+    """
+    entities = Base.metadata.tables["entities"]
+    with gzip.open(path, "rt", encoding="utf-8") as source:
+        entity_id = read_backup_header(source)["entity_id"]
+        chunks = read_backup(source, chunk_size)
+        table_name, entity_rows = next(chunks, (None, []))
+        if table_name != "entities" or [row["id"] for row in entity_rows] != [entity_id]:
+            raise ValueError("The backup doesn't start with its entity")
+        entity_row = entity_rows[0]
+
+        with SessionLocal() as directory:
+            exists = directory.get(Entity, entity_id) is not None
+            mapping = directory.get(EntityShard, entity_id)
+            current = mapping.shard if mapping else DEFAULT_SHARD
+        if exists and not replace:
+            raise ValueError(f"Entity {entity_id} exists: use --replace to overwrite its data")
+        target = shard or current
+        if target not in shards:
+            raise ValueError(f"Unknown shard '{target}'")
+        if exists and target != current:
+            raise ValueError(f"Entity {entity_id} is on shard '{current}': restore it there, then move it")
+
+        counts = {"entities": 1}
+        with shards[target].engine.begin() as conn:
+            if exists:
+                delete_tenant_rows(conn, entity_id, keep_entity_row=True)
+                conn.execute(entities.update().where(entities.c.id == entity_id).values(**entity_row))
+            else:
+                conn.execute(entities.insert(), [entity_row])
+            with _bulk_load(conn):
+                for table_name, rows in chunks:
+                    conn.execute(Base.metadata.tables[table_name].insert(), rows)
+                    counts[table_name] = counts.get(table_name, 0) + len(rows)
+
+    if target != DEFAULT_SHARD:
+        # The directory keeps the entity row (for logins) and its placement
+        try:
+            with SessionLocal() as directory:
+                if exists:
+                    directory.execute(entities.update().where(entities.c.id == entity_id).values(**entity_row))
+                else:
+                    directory.execute(entities.insert(), [entity_row])
+                    directory.add(EntityShard(entity_id=entity_id, shard=target, state="active"))
+                directory.commit()
+        except Exception:
+            if not exists:
+                delete_tenant(shards[target].engine, entity_id)
+            raise
+        forget_entity_shard(entity_id)
+
+    if exists:
+        # Restored passwords and managers may differ from the ones current sessions were opened with
+        from auth.refresh_tokens import revoke_sessions
+        revoke_sessions(entity_id, all_managers=True)
+    logger.info(f"Restored entity {entity_id} on shard '{target}': {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up and restore one entity's data")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="Write an entity's data to a compressed backup file")
+    dump.add_argument("entity_id", type=int)
+    dump.add_argument("file")
+    dump.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    restore = commands.add_parser("restore", help="Load an entity's backup file")
+    restore.add_argument("file")
+    restore.add_argument("--shard", default=None, help="Shard for an entity that no longer exists")
+    restore.add_argument("--replace", action="store_true", help="Overwrite the entity's current data")
+    restore.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    if args.command == "dump":
+        counts = dump_tenant(args.entity_id, args.file, args.chunk_size)
+    else:
+        counts = restore_tenant(args.file, args.shard, args.replace, args.chunk_size)
+    for table_name, count in counts.items():
+        print(f"{table_name}: {count} rows")
+    print(f"{sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
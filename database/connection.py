@@ -1,28 +1,167 @@
-from sqlalchemy import create_engine, text
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, text, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from core.config_loader import settings
+from core.local_store import get_local_store
+from core.batch import get_batch
+from core.slow_queries import install_slow_query_log
+from core.query_timeouts import install_statement_timeouts
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import itertools
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+# Shard holding the directory (entities and the entity -> shard map) and every unmapped entity
+DEFAULT_SHARD = "default"
+
+
+def create_database_engine(url: str):
+    """Engine with the pool settings used for every database"""
+    return create_engine(
+        url,
+        echo=False,  # Cambiar a True para ver las queries SQL
+        pool_pre_ping=True,
+        pool_recycle=300
+    )
+
+
 # Crear el engine de la base de datos
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,  # Cambié de database_url a SQLALCHEMY_DATABASE_URI
-    echo=False,  # Cambiar a True para ver las queries SQL
-    pool_pre_ping=True,
-    pool_recycle=300
-)
+engine = create_database_engine(settings.SQLALCHEMY_DATABASE_URI)
+
+# Time every statement of every engine, reporting the slow ones
+install_slow_query_log()
+
+# Limit the statements run for requests by route class, and cancel them when clients disconnect
+install_statement_timeouts()
+
+
+class ShardEngines:
+    """Primary engine of a shard plus its optional read replicas"""
+
+    def __init__(self, name: str, primary_engine, replica_urls: List[str]):
+        self.name = name
+        self.engine = primary_engine
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=primary_engine)
+        self.replica_engines = [create_database_engine(url) for url in replica_urls]
+        self.replica_session_factories = [sessionmaker(autocommit=False, autoflush=False, bind=replica)
+                                          for replica in self.replica_engines]
+        self._replica_cycle = itertools.count()
+
+    def replica_session_factory(self) -> Optional[sessionmaker]:
+        """Next replica, round-robin, or None without replicas"""
+        if not self.replica_session_factories:
+            return None
+        return self.replica_session_factories[next(self._replica_cycle) % len(self.replica_session_factories)]
+
+
+# Engine registry: every shard by name. SHARDS adds shards next to the default database.
+shards: Dict[str, ShardEngines] = {DEFAULT_SHARD: ShardEngines(DEFAULT_SHARD, engine, settings.READ_REPLICA_URLS)}
+SessionLocal = shards[DEFAULT_SHARD].session_factory
+for _name, _urls in settings.SHARDS.items():
+    shards[_name] = ShardEngines(_name, create_database_engine(_urls[0]), _urls[1:])
+
+# entity id -> (shard, state, cached at)
+_entity_shard_cache: Dict[int, Tuple[str, str, float]] = {}
+# entity name -> id, for entity tokens issued before they carried the id
+_entity_id_cache: Dict[str, int] = {}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
+def get_entity_shard(entity_id: Optional[int]) -> str:
     """
-    Dependency to get database session for FastAPI.
+    Shard holding an entity's data, from the directory's entity_shards table.
+
+    Cached for SHARD_MAP_CACHE_SECONDS. Entities being moved between shards get a 503 until
+    the move finishes.
     """
-    db = SessionLocal()
+    if entity_id is None or len(shards) == 1:
+        return DEFAULT_SHARD
+
+    cached = _entity_shard_cache.get(entity_id)
+    if cached is None or time.monotonic() - cached[2] > settings.SHARD_MAP_CACHE_SECONDS:
+        with SessionLocal() as directory:
+            row = directory.execute(text("SELECT shard, state FROM entity_shards WHERE entity_id = :entity_id"),
+                                    {"entity_id": entity_id}).first()
+        shard, state = (row[0], row[1]) if row else (DEFAULT_SHARD, "active")
+        if shard not in shards:
+            logger.error(f"Entity {entity_id} is mapped to unknown shard '{shard}'")
+            shard = DEFAULT_SHARD
+        cached = _entity_shard_cache[entity_id] = (shard, state, time.monotonic())
+
+    if cached[1] == "moving":
+        raise HTTPException(status_code=503, detail="This account is being moved, try again in a few minutes",
+                            headers={"Retry-After": "60"})
+    return cached[0]
+
+
+def forget_entity_shard(entity_id: int):
+    """Drop an entity from this process' shard map cache"""
+    _entity_shard_cache.pop(entity_id, None)
+
+
+def get_token_entity_id(credentials: str) -> Optional[int]:
+    """Entity id carried by a JWT, or None if the token is invalid (auth rejects it later)"""
+    from jose import JWTError, jwt
+    from auth.utils import ALGORITHM, SECRET_KEY
+    try:
+        payload = jwt.decode(credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("entity_id") is not None:
+        return int(payload["entity_id"])
+    if payload.get("type") == "entity" and payload.get("sub"):
+        name = payload["sub"]
+        if name not in _entity_id_cache:
+            with SessionLocal() as directory:
+                entity_id = directory.execute(text("SELECT id FROM entities WHERE name = :name"),
+                                              {"name": name}).scalar()
+            if entity_id is None:
+                return None
+            _entity_id_cache[name] = entity_id
+        return _entity_id_cache[name]
+    return None
+
+
+def get_request_shard(request: Request) -> str:
+    """Shard of the authenticated principal; the default shard for anonymous requests"""
+    if len(shards) == 1:
+        return DEFAULT_SHARD
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return DEFAULT_SHARD
+    return get_entity_shard(get_token_entity_id(authorization[7:]))
+
+
+def open_entity_session(entity_id: Optional[int]) -> Session:
+    """New session on the primary of an entity's shard; the caller closes it"""
+    return shards[get_entity_shard(entity_id)].session_factory()
+
+
+def get_client_key(request: Request) -> Optional[str]:
+    """Identify the client session behind a request by its credentials"""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()[:24]
+
+
+@event.listens_for(Session, "after_commit")
+def remember_client_write(session: Session):
+    """After a client writes, keep its reads on the primary for a while (read-your-writes)"""
+    client_key = session.info.get("client_key")
+    if client_key:
+        get_local_store().set(f"sticky:{client_key}", "1", settings.READ_STICKINESS_SECONDS)
+
+
+def _primary_session(request: Request, shard: ShardEngines):
+    db = shard.session_factory()
+    if shard.replica_engines:
+        db.info["client_key"] = get_client_key(request)
     try:
         # Test de conexión antes de usar la sesión
         db.execute(text("SELECT 1"))
@@ -34,6 +173,53 @@ def get_db():
     finally:
         db.close()
 
+
+def get_db(request: Request):
+    """
+    Dependency to get database session for FastAPI.
+    The session is bound to the primary of the authenticated entity's shard.
+    Sub-requests of a /batch share the batch's session instead.
+    """
+    batch = get_batch()
+    if batch is not None:
+        yield batch.db  # Closed by the batch
+        return
+    yield from _primary_session(request, shards[get_request_shard(request)])
+
+
+def get_read_db(request: Request):
+    """
+    Dependency to get a read-only database session for FastAPI.
+
+    Uses a read replica of the entity's shard when configured, unless the client wrote
+    something recently or the replica is unreachable; then it falls back to the primary.
+    Sub-requests of a /batch read through the batch's session, so they see its writes.
+    """
+    batch = get_batch()
+    if batch is not None:
+        yield batch.db
+        return
+    shard = shards[get_request_shard(request)]
+    client_key = get_client_key(request)
+    replica_factory = shard.replica_session_factory()
+    if replica_factory is None or (client_key and get_local_store().get(f"sticky:{client_key}")):
+        yield from _primary_session(request, shard)
+        return
+
+    db = replica_factory()
+    try:
+        db.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error(f"Read replica connection failed, using primary: {e}")
+        db.close()
+        yield from _primary_session(request, shard)
+        return
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def create_tables():
     """Crear todas las tablas en la base de datos"""
     try:
@@ -12,6 +12,16 @@ structure_path = Path(__file__).resolve().parent / "structure.sql"
 
 IS_RAILWAY = getattr(settings, "ENVIRONMENT", "local").lower() == "railway"
 
+# Tables that structure.sql must have created. Every statement in it is idempotent
+# (IF NOT EXISTS), so adding a table here makes existing databases pick it up on startup.
+REQUIRED_TABLES = ['entities', 'managers', 'projects', 'buyers', 'raffle_sets', 'raffles',
+                   'draws', 'draw_winners', 'entity_shards', 'project_archives',
+                   'raffle_events', 'project_versions', 'refresh_tokens', 'buyer_stats',
+                   'sales_rollups']
+
+# Indexes added to tables that already existed: (table, index name), as declared on the models
+UPGRADE_INDEXES = [('raffles', 'idx_raffle_project_state')]
+
 def get_sys_engine():
     """Create system engine for database operations"""
     database_url = settings.SQLALCHEMY_DATABASE_URI
@@ -23,13 +33,12 @@ def get_sys_engine():
         # Local environment - connect to server without database for creation
         return create_engine(f"mysql+pymysql://{settings.MARIADB_USERNAME}:{settings.MARIADB_PASSWORD}@{settings.MARIADB_SERVER}:{settings.MARIADB_PORT}")
 
-def check_tables_exist(verbose=False):
-    """Check if all required tables exist, optionally log missing tables."""
-    required_tables = ['entities', 'managers', 'projects', 'buyers', 'raffle_sets', 'raffles']
+def check_tables_exist(verbose=False, bind=None):
+    """Check if all required tables exist (on `bind`, the main database by default), optionally log missing tables."""
     missing = []
     try:
-        with engine.connect() as conn:
-            for table in required_tables:
+        with (bind or engine).connect() as conn:
+            for table in REQUIRED_TABLES:
                 result = conn.execute(text(f"SHOW TABLES LIKE '{table}'"))
                 if not result.fetchone():
                     missing.append(table)
@@ -52,6 +61,14 @@ def create_tables_sqlalchemy():
         from models.project import Project
         from models.raffleset import RaffleSet
         from models.raffle import Raffle
+        from models.draw import Draw, DrawWinner
+        from models.entity_shard import EntityShard
+        from models.project_archive import ProjectArchive
+        from models.raffle_event import RaffleEvent
+        from models.project_version import ProjectVersion
+        from models.refresh_token import RefreshToken
+        from models.buyer_stats import BuyerStats
+        from models.sales_rollup import SalesRollup
 
         logger.info("Creating tables using SQLAlchemy...")
         Base.metadata.create_all(bind=engine)
@@ -61,8 +78,10 @@ def create_tables_sqlalchemy():
         logger.error(f"Error creating tables with SQLAlchemy: {e}")
         return False
 
-def create_tables_sql():
-    """Create tables using the SQL file as fallback, ensuring triggers are created after tables."""
+def create_tables_sql(bind=None):
+    """Create tables using the SQL file as fallback, ensuring triggers are created after tables.
+    Runs on `bind` (a shard's engine) or the main database."""
+    bind = bind or engine
     if not structure_path.exists():
         logger.error(f"SQL structure file not found: {structure_path}")
         return False
@@ -79,7 +98,7 @@ def create_tables_sql():
             trigger_sql = 'DELIMITER'.join(sql_blocks[1:])
 
         # Parse and execute table creation statements robustly
-        with engine.connect() as conn:
+        with bind.connect() as conn:
             statement = ''
             for line in table_sql.splitlines():
                 line = line.strip()
@@ -99,13 +118,13 @@ def create_tables_sql():
             conn.commit()
 
         # Validate table existence before creating triggers
-        if not check_tables_exist(verbose=True):
+        if not check_tables_exist(verbose=True, bind=bind):
             logger.error("Table creation failed, not all tables exist.")
             return False
 
         # Now execute triggers in a new connection to ensure tables are visible
         if trigger_sql:
-            with engine.connect() as conn:
+            with bind.connect() as conn:
                 # Remove DELIMITER and split by $$
                 trigger_blocks = trigger_sql.replace('DELIMITER', '').split('$$')
                 for trigger in trigger_blocks:
@@ -121,6 +140,27 @@ def create_tables_sql():
         logger.error(f"Error creating tables with SQL file: {e}")
         return False
 
+def upgrade_database(bind=None):
+    """
+    Bring the tables of an existing database (`bind`, the main one by default) up to date: idempotent steps
+    run on every startup once the tables exist, however they were created. Returns False if a step failed.
+    """
+    from sqlalchemy.orm import Session
+    from routes.buyer import backfill_buyer_stats
+    import models  # noqa: F401  (registers every table in Base.metadata)
+    try:
+        for table_name, index_name in UPGRADE_INDEXES:
+            index = next(index for index in Base.metadata.tables[table_name].indexes if index.name == index_name)
+            index.create(bind=bind or engine, checkfirst=True)
+        with Session(bind=bind or engine) as db:
+            created = backfill_buyer_stats(db)
+        if created:
+            logger.info(f"Backfilled the stats of {created} buyers")
+        return True
+    except Exception as e:
+        logger.error(f"Error upgrading the database: {e}")
+        return False
+
 def print_db_structure():
     """Print the DB structure from structure.sql"""
     if structure_path.exists():
@@ -171,24 +211,19 @@ def create_database():
         # Check if tables exist
         if check_tables_exist():
             logger.info("All tables already exist, skipping creation")
-            return
-
         # Try SQLAlchemy first
-        if create_tables_sqlalchemy():
-            # Verify tables were created
-            if check_tables_exist():
-                logger.info("Database tables created successfully with SQLAlchemy")
-                return
-
+        elif create_tables_sqlalchemy() and check_tables_exist():
+            logger.info("Database tables created successfully with SQLAlchemy")
         # Fallback to SQL file
-        logger.info("SQLAlchemy method failed or incomplete, trying SQL file...")
-        if create_tables_sql():
-            if check_tables_exist():
-                logger.info("Database tables created successfully with SQL file")
-                return
-
-        # If we get here, both methods failed
-        raise Exception("Failed to create tables with both SQLAlchemy and SQL file methods")
+        else:
+            logger.info("SQLAlchemy method failed or incomplete, trying SQL file...")
+            if not (create_tables_sql() and check_tables_exist()):
+                # If we get here, both methods failed
+                raise Exception("Failed to create tables with both SQLAlchemy and SQL file methods")
+            logger.info("Database tables created successfully with SQL file")
+
+        if not upgrade_database():
+            raise Exception("Failed to upgrade the database tables")
 
     except OperationalError as e:
         if "Unknown database" in str(e):
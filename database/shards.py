@@ -0,0 +1,192 @@
+"""
+Tenant placement and moves between shards.
+
+    python -m database.shards list
+    python -m database.shards move ENTITY_ID SHARD [--chunk-size N]
+"""
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from database.connection import Base, DEFAULT_SHARD, SessionLocal, forget_entity_shard, shards
+from core.config_loader import settings
+from typing import Dict, Iterator, List
+import argparse
+import logging
+import time
+
+import models  # noqa: F401  (registers every table in Base.metadata)
+from models.entity import Entity
+from models.entity_shard import EntityShard
+
+logger = logging.getLogger(__name__)
+
+# Tables holding an entity's data, parents first, with the column holding the entity id.
+# New per-entity tables must be added here to be moved (and backed up) with their entity.
+TENANT_TABLES = [
+    ("entities", "id"),
+    ("managers", "entity_id"),
+    ("buyers", "entity_id"),
+    ("buyer_stats", "entity_id"),
+    ("projects", "entity_id"),
+    ("raffle_sets", "entity_id"),
+    ("raffles", "entity_id"),
+    ("draws", "entity_id"),
+    ("draw_winners", "entity_id"),
+    ("project_archives", "entity_id"),
+    ("raffle_events", "entity_id"),
+    ("project_versions", "entity_id"),
+    ("sales_rollups", "entity_id"),
+]
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def get_shard_loads(directory: Session) -> Dict[str, int]:
+    """Entities placed on each shard"""
+    loads = {name: 0 for name in shards}
+    mapped = 0
+    for shard, count in directory.query(EntityShard.shard, func.count()).group_by(EntityShard.shard):
+        if shard in loads and shard != DEFAULT_SHARD:
+            loads[shard] = count
+            mapped += count
+    loads[DEFAULT_SHARD] = directory.query(func.count(Entity.id)).scalar() - mapped
+    return loads
+
+
+def place_new_entity(directory: Session, entity: Entity) -> str:
+    """
+    Put a just registered entity on the least-loaded shard (fewest entities, the default shard on ties).
+    Its row is copied there so the shard's foreign keys and authentication work. Returns the shard.
+    """
+    if len(shards) == 1:
+        return DEFAULT_SHARD
+    loads = get_shard_loads(directory)
+    loads[DEFAULT_SHARD] -= 1  # The new entity is already in the directory
+    shard = min(loads, key=lambda name: (loads[name], name != DEFAULT_SHARD, name))
+    if shard == DEFAULT_SHARD:
+        return shard
+
+    entities = Base.metadata.tables["entities"]
+    row = directory.execute(select(entities).where(entities.c.id == entity.id)).mappings().one()
+    try:
+        with shards[shard].engine.begin() as conn:
+            conn.execute(entities.insert(), [dict(row)])
+    except Exception as e:
+        # The entity is already registered: keep it on the default shard rather than failing
+        logger.error(f"Could not place entity {entity.id} on shard '{shard}': {e}")
+        return DEFAULT_SHARD
+    directory.add(EntityShard(entity_id=entity.id, shard=shard, state="active"))
+    directory.commit()
+    return shard
+
+
+def iter_tenant_rows(conn, table_name: str, entity_column: str, entity_id: int,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Stream an entity's rows of one table in primary key order, chunk by chunk"""
+    table = Base.metadata.tables[table_name]
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+        select(table).where(table.c[entity_column] == entity_id).order_by(*table.primary_key.columns))
+    for rows in result.mappings().partitions():
+        yield [dict(row) for row in rows]
+
+
+def copy_tenant(source_engine, target_engine, entity_id: int, skip_entity_row: bool = False,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Copy an entity's rows between databases in one target transaction, checking every table's row count.
+    Returns the rows copied per table. Nothing is written if anything fails.
+    """
+    copied = {}
+    with source_engine.connect() as source, target_engine.begin() as target:
+        for table_name, entity_column in TENANT_TABLES:
+            if skip_entity_row and table_name == "entities":
+                continue
+            table = Base.metadata.tables[table_name]
+            copied[table_name] = 0
+            for rows in iter_tenant_rows(source, table_name, entity_column, entity_id, chunk_size):
+                target.execute(table.insert(), rows)
+                copied[table_name] += len(rows)
+            expected = source.execute(select(func.count()).select_from(table)
+                                      .where(table.c[entity_column] == entity_id)).scalar()
+            if copied[table_name] != expected:
+                raise RuntimeError(f"Copied {copied[table_name]} rows of {table_name}, expected {expected}")
+    return copied
+
+
+def delete_tenant_rows(conn, entity_id: int, keep_entity_row: bool = False):
+    """Delete an entity's rows in the connection's transaction, children first"""
+    for table_name, entity_column in reversed(TENANT_TABLES):
+        if keep_entity_row and table_name == "entities":
+            continue
+        conn.execute(text(f"DELETE FROM {table_name} WHERE {entity_column} = :entity_id"),
+                     {"entity_id": entity_id})
+
+
+def delete_tenant(engine, entity_id: int, keep_entity_row: bool = False):
+    """Delete an entity's rows from a database, children first"""
+    with engine.begin() as conn:
+        delete_tenant_rows(conn, entity_id, keep_entity_row)
+
+
+def _set_entity_shard(directory: Session, entity_id: int, shard: str, state: str):
+    directory.merge(EntityShard(entity_id=entity_id, shard=shard, state=state))
+    directory.commit()
+    forget_entity_shard(entity_id)
+
+
+def move_tenant(entity_id: int, target_shard: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Move an entity's data to another shard.
+
+    The entity is marked as moving first and the move waits for every worker's shard map cache
+    to expire, so its requests get a 503 instead of writing to the old shard. The data is then
+    copied and checked, the directory switched and the old copy deleted. The directory keeps
+    the entity row on the default shard.
+    """
+    if target_shard not in shards:
+        raise ValueError(f"Unknown shard '{target_shard}'")
+    with SessionLocal() as directory:
+        if directory.get(Entity, entity_id) is None:
+            raise ValueError(f"Entity {entity_id} does not exist")
+        mapping = directory.get(EntityShard, entity_id)
+        source_shard = mapping.shard if mapping else DEFAULT_SHARD
+        if source_shard == target_shard:
+            raise ValueError(f"Entity {entity_id} is already on shard '{target_shard}'")
+
+        _set_entity_shard(directory, entity_id, source_shard, "moving")
+        try:
+            time.sleep(settings.SHARD_MAP_CACHE_SECONDS + 1)
+            copied = copy_tenant(shards[source_shard].engine, shards[target_shard].engine, entity_id,
+                                 skip_entity_row=target_shard == DEFAULT_SHARD, chunk_size=chunk_size)
+        except Exception:
+            _set_entity_shard(directory, entity_id, source_shard, "active")
+            raise
+        _set_entity_shard(directory, entity_id, target_shard, "active")
+
+    delete_tenant(shards[source_shard].engine, entity_id, keep_entity_row=source_shard == DEFAULT_SHARD)
+    logger.info(f"Moved entity {entity_id} from shard '{source_shard}' to '{target_shard}': {copied}")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect tenant shards and move entities between them")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show how many entities each shard holds")
+    move = commands.add_parser("move", help="Move an entity's data to another shard")
+    move.add_argument("entity_id", type=int)
+    move.add_argument("shard")
+    move.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "list":
+        with SessionLocal() as directory:
+            for name, count in get_shard_loads(directory).items():
+                print(f"{name}: {count} entities")
+    else:
+        copied = move_tenant(args.entity_id, args.shard, args.chunk_size)
+        for table_name, count in copied.items():
+            print(f"{table_name}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,7 @@
 -- =========================================================
 
 -- 1. ENTITIES TABLE (Base of the isolation system)
-CREATE TABLE entities (
+CREATE TABLE IF NOT EXISTS entities (
     id INT NOT NULL AUTO_INCREMENT,
     name VARCHAR(100) NOT NULL,
     hashed_password VARCHAR(255) NOT NULL,
@@ -39,7 +39,7 @@ CREATE TABLE entities (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 2. MANAGERS TABLE (Composite PK: entity_id + manager_number)
-CREATE TABLE managers (
+CREATE TABLE IF NOT EXISTS managers (
     entity_id INT NOT NULL,
     manager_number INT NOT NULL,
     username VARCHAR(50) NOT NULL,
@@ -55,7 +55,7 @@ CREATE TABLE managers (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 3. BUYERS TABLE (Composite PK: entity_id + buyer_number)
-CREATE TABLE buyers (
+CREATE TABLE IF NOT EXISTS buyers (
     entity_id INT NOT NULL,
     buyer_number INT NOT NULL,
     name VARCHAR(100) NOT NULL,
@@ -77,7 +77,7 @@ CREATE TABLE buyers (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 4. PROJECTS TABLE (Composite PK: entity_id + project_number)
-CREATE TABLE projects (
+CREATE TABLE IF NOT EXISTS projects (
     entity_id INT NOT NULL,
     project_number INT NOT NULL,
     name VARCHAR(100) NOT NULL,
@@ -91,7 +91,7 @@ CREATE TABLE projects (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 5. RAFFLE SETS TABLE (Composite PK: entity_id + project_number + set_number)
-CREATE TABLE raffle_sets (
+CREATE TABLE IF NOT EXISTS raffle_sets (
     entity_id INT NOT NULL,
     project_number INT NOT NULL,
     set_number INT NOT NULL,
@@ -111,7 +111,7 @@ CREATE TABLE raffle_sets (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 6. RAFFLES TABLE (Composite PK: entity_id + project_number + raffle_number)
-CREATE TABLE raffles (
+CREATE TABLE IF NOT EXISTS raffles (
     entity_id INT NOT NULL,
     project_number INT NOT NULL,
     raffle_number INT NOT NULL,
@@ -136,6 +136,137 @@ CREATE TABLE raffles (
     CONSTRAINT chk_raffle_state CHECK (state IN ('available', 'sold', 'reserved'))
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Sold raffles of a project or set, for draws (standalone, so existing raffles tables get it too)
+CREATE INDEX IF NOT EXISTS idx_raffle_project_state ON raffles (entity_id, project_number, state, set_number);
+
+-- 7. DRAWS TABLE (Composite PK: entity_id + project_number + draw_number)
+CREATE TABLE IF NOT EXISTS draws (
+    entity_id INT NOT NULL,
+    project_number INT NOT NULL,
+    draw_number INT NOT NULL,
+    set_number INT,
+    seed VARCHAR(64) NOT NULL,
+    algorithm VARCHAR(20) NOT NULL,
+    winners_count INT NOT NULL,
+    sold_count INT NOT NULL,
+    range_start INT NOT NULL,
+    range_end INT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entity_id, project_number, draw_number),
+    CONSTRAINT fk_draw_project FOREIGN KEY (entity_id, project_number) REFERENCES projects(entity_id, project_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 8. DRAW WINNERS TABLE (Composite PK: entity_id + project_number + draw_number + position)
+CREATE TABLE IF NOT EXISTS draw_winners (
+    entity_id INT NOT NULL,
+    project_number INT NOT NULL,
+    draw_number INT NOT NULL,
+    position INT NOT NULL,
+    raffle_number INT NOT NULL,
+    buyer_number INT,
+    PRIMARY KEY (entity_id, project_number, draw_number, position),
+    CONSTRAINT fk_draw_winner_draw FOREIGN KEY (entity_id, project_number, draw_number) REFERENCES draws(entity_id, project_number, draw_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 9. ENTITY SHARDS TABLE (directory: which shard holds each entity's data)
+CREATE TABLE IF NOT EXISTS entity_shards (
+    entity_id INT NOT NULL PRIMARY KEY,
+    shard VARCHAR(50) NOT NULL,
+    state VARCHAR(10) NOT NULL DEFAULT 'active',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_entity_shards_shard (shard),
+    CONSTRAINT fk_entity_shard_entity FOREIGN KEY (entity_id) REFERENCES entities(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 10. PROJECT ARCHIVES TABLE (Composite PK: entity_id + project_number)
+-- Raffle sets and raffles of archived projects, moved out of the hot tables into one compressed blob
+CREATE TABLE IF NOT EXISTS project_archives (
+    entity_id INT NOT NULL,
+    project_number INT NOT NULL,
+    format VARCHAR(20) NOT NULL,
+    raffle_sets_count INT NOT NULL,
+    raffles_count INT NOT NULL,
+    size_bytes INT NOT NULL,
+    data LONGBLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entity_id, project_number),
+    CONSTRAINT fk_project_archive_project FOREIGN KEY (entity_id, project_number) REFERENCES projects(entity_id, project_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 11. RAFFLE EVENTS TABLE (append-only sales ledger)
+CREATE TABLE IF NOT EXISTS raffle_events (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    entity_id INT NOT NULL,
+    project_number INT NOT NULL,
+    raffle_number INT NOT NULL,
+    event_type VARCHAR(11) NOT NULL,
+    state VARCHAR(9) NOT NULL,
+    payment_method VARCHAR(8),
+    buyer_number INT,
+    actor_type VARCHAR(7) NOT NULL,
+    actor_manager_number INT,
+    created_at DATETIME(6) NOT NULL,
+    INDEX idx_raffle_events_raffle (entity_id, project_number, raffle_number, created_at),
+    INDEX idx_raffle_events_time (entity_id, project_number, created_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 12. PROJECT VERSIONS TABLE (Composite PK: entity_id + project_number)
+-- Bumped on every change to a project's sets or raffles; cached dashboards are keyed by it
+CREATE TABLE IF NOT EXISTS project_versions (
+    entity_id INT NOT NULL,
+    project_number INT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity_id, project_number),
+    CONSTRAINT fk_project_version_project FOREIGN KEY (entity_id, project_number) REFERENCES projects(entity_id, project_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 13. REFRESH TOKENS TABLE (main database: sessions of entities and their managers)
+-- Only SHA-256 hashes of the tokens are stored; a refresh rotates the token within its family
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    token_hash VARCHAR(64) NOT NULL,
+    family_id VARCHAR(32) NOT NULL,
+    entity_id INT NOT NULL,
+    manager_number INT,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME,
+    UNIQUE KEY uq_refresh_tokens_hash (token_hash),
+    INDEX idx_refresh_tokens_family (family_id),
+    INDEX idx_refresh_tokens_owner (entity_id, manager_number),
+    CONSTRAINT fk_refresh_token_entity FOREIGN KEY (entity_id) REFERENCES entities(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 14. BUYER STATS TABLE (Composite PK: entity_id + buyer_number)
+-- Tickets bought and total spent per buyer, updated in the same transaction as every sale and revert
+CREATE TABLE IF NOT EXISTS buyer_stats (
+    entity_id INT NOT NULL,
+    buyer_number INT NOT NULL,
+    tickets_bought INT NOT NULL DEFAULT 0,
+    total_spent BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity_id, buyer_number),
+    CONSTRAINT fk_buyer_stats_buyer FOREIGN KEY (entity_id, buyer_number) REFERENCES buyers(entity_id, buyer_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Buyers that already had purchases get their stats on startup (database.create.upgrade_database)
+
+-- 15. SALES ROLLUPS TABLE (Composite PK: entity_id + period + bucket_start + dimensions)
+-- Net tickets and amount sold per hour and per day (UTC), project, set, manager (0: the entity) and payment method
+CREATE TABLE IF NOT EXISTS sales_rollups (
+    entity_id INT NOT NULL,
+    period VARCHAR(4) NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    project_number INT NOT NULL,
+    set_number INT NOT NULL,
+    manager_number INT NOT NULL,
+    payment_method VARCHAR(8) NOT NULL,
+    tickets INT NOT NULL DEFAULT 0,
+    amount BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity_id, period, bucket_start, project_number, set_number, manager_number, payment_method),
+    KEY idx_sales_rollups_project (entity_id, project_number),
+    CONSTRAINT fk_sales_rollup_project FOREIGN KEY (entity_id, project_number) REFERENCES projects(entity_id, project_number) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- =========================================================
 -- AUTO-INCREMENT TRIGGERS FOR COMPOSITE PRIMARY KEYS
 -- =========================================================
@@ -143,7 +274,7 @@ CREATE TABLE raffles (
 DELIMITER $$
 
 -- Trigger for managers auto-increment
-CREATE TRIGGER tr_managers_auto_increment
+CREATE TRIGGER IF NOT EXISTS tr_managers_auto_increment
     BEFORE INSERT ON managers
     FOR EACH ROW
 BEGIN
@@ -157,7 +288,7 @@ BEGIN
 END$$
 
 -- Trigger for buyers auto-increment
-CREATE TRIGGER tr_buyers_auto_increment
+CREATE TRIGGER IF NOT EXISTS tr_buyers_auto_increment
     BEFORE INSERT ON buyers
     FOR EACH ROW
 BEGIN
@@ -171,7 +302,7 @@ BEGIN
 END$$
 
 -- Trigger for projects auto-increment
-CREATE TRIGGER tr_projects_auto_increment
+CREATE TRIGGER IF NOT EXISTS tr_projects_auto_increment
     BEFORE INSERT ON projects
     FOR EACH ROW
 BEGIN
@@ -185,7 +316,7 @@ BEGIN
 END$$
 
 -- Trigger for raffle_sets auto-increment
-CREATE TRIGGER tr_raffle_sets_auto_increment
+CREATE TRIGGER IF NOT EXISTS tr_raffle_sets_auto_increment
     BEFORE INSERT ON raffle_sets
     FOR EACH ROW
 BEGIN
@@ -199,7 +330,7 @@ BEGIN
 END$$
 
 -- Trigger for raffles auto-increment
-CREATE TRIGGER tr_raffles_auto_increment
+CREATE TRIGGER IF NOT EXISTS tr_raffles_auto_increment
     BEFORE INSERT ON raffles
     FOR EACH ROW
 BEGIN
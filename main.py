@@ -1,24 +1,25 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routes import buyer, project, raffleset, raffle, entity_auth, manager
+from routes import buyer, project, raffleset, raffle, entity_auth, manager, draw, events, archive, ledger, admin, dashboard, batch, sales
 from core.config_loader import settings
+from core.profiler import profile_requests
+from core.slow_queries import QueryContextMiddleware
+from core.query_timeouts import QueryCancelled, QueryCancellationMiddleware, interrupted_query_handler
+from sqlalchemy.exc import DBAPIError
 from typing import cast
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup"""
-    try:
-        from database import initialize_database
-        initialize_database()
-        print("Database initialization completed")
-    except Exception as e:
-        print(f"Warning: Database initialization failed: {e}")
-        # Continue anyway - the app can still start and database will be created on first request
+    """Initialize database on startup, in the background: the worker answers /health right away"""
+    from database import start_database_initialization
+    start_database_initialization()
 
     yield  # App runs here
 
-    # Cleanup on shutdown (if needed)
+    # Cleanup on shutdown: write the ledger events still queued
+    ledger.flush_ledger()
     print("Application shutting down")
 
 app = FastAPI(
@@ -54,11 +55,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Health check endpoint for Railway
+# Opt-in request profiling (see core.profiler)
+app.middleware("http")(profile_requests)
+
+# Lets the slow query log know which route issued each statement
+app.add_middleware(QueryContextMiddleware)
+
+# Statement timeouts by route, and cancellation of a request's queries when its client disconnects
+app.add_middleware(QueryCancellationMiddleware)
+app.add_exception_handler(DBAPIError, interrupted_query_handler)
+app.add_exception_handler(QueryCancelled, interrupted_query_handler)
+
+# Health check endpoint for Railway: the process is up (liveness)
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "system": "entity-manager"}
 
+# Readiness: the database has been initialized and requests can be served
+@app.get("/ready")
+async def readiness_check():
+    from database import database_ready
+    if not database_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting", "database": "initializing"})
+    return {"status": "ready", "database": "initialized"}
+
 # Include API routers
 
 # Entity-Manager Authentication Routes
@@ -69,6 +89,14 @@ app.include_router(buyer.router, tags=["Buyers"])
 app.include_router(project.router, tags=["Projects"])
 app.include_router(raffleset.router, tags=["Raffle Sets"])
 app.include_router(raffle.router, tags=["Raffles"])
+app.include_router(draw.router, tags=["Draws"])
+app.include_router(events.router, tags=["Live Events"])
+app.include_router(archive.router, tags=["Projects"])
+app.include_router(dashboard.router, tags=["Projects"])
+app.include_router(ledger.router, tags=["Sales Ledger"])
+app.include_router(sales.router, tags=["Sales Reports"])
+app.include_router(batch.router, tags=["Batch"])
+app.include_router(admin.router, tags=["Admin"])
 
 # Manager Management Routes
 app.include_router(manager.router, tags=["Managers"])
@@ -90,7 +118,8 @@ async def root():
             "entity_register": "/auth/entity/register",
             "entity_login": "/auth/entity/login",
             "manager_register": "/auth/manager/register",
-            "manager_login": "/auth/manager/login"
+            "manager_login": "/auth/manager/login",
+            "refresh": "/auth/refresh"
         }
     }
 
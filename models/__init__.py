@@ -4,6 +4,14 @@ from models.buyer import Buyer
 from models.project import Project
 from models.raffleset import RaffleSet
 from models.raffle import Raffle
+from models.draw import Draw, DrawWinner
+from models.entity_shard import EntityShard
+from models.project_archive import ProjectArchive
+from models.raffle_event import RaffleEvent
+from models.project_version import ProjectVersion
+from models.refresh_token import RefreshToken
+from models.buyer_stats import BuyerStats
+from models.sales_rollup import SalesRollup
 
 # Make sure all models are available for imports
-__all__ = ["Entity", "Manager", "Buyer", "Project", "RaffleSet", "Raffle"]
+__all__ = ["Entity", "Manager", "Buyer", "Project", "RaffleSet", "Raffle", "Draw", "DrawWinner", "EntityShard", "ProjectArchive", "RaffleEvent", "ProjectVersion", "RefreshToken", "BuyerStats", "SalesRollup"]
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKeyConstraint
+from database.connection import Base
+
+
+class BuyerStats(Base):
+    """Running totals of a buyer's purchases, kept in step with their sold raffles (archived ones included)"""
+    __tablename__ = "buyer_stats"
+
+    # Composite Primary Key (same as the buyer)
+    entity_id = Column(Integer, primary_key=True)
+    buyer_number = Column(Integer, primary_key=True)
+
+    # Data fields
+    tickets_bought = Column(Integer, nullable=False, default=0)
+    total_spent = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'buyer_number'], ['buyers.entity_id', 'buyers.buyer_number'],
+                             ondelete='CASCADE'),
+    )
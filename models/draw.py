@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKeyConstraint
+from database.connection import Base
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+
+class Draw(Base):
+    __tablename__ = "draws"
+
+    # Composite Primary Key
+    entity_id = Column(Integer, primary_key=True)
+    project_number = Column(Integer, primary_key=True)
+    draw_number = Column(Integer, primary_key=True)  # Auto-increment per project
+
+    # Data fields
+    set_number = Column(Integer, nullable=True)  # Draw restricted to one set, NULL for the whole project
+    seed = Column(String(64), nullable=False)  # Seed of the random sequence, to reproduce the draw
+    algorithm = Column(String(20), nullable=False)  # Selection method used
+    winners_count = Column(Integer, nullable=False)
+    sold_count = Column(Integer, nullable=False)  # Sold raffles in scope when the draw ran
+    range_start = Column(Integer, nullable=False)  # Lowest sold raffle number in scope
+    range_end = Column(Integer, nullable=False)  # Highest sold raffle number in scope
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Constraints and composite Foreign Keys
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number'],
+                             ondelete='CASCADE'),
+    )
+
+    # Relationships
+    winners = relationship("DrawWinner", back_populates="draw", cascade="all, delete-orphan",
+                           order_by="DrawWinner.position")
+
+
+class DrawWinner(Base):
+    __tablename__ = "draw_winners"
+
+    # Composite Primary Key
+    entity_id = Column(Integer, primary_key=True)
+    project_number = Column(Integer, primary_key=True)
+    draw_number = Column(Integer, primary_key=True)
+    position = Column(Integer, primary_key=True)  # 1 for the first prize
+
+    # Data fields
+    raffle_number = Column(Integer, nullable=False)
+    buyer_number = Column(Integer, nullable=True)  # Buyer at the time of the draw
+
+    # Constraints and composite Foreign Keys
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'project_number', 'draw_number'],
+                             ['draws.entity_id', 'draws.project_number', 'draws.draw_number'],
+                             ondelete='CASCADE'),
+    )
+
+    # Relationships
+    draw = relationship("Draw", back_populates="winners")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from database.connection import Base
+from sqlalchemy.sql import func
+
+
+class EntityShard(Base):
+    """Directory entry placing an entity's data on a shard. Entities without one live on the default shard."""
+    __tablename__ = "entity_shards"
+
+    entity_id = Column(Integer, ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(String(50), nullable=False, index=True)
+    state = Column(String(10), nullable=False, default="active")  # "active" or "moving"
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, ForeignKeyConstraint
+from database.connection import Base
+from sqlalchemy.sql import func
+
+
+class ProjectArchive(Base):
+    """Raffle sets and raffles of an archived project, compressed in one columnar blob (see core.archive)"""
+    __tablename__ = "project_archives"
+
+    # Composite Primary Key (same as the archived project)
+    entity_id = Column(Integer, primary_key=True)
+    project_number = Column(Integer, primary_key=True)
+
+    # Data fields
+    format = Column(String(20), nullable=False)
+    raffle_sets_count = Column(Integer, nullable=False)
+    raffles_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    data = Column(LargeBinary(length=2 ** 32 - 1), nullable=False)  # LONGBLOB
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number'],
+                             ondelete='CASCADE'),
+    )
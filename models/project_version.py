@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKeyConstraint
+from database.connection import Base
+
+
+class ProjectVersion(Base):
+    """Counter bumped on every change to a project's data; cached project views are keyed by it"""
+    __tablename__ = "project_versions"
+
+    # Composite Primary Key (same as the project)
+    entity_id = Column(Integer, primary_key=True)
+    project_number = Column(Integer, primary_key=True)
+
+    # Data fields
+    version = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number'],
+                             ondelete='CASCADE'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, CheckConstraint, ForeignKeyConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, CheckConstraint, ForeignKeyConstraint, Index
 from database.connection import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -30,11 +30,14 @@ class Raffle(Base):
         CheckConstraint("payment_method IN ('cash', 'card', 'transfer')", name='check_payment_method'),
         CheckConstraint("state IN ('available', 'sold', 'reserved')", name='check_state'),
         ForeignKeyConstraint(['entity_id', 'project_number', 'set_number'],
-                             ['raffle_sets.entity_id', 'raffle_sets.project_number', 'raffle_sets.set_number']),
+                             ['raffle_sets.entity_id', 'raffle_sets.project_number', 'raffle_sets.set_number'],
+                             name='fk_raffle_set', ondelete='CASCADE'),
         ForeignKeyConstraint(['buyer_entity_id', 'buyer_number'],
                              ['buyers.entity_id', 'buyers.buyer_number']),
         ForeignKeyConstraint(['sold_by_entity_id', 'sold_by_manager_number'],
                              ['managers.entity_id', 'managers.manager_number']),
+        # Sold raffles of a project or set, for draws
+        Index("idx_raffle_project_state", "entity_id", "project_number", "state", "set_number"),
     )
 
     # Relationships with specific overlaps according to SQLAlchemy warnings
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from sqlalchemy.dialects import mysql
+from database.connection import Base
+
+
+class RaffleEvent(Base):
+    """Append-only ledger of raffle sales, reservations and state changes. Rows are never updated."""
+    __tablename__ = "raffle_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+
+    # Raffle the event belongs to
+    entity_id = Column(Integer, nullable=False)
+    project_number = Column(Integer, nullable=False)
+    raffle_number = Column(Integer, nullable=False)
+
+    # Data fields: the raffle right after the change
+    event_type = Column(String(11), nullable=False)  # 'sale', 'reservation', 'state', 'payment'
+    state = Column(String(9), nullable=False)
+    payment_method = Column(String(8), nullable=True)
+    buyer_number = Column(Integer, nullable=True)
+    actor_type = Column(String(7), nullable=False)  # 'entity' or 'manager'
+    actor_manager_number = Column(Integer, nullable=True)
+    created_at = Column(DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql", "mariadb"), nullable=False)  # UTC time of the change, not of the (batched) insert
+
+    __table_args__ = (
+        Index("idx_raffle_events_raffle", "entity_id", "project_number", "raffle_number", "created_at"),
+        Index("idx_raffle_events_time", "entity_id", "project_number", "created_at", "id"),
+    )
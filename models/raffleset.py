@@ -25,7 +25,8 @@ class RaffleSet(Base):
     __table_args__ = (
         CheckConstraint("type IN ('online', 'physical')", name='check_type'),
         CheckConstraint("init <= final", name='check_valid_numbers'),
-        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number']),
+        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number'],
+                             name='fk_raffleset_project', ondelete='CASCADE'),
     )
 
     # Relationships with specific overlaps according to SQLAlchemy warnings
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
+from database.connection import Base
+
+
+class RefreshToken(Base):
+    """
+    Refresh token of an entity or manager session, on the main database next to the entity directory.
+    Only the SHA-256 of the token is stored. Each refresh revokes the token and issues the next one of
+    its family (the session); presenting a revoked token again revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    family_id = Column(String(32), nullable=False, index=True)
+
+    # Owner: the entity itself, or one of its managers
+    entity_id = Column(Integer, ForeignKey("entities.id", ondelete="CASCADE"), nullable=False)
+    manager_number = Column(Integer, nullable=True)  # NULL for the entity's own sessions
+
+    # UTC times, like the JWT expirations
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_refresh_tokens_owner", "entity_id", "manager_number"),
+    )
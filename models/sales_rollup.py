@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKeyConstraint
+from database.connection import Base
+
+
+class SalesRollup(Base):
+    """
+    Net sales of one time bucket (an hour or a day, UTC) for one project, set, manager and payment method.
+    Updated in the same transaction as every sale and revert; a revert counts in the bucket it happens in.
+    """
+    __tablename__ = "sales_rollups"
+
+    # Composite Primary Key: time first, so a range of buckets is one contiguous index range
+    entity_id = Column(Integer, primary_key=True)
+    period = Column(String(4), primary_key=True)  # 'hour' or 'day'
+    bucket_start = Column(DateTime, primary_key=True)
+    project_number = Column(Integer, primary_key=True)
+    set_number = Column(Integer, primary_key=True)
+    manager_number = Column(Integer, primary_key=True)  # 0 for sales made by the entity itself
+    payment_method = Column(String(8), primary_key=True)  # '' when the sale has none
+
+    # Data fields
+    tickets = Column(Integer, nullable=False, default=0)
+    amount = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint(['entity_id', 'project_number'], ['projects.entity_id', 'projects.project_number'],
+                             ondelete='CASCADE'),
+    )
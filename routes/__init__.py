@@ -1,10 +1,22 @@
+import logging
+import time
+
 from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError, DatabaseError
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from typing import Dict, Any, Optional
+from sqlalchemy import func, text, update, delete, literal
+from typing import Callable, Dict, Any, Optional, List
 
 from models.entity import Entity
+from core.query_timeouts import raise_if_interrupted
+
+logger = logging.getLogger(__name__)
+
+
+def get_key_columns(Model) -> List[Any]:
+    """Composite primary key columns of a model after entity_id, in declaration order"""
+    return [getattr(Model, column.key) for column in Model.__table__.primary_key.columns
+            if column.key != "entity_id"]
 
 
 def get_next_number(db: Session, Model, entity_id: int, filters: Optional[Dict[str, Any]] = None) -> int:
@@ -20,20 +32,11 @@ def get_next_number(db: Session, Model, entity_id: int, filters: Optional[Dict[s
     Returns:
         Next available number for the specified scope
     """
-    # Determine which column is the auto-increment field
-    number_field = None
-    if hasattr(Model, 'buyer_number'):
-        number_field = Model.buyer_number
-    elif hasattr(Model, 'project_number'):
-        number_field = Model.project_number
-    elif hasattr(Model, 'set_number'):
-        number_field = Model.set_number
-    elif hasattr(Model, 'raffle_number'):
-        number_field = Model.raffle_number
-    elif hasattr(Model, 'manager_number'):
-        number_field = Model.manager_number
-    else:
+    # The auto-increment field is the last column of the composite PK (buyer_number, set_number, ...)
+    key_columns = get_key_columns(Model)
+    if not key_columns:
         raise ValueError(f"Model {Model.__name__} doesn't have a recognized number field")
+    number_field = key_columns[-1]
 
     # Build query
     query = db.query(func.max(number_field)).filter(getattr(Model, "entity_id") == entity_id)
@@ -63,10 +66,10 @@ def get_record_by_composite_key(db: Session, Model, entity_id: int, **kwargs):
     return record
 
 
-def get_records_filtered(db: Session, Model, entity_id: int, filters: Optional[Dict[str, Any]] = None,
-                        limit: int = 0, offset: int = 0):
-    """Universal function to get multiple records with filtering"""
-    query = db.query(Model).filter(getattr(Model, "entity_id") == entity_id)
+def apply_list_filters(query, Model, entity_id: int, filters: Optional[Dict[str, Any]] = None,
+                       limit: int = 0, offset: int = 0):
+    """Entity scope, equality filters, composite PK order and pagination shared by the list helpers"""
+    query = query.filter(getattr(Model, "entity_id") == entity_id)
 
     # Apply filters
     if filters:
@@ -74,18 +77,8 @@ def get_records_filtered(db: Session, Model, entity_id: int, filters: Optional[D
             if value is not None and hasattr(Model, field_name):
                 query = query.filter(getattr(Model, field_name) == value)
 
-    # Apply ordering based on model type
-    if hasattr(Model, 'buyer_number'):
-        query = query.order_by(Model.buyer_number)
-    elif hasattr(Model, 'manager_number'):
-        query = query.order_by(Model.manager_number)
-    elif hasattr(Model, 'project_number'):
-        if hasattr(Model, 'set_number'):
-            query = query.order_by(Model.project_number, Model.set_number)
-        elif hasattr(Model, 'raffle_number'):
-            query = query.order_by(Model.project_number, Model.raffle_number)
-        else:
-            query = query.order_by(Model.project_number)
+    # Order by the composite PK inside the entity (e.g. project_number, raffle_number)
+    query = query.order_by(*get_key_columns(Model))
 
     # Apply pagination
     if offset > 0:
@@ -93,7 +86,34 @@ def get_records_filtered(db: Session, Model, entity_id: int, filters: Optional[D
     if limit > 0:
         query = query.limit(limit)
 
-    return query.all()
+    return query
+
+
+def get_records_filtered(db: Session, Model, entity_id: int, filters: Optional[Dict[str, Any]] = None,
+                        limit: int = 0, offset: int = 0):
+    """Universal function to get multiple records with filtering"""
+    return apply_list_filters(db.query(Model), Model, entity_id, filters, limit, offset).all()
+
+
+def get_response_columns(Model, Schema, fields: Optional[List[str]] = None) -> List[Any]:
+    """Columns of a model that a response schema serializes (only `fields`, if given), in table order"""
+    fields = set(fields) if fields else Schema.model_fields
+    return [getattr(Model, column.key) for column in Model.__table__.columns if column.key in fields]
+
+
+def get_rows_filtered(db: Session, Model, Schema, entity_id: int, filters: Optional[Dict[str, Any]] = None,
+                      limit: int = 0, offset: int = 0, fields: Optional[List[str]] = None):
+    """
+    Same filtering and ordering as get_records_filtered, for list endpoints.
+
+    Selects only the columns `Schema` serializes (or the sparse fieldset `fields`) and returns them
+    as plain dicts: no ORM instances, identity map or relationship state, and Pydantic validates
+    dicts faster than it reads attributes.
+    """
+    columns = get_response_columns(Model, Schema, fields)
+    keys = [column.key for column in columns]
+    query = apply_list_filters(db.query(*columns), Model, entity_id, filters, limit, offset)
+    return [dict(zip(keys, row)) for row in query]
 
 
 def create_record(db: Session, new_record):
@@ -108,20 +128,102 @@ def create_record(db: Session, new_record):
         raise HTTPException(status_code=400, detail="Record already exists or violates constraints")
 
 
-def update_record_by_composite_key(db: Session, Model, entity_id: int, updates: Dict[str, Any], **pk_fields):
-    """Universal update function using composite primary key"""
-    # Get the record
-    record = get_record_by_composite_key(db, Model, entity_id, **pk_fields)
+def get_key_conditions(Model, entity_id: int, **key_fields) -> List[Any]:
+    """Build the WHERE predicates that identify a record inside an entity"""
+    conditions = [getattr(Model, "entity_id") == entity_id]
+    for key, value in key_fields.items():
+        if hasattr(Model, key):
+            conditions.append(getattr(Model, key) == value)
+    return conditions
+
+
+def raise_write_miss(db: Session, Model, entity_id: int, denied_status: int, denied_detail: str, **key_fields):
+    """
+    Explain why a guarded write matched no rows.
+
+    Only runs on the failure path: 404 if the record doesn't exist, otherwise the
+    extra predicates (ownership, permissions, state) rejected it.
+    """
+    exists = db.query(literal(1)).filter(*get_key_conditions(Model, entity_id, **key_fields)).first()
+    db.rollback()
+    if exists is None:
+        raise HTTPException(status_code=404, detail=f"{Model.__name__} not found")
+    raise HTTPException(status_code=denied_status, detail=denied_detail)
 
-    # Update fields (excluding PK fields)
+
+def update_record_by_composite_key(db: Session, Model, entity_id: int, updates: Dict[str, Any],
+                                   conditions: Optional[List[Any]] = None, denied_status: int = 403,
+                                   denied_detail: str = "You don't have permission to update this record",
+                                   before_commit: Optional[Callable[[Any], None]] = None, **pk_fields):
+    """
+    Universal update function using composite primary key.
+
+    The update and any extra predicates (ownership, permissions, expected state) are applied
+    in a single UPDATE statement, so routes don't need to load the record first. The new row
+    is returned with RETURNING when the dialect supports it, otherwise with one SELECT inside
+    the same transaction. before_commit(record) runs in that transaction too (e.g. for rollups).
+    """
     pk_field_names = set(pk_fields.keys())
-    for field, value in updates.items():
-        if field not in pk_field_names and hasattr(record, field):
-            setattr(record, field, value)
+    columns = set(Model.__table__.columns.keys())
+    values = {field: value for field, value in updates.items()
+              if field not in pk_field_names and field in columns}
 
-    db.commit()
-    db.refresh(record)
-    return record
+    key_conditions = get_key_conditions(Model, entity_id, **pk_fields)
+    where = key_conditions + list(conditions or [])
+
+    try:
+        if not values:
+            record = db.query(Model).filter(*where).first()
+        elif db.get_bind().dialect.update_returning:
+            stmt = (update(Model).where(*where).values(**values).returning(Model)
+                    .execution_options(synchronize_session=False, populate_existing=True))
+            record = db.scalars(stmt).first()
+        else:
+            result = db.execute(update(Model).where(*where).values(**values)
+                                .execution_options(synchronize_session=False))
+            record = None
+            if result.rowcount:
+                record = db.query(Model).filter(*key_conditions).populate_existing().first()
+
+        if record is None:
+            raise_write_miss(db, Model, entity_id, denied_status, denied_detail, **pk_fields)
+        if before_commit is not None:
+            before_commit(record)
+
+        # Detach before committing so the returned row isn't expired and re-read on serialization
+        db.expunge(record)
+        db.commit()
+        return record
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Record already exists or violates constraints")
+
+
+def delete_record_by_composite_key(db: Session, Model, entity_id: int, conditions: Optional[List[Any]] = None,
+                                   denied_detail: str = "You don't have permission to delete this record",
+                                   before_commit: Optional[Callable[[], None]] = None, **key_fields):
+    """
+    Universal delete function in a single DELETE statement.
+
+    Extra predicates (ownership, permissions) are part of the DELETE itself; dependent rows
+    are removed by the database's ON DELETE CASCADE constraints. before_commit() runs in the
+    same transaction, after the DELETE.
+    """
+    where = get_key_conditions(Model, entity_id, **key_fields) + list(conditions or [])
+    try:
+        result = db.execute(delete(Model).where(*where).execution_options(synchronize_session=False))
+        if not result.rowcount:
+            raise_write_miss(db, Model, entity_id, 403, denied_detail, **key_fields)
+        if before_commit is not None:
+            before_commit()
+        db.commit()
+        return {"message": "Record deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise_if_interrupted(e)
+        raise HTTPException(status_code=400, detail=f"Record cannot be deleted. Error: {str(e)}")
 
 
 def delete_record(db: Session, record, entity_id: int):
@@ -135,6 +237,7 @@ def delete_record(db: Session, record, entity_id: int):
         return {"message": "Record deleted successfully"}
     except Exception as e:
         db.rollback()
+        raise_if_interrupted(e)
         raise HTTPException(status_code=400, detail=f"Record cannot be deleted. Error: {str(e)}")
 
 
@@ -163,12 +266,54 @@ def get_next_raffle_number(db: Session, entity_id: int, project_number: int) ->
     return get_next_number(db, Raffle, entity_id, {'project_number': project_number})
 
 
+def get_next_draw_number(db: Session, entity_id: int, project_number: int) -> int:
+    """Get next draw number for a project"""
+    from models.draw import Draw
+    return get_next_number(db, Draw, entity_id, {'project_number': project_number})
+
+
 def get_next_manager_number(db: Session, entity_id: int) -> int:
     """Get next manager number for an entity"""
     from models.manager import Manager
     return get_next_number(db, Manager, entity_id)
 
 
+def new_project_version() -> int:
+    """
+    First version of a project's data: microseconds since the epoch. Project numbers are reused
+    after a delete, and this keeps a new project from repeating the old one's versions (and
+    getting its cached views and ETags).
+    """
+    return time.time_ns() // 1000
+
+
+def bump_project_version(db: Session, entity_id: int, project_number: int):
+    """
+    Mark a project's data as changed, so views cached per version (the dashboard) are rebuilt.
+
+    Call it after committing the change: the bump is its own short transaction, so the version
+    row isn't locked for the length of every sale. A failed bump is only logged; the cached
+    views expire on their own.
+    """
+    from models.project_version import ProjectVersion
+    key = [ProjectVersion.entity_id == entity_id, ProjectVersion.project_number == project_number]
+    bump = update(ProjectVersion).where(*key).values(version=ProjectVersion.version + 1)
+    try:
+        try:
+            if not db.execute(bump).rowcount:
+                db.add(ProjectVersion(entity_id=entity_id, project_number=project_number,
+                                       version=new_project_version()))
+            db.commit()
+        except IntegrityError:
+            # Another request created the row meanwhile: bump it instead
+            db.rollback()
+            db.execute(bump)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not bump version of project {entity_id}:{project_number}: {e}")
+
+
 def get_buyer_by_name_phone(db: Session, name: str, phone: str, entity_id: int):
     """Find buyer by unique name-phone combination"""
     from models.buyer import Buyer
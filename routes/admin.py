@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from auth.admin import require_admin
+from core.profiler import get_profile_store
+from core.slow_queries import slow_query_log
+from typing import Any, Dict, List, Literal
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles", response_model=List[Dict[str, Any]])
+def list_profiles():
+    """Stored request profiles, newest first"""
+    return get_profile_store().list()
+
+
+@router.get("/profiles/{capture_id}")
+def download_profile(capture_id: str):
+    """A profile as collapsed stacks, ready for flamegraph.pl or speedscope"""
+    path = get_profile_store().path(capture_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
+@router.get("/slow-queries", response_model=List[Dict[str, Any]])
+def list_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["total_ms", "max_ms", "avg_ms", "count"] = "total_ms"
+):
+    """
+    Slowest statements seen by this worker, grouped by normalized SQL and route,
+    with the EXPLAIN plan of SELECTs.
+    """
+    return slow_query_log.top(limit, order_by)
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    """Reset this worker's slow query statistics"""
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from database.connection import get_db
+from auth.services.entity_auth_service import get_current_entity
+from models.entity import Entity
+from models.project import Project
+from models.project_archive import ProjectArchive
+from models.raffle import Raffle
+from models.raffleset import RaffleSet
+from schemas.project import ProjectArchiveResponse
+from routes import get_record_by_composite_key, bump_project_version
+from core.archive import ARCHIVE_FORMAT, ArchiveCache, ArchivedProject, ArchiveWriter
+from core.config_loader import settings
+from typing import Optional
+
+router = APIRouter()
+
+# Raffles read per round trip while archiving
+ARCHIVE_BATCH_SIZE = 5000
+
+_archive_cache = ArchiveCache(settings.ARCHIVE_CACHE_RAFFLES)
+
+
+def is_project_archived(db: Session, entity_id: int, project_number: int) -> bool:
+    return db.query(ProjectArchive.project_number).filter(
+        ProjectArchive.entity_id == entity_id,
+        ProjectArchive.project_number == project_number
+    ).first() is not None
+
+
+def get_archived_project(db: Session, entity_id: int, project_number: int) -> Optional[ArchivedProject]:
+    """Decoded archive of a project, or None if it isn't archived. Decoded archives are cached per worker."""
+    archived = db.query(ProjectArchive.created_at).filter(
+        ProjectArchive.entity_id == entity_id,
+        ProjectArchive.project_number == project_number
+    ).first()
+    if archived is None:
+        return None
+
+    key = (entity_id, project_number, str(archived.created_at))
+    archive = _archive_cache.get(key)
+    if archive is None:
+        data = db.query(ProjectArchive.data).filter(
+            ProjectArchive.entity_id == entity_id,
+            ProjectArchive.project_number == project_number
+        ).scalar()
+        archive = ArchivedProject(entity_id, project_number, data)
+        _archive_cache.put(key, archive)
+    return archive
+
+
+@router.post("/project/{project_number}/archive", response_model=ProjectArchiveResponse)
+def archive_project(
+    project_number: int = Path(..., ge=1),
+    db: Session = Depends(get_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """
+    Archive a finished project: its raffle sets and raffles move out of the hot tables into one
+    compressed columnar archive. The raffle and raffle set GET endpoints keep serving them read-only.
+    Projects with reserved raffles can't be archived.
+    """
+    entity_id = current_entity.id
+    get_record_by_composite_key(db, Project, entity_id, project_number=project_number)
+    if is_project_archived(db, entity_id, project_number):
+        raise HTTPException(status_code=409, detail="Project is already archived")
+
+    raffle_columns = [column for column in Raffle.__table__.columns
+                      if column.name not in ("entity_id", "project_number")]
+    writer = ArchiveWriter([column.name for column in raffle_columns])
+    in_project = (Raffle.entity_id == entity_id, Raffle.project_number == project_number)
+
+    # Lock the project's raffles so no sale lands between the copy and the delete
+    rows = db.execute(select(*raffle_columns).where(*in_project).order_by(Raffle.raffle_number).with_for_update(),
+                      execution_options={"yield_per": ARCHIVE_BATCH_SIZE})
+    for row in rows.mappings():
+        if row["state"] == "reserved":
+            rows.close()
+            db.rollback()
+            raise HTTPException(status_code=409,
+                                detail="Project has reserved raffles, sell or release them before archiving")
+        writer.add_raffle(row)
+
+    raffle_sets = [dict(row) for row in db.execute(
+        select(RaffleSet.__table__).where(RaffleSet.entity_id == entity_id,
+                                          RaffleSet.project_number == project_number)
+        .order_by(RaffleSet.set_number)).mappings()]
+    data = writer.finish(raffle_sets)
+
+    archive = ProjectArchive(
+        entity_id=entity_id,
+        project_number=project_number,
+        format=ARCHIVE_FORMAT,
+        raffle_sets_count=len(raffle_sets),
+        raffles_count=writer.count,
+        size_bytes=len(data),
+        data=data
+    )
+    db.add(archive)
+    db.execute(delete(Raffle).where(*in_project))
+    db.execute(delete(RaffleSet).where(RaffleSet.entity_id == entity_id, RaffleSet.project_number == project_number))
+    db.commit()
+    bump_project_version(db, entity_id, project_number)
+    return db.query(ProjectArchive).with_entities(
+        ProjectArchive.entity_id, ProjectArchive.project_number, ProjectArchive.format,
+        ProjectArchive.raffle_sets_count, ProjectArchive.raffles_count, ProjectArchive.size_bytes,
+        ProjectArchive.created_at
+    ).filter(ProjectArchive.entity_id == entity_id, ProjectArchive.project_number == project_number).one()
@@ -0,0 +1,153 @@
+import json
+import logging
+from urllib.parse import urlsplit
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from database.connection import get_db
+from auth.services.entity_auth_service import get_current_entity_or_manager
+from schemas.batch import BatchOperation, BatchRequest, BatchResponse, BatchResult
+from core.batch import BatchContext, current_batch
+from core.slow_queries import current_scope
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+NOT_RUN = BatchResult(status=424, body={"detail": "Not run: an earlier operation failed"})
+
+
+def _decode_body(content_type: str, body: bytes):
+    if not body:
+        return None
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    return body.decode("utf-8", errors="replace")
+
+
+async def run_operation(request: Request, operation: BatchOperation) -> BatchResult:
+    """Run one operation through the app's router, in this request's task, and collect its response"""
+    url = urlsplit(operation.path)
+    if url.path.rstrip("/") == "/batch":
+        return BatchResult(status=400, body={"detail": "Batches can't be nested"})
+
+    body = b"" if operation.body is None else json.dumps(operation.body).encode()
+    headers = [(b"authorization", request.headers["authorization"].encode()),
+               (b"content-type", b"application/json"),
+               (b"content-length", str(len(body)).encode())]
+    if operation.idempotency_key:
+        headers.append((b"idempotency-key", operation.idempotency_key.encode()))
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": operation.method,
+        "scheme": request.url.scheme,
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": request.scope.get("root_path", ""),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "app": request.app,
+    }
+    # Lets the routes turn HTTPExceptions into responses, as they do outside a batch
+    for key in ("state", "starlette.exception_handlers"):
+        if key in request.scope:
+            scope[key] = request.scope[key]
+
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    response = {"status": 500, "content_type": "", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["content_type"] = dict(message.get("headers", [])).get(b"content-type", b"").decode()
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    token = current_scope.set(scope)
+    try:
+        await request.app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        # Raised by the router itself: unknown path or method
+        return BatchResult(status=e.status_code, body={"detail": e.detail})
+    except Exception as e:
+        logger.error(f"Batch operation {operation.method} {url.path} failed: {e}")
+        return BatchResult(status=500, body={"detail": "Internal Server Error"})
+    finally:
+        current_scope.reset(token)
+    return BatchResult(status=response["status"], body=_decode_body(response["content_type"], response["body"]))
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(
+    request: Request,
+    batch_request: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_entity_or_manager)
+):
+    """
+    Run several operations against the API's routes, in order, as the authenticated user.
+    They share one authentication and one database session. Each operation gets its own result.
+
+    With all_or_nothing, every operation runs in one transaction: the batch stops at the first
+    failure, rolls back everything with a 409, and the operations after it are reported as not run.
+    Otherwise each operation commits on its own and a failure doesn't stop the rest.
+    """
+    # A detached principal isn't expired (and reloaded) by each operation's commit
+    db.expunge(current_user[0])
+
+    session = db
+    if batch_request.all_or_nothing:
+        # Operations' commits become savepoints of the request session's transaction
+        session = await run_in_threadpool(
+            lambda: Session(bind=db.connection(), autoflush=False, join_transaction_mode="create_savepoint"))
+    batch = BatchContext(session, current_user, batch_request.all_or_nothing)
+
+    results = []
+    token = current_batch.set(batch)
+    try:
+        for operation in batch_request.operations:
+            result = await run_operation(request, operation)
+            results.append(result)
+            if batch.atomic and result.status >= 400:
+                break
+    finally:
+        current_batch.reset(token)
+
+    if not batch.atomic:
+        return BatchResponse(committed=True, results=results)
+
+    def finish(commit: bool):
+        session.close()
+        if commit:
+            db.commit()
+        else:
+            db.rollback()
+
+    failed = results[-1].status >= 400
+    try:
+        await run_in_threadpool(finish, not failed)
+    except Exception as e:
+        logger.error(f"Batch commit failed: {e}")
+        await run_in_threadpool(db.rollback)
+        failed = True
+    if failed:
+        await run_in_threadpool(batch.rolled_back)
+        results.extend([NOT_RUN] * (len(batch_request.operations) - len(results)))
+        return JSONResponse(status_code=409, content=BatchResponse(committed=False, results=results)
+                            .model_dump(mode="json"))
+    await run_in_threadpool(batch.committed)
+    return BatchResponse(committed=True, results=results)
@@ -1,55 +1,212 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Path, Query
+from sqlalchemy import update, select, and_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from models.entity import Entity
 from models.buyer import Buyer
-from schemas.buyer import BuyerCreate, BuyerUpdate, BuyerResponse, BuyerDeleteByNamePhone
-from routes import (get_records_filtered, create_record, update_record_by_composite_key, delete_record,
-                   get_buyer_by_name_phone, get_record_by_composite_key, get_next_buyer_number)
-from typing import List
+from models.buyer_stats import BuyerStats
+from models.project_archive import ProjectArchive
+from models.raffle import Raffle
+from models.raffleset import RaffleSet
+from schemas.buyer import BuyerCreate, BuyerUpdate, BuyerResponse, BuyerWithStatsResponse, BuyerDeleteByNamePhone
+from schemas.raffle import RaffleResponse
+from routes import (get_rows_filtered, create_record, update_record_by_composite_key,
+                   delete_record_by_composite_key, get_key_conditions, get_record_by_composite_key,
+                   get_next_buyer_number, get_response_columns, apply_list_filters)
+from routes.archive import get_archived_project
+from core.archive import ArchivedProject
+from collections import defaultdict
+from typing import Dict, List, Literal, Optional, Tuple
 from auth.services.entity_auth_service import get_current_active_manager, get_current_entity_or_manager
+from core.idempotency import run_idempotent
 
 router = APIRouter()
 
+
+def _ownership_conditions(user, user_type: str):
+    """Managers can only modify buyers they created. Entities can modify any buyer."""
+    if user_type == "manager":
+        return [Buyer.created_by_manager_number == user.manager_number]
+    return []
+
+
+def get_buyer_purchases(db: Session, entity_id: int, *conditions, lock: bool = False) -> Dict[int, Tuple[int, int]]:
+    """Tickets and amount paid per buyer among the entity's sold raffles matching the conditions"""
+    query = (
+        select(Raffle.buyer_number, func.count(), func.sum(RaffleSet.unit_price))
+        .join(RaffleSet, and_(RaffleSet.entity_id == Raffle.entity_id,
+                              RaffleSet.project_number == Raffle.project_number,
+                              RaffleSet.set_number == Raffle.set_number))
+        .where(Raffle.entity_id == entity_id, Raffle.state == "sold", Raffle.buyer_number.isnot(None), *conditions)
+        .group_by(Raffle.buyer_number)
+    )
+    if lock:
+        query = query.with_for_update()
+    return {buyer_number: (tickets, int(spent or 0)) for buyer_number, tickets, spent in db.execute(query)}
+
+
+def get_archived_buyer_purchases(archive: ArchivedProject) -> Dict[int, Tuple[int, int]]:
+    """Same as get_buyer_purchases, for the raffles of an archived project"""
+    prices = {raffle_set["set_number"]: raffle_set["unit_price"] for raffle_set in archive.raffle_sets}
+    purchases = defaultdict(lambda: (0, 0))
+    for raffle in archive.raffles({"state": "sold"}):
+        if raffle["buyer_number"] is not None:
+            tickets, spent = purchases[raffle["buyer_number"]]
+            purchases[raffle["buyer_number"]] = (tickets + 1, spent + prices[raffle["set_number"]])
+    return dict(purchases)
+
+
+def get_all_buyer_purchases(db: Session, entity_id: int, buyer_numbers: List[int]) -> Dict[int, Tuple[int, int]]:
+    """Tickets and amount paid by each of the buyers, in the hot raffles and in every archived project"""
+    purchases = defaultdict(lambda: (0, 0))
+    archives = [get_archived_project(db, entity_id, project_number) for project_number, in
+                db.query(ProjectArchive.project_number).filter(ProjectArchive.entity_id == entity_id)]
+    sources = [get_buyer_purchases(db, entity_id, Raffle.buyer_number.in_(buyer_numbers))]
+    sources += [get_archived_buyer_purchases(archive) for archive in archives if archive is not None]
+    wanted = set(buyer_numbers)
+    for source in sources:
+        for buyer_number, (tickets, spent) in source.items():
+            if buyer_number in wanted:
+                total_tickets, total_spent = purchases[buyer_number]
+                purchases[buyer_number] = (total_tickets + tickets, total_spent + spent)
+    return dict(purchases)
+
+
+def backfill_buyer_stats(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Create the stats of buyers that have none, from all their purchases, committing per chunk of buyers.
+    Idempotent: buyers get their stats row when created, so only databases upgraded from before buyer_stats
+    have any to fill, and a row created meanwhile by a sale is kept. Returns the rows created.
+    """
+    missing = (
+        select(Buyer.entity_id, Buyer.buyer_number)
+        .outerjoin(BuyerStats, and_(BuyerStats.entity_id == Buyer.entity_id,
+                                    BuyerStats.buyer_number == Buyer.buyer_number))
+        .where(BuyerStats.buyer_number.is_(None))
+        .order_by(Buyer.entity_id, Buyer.buyer_number)
+    )
+    buyers = defaultdict(list)
+    for entity_id, buyer_number in db.execute(missing):
+        buyers[entity_id].append(buyer_number)
+
+    created = 0
+    for entity_id, buyer_numbers in buyers.items():
+        for start in range(0, len(buyer_numbers), chunk_size):
+            chunk = buyer_numbers[start:start + chunk_size]
+            purchases = get_all_buyer_purchases(db, entity_id, chunk)
+            for buyer_number in chunk:
+                tickets, spent = purchases.get(buyer_number, (0, 0))
+                try:
+                    with db.begin_nested():
+                        db.add(BuyerStats(entity_id=entity_id, buyer_number=buyer_number,
+                                          tickets_bought=tickets, total_spent=spent))
+                    created += 1
+                except IntegrityError:
+                    # Created by a sale meanwhile from the same raffles, or the buyer is gone: keep it as is
+                    pass
+            db.commit()
+    return created
+
+
+def apply_buyer_purchases(db: Session, entity_id: int, added: Optional[Dict[int, Tuple[int, int]]] = None,
+                          removed: Optional[Dict[int, Tuple[int, int]]] = None):
+    """
+    Add and take back tickets and amounts in the buyers' stats, in the caller's transaction and after
+    the raffles changed. Buyers without stats yet get them computed from all their raffles, archived ones included.
+    """
+    changes = defaultdict(lambda: [0, 0])
+    for sign, purchases in ((1, added or {}), (-1, removed or {})):
+        for buyer_number, (tickets, spent) in purchases.items():
+            changes[buyer_number][0] += sign * tickets
+            changes[buyer_number][1] += sign * spent
+
+    for buyer_number, (tickets, spent) in changes.items():
+        if not tickets and not spent:
+            continue
+        add = (update(BuyerStats)
+               .where(BuyerStats.entity_id == entity_id, BuyerStats.buyer_number == buyer_number)
+               .values(tickets_bought=BuyerStats.tickets_bought + tickets,
+                       total_spent=BuyerStats.total_spent + spent)
+               .execution_options(synchronize_session=False))
+        if db.execute(add).rowcount:
+            continue
+        current = get_all_buyer_purchases(db, entity_id, [buyer_number]).get(buyer_number, (0, 0))
+        try:
+            with db.begin_nested():
+                db.add(BuyerStats(entity_id=entity_id, buyer_number=buyer_number,
+                                  tickets_bought=current[0], total_spent=current[1]))
+        except IntegrityError:
+            # Created by another transaction meanwhile: add to it instead
+            db.execute(add)
+
+
+def _delete_buyer(db: Session, entity_id: int, conditions, **key_fields):
+    """Detach the buyer's raffles and delete it, both guarded by the same predicates"""
+    buyer_numbers = select(Buyer.buyer_number).where(*get_key_conditions(Buyer, entity_id, **key_fields), *conditions)
+    db.execute(
+        update(Raffle)
+        .where(Raffle.buyer_entity_id == entity_id, Raffle.buyer_number.in_(buyer_numbers))
+        .values(buyer_entity_id=None, buyer_number=None)
+        .execution_options(synchronize_session=False)
+    )
+    return delete_record_by_composite_key(db, Buyer, entity_id, conditions,
+                                          denied_detail="Managers can only delete buyers they created.",
+                                          **key_fields)
+
 @router.post("/buyer", response_model=BuyerResponse)
 def create_buyer(
     buyer: BuyerCreate,
     db: Session = Depends(get_db),
-    current_manager = Depends(get_current_active_manager)
+    current_manager = Depends(get_current_active_manager),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Create a new buyer with auto-increment per entity. Only managers can create buyers."""
+    """
+    Create a new buyer with auto-increment per entity. Only managers can create buyers.
+    Send an Idempotency-Key header to make retries safe.
+    """
     entity_id = current_manager.entity_id
     created_by_manager_number = current_manager.manager_number
-    buyer_number = get_next_buyer_number(db, entity_id)
-    new_buyer = Buyer(
-        entity_id=entity_id,
-        buyer_number=buyer_number,
-        name=buyer.name,
-        phone=buyer.phone,
-        email=str(buyer.email) if buyer.email else None,
-        created_by_manager_number=created_by_manager_number
-    )
-    return create_record(db, new_buyer)
+
+    def create():
+        buyer_number = get_next_buyer_number(db, entity_id)
+        new_buyer = Buyer(
+            entity_id=entity_id,
+            buyer_number=buyer_number,
+            name=buyer.name,
+            phone=buyer.phone,
+            email=str(buyer.email) if buyer.email else None,
+            created_by_manager_number=created_by_manager_number
+        )
+        # Every buyer has stats from the start, so the startup backfill has nothing left to find
+        db.add(BuyerStats(entity_id=entity_id, buyer_number=buyer_number, tickets_bought=0, total_spent=0))
+        return create_record(db, new_buyer)
+
+    return run_idempotent(idempotency_key, f"{entity_id}:{created_by_manager_number}:create_buyer", buyer,
+                          BuyerResponse, create)
 
 @router.get("/buyer/{buyer_number}", response_model=BuyerResponse)
 def get_buyer(
     buyer_number: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_manager = Depends(get_current_active_manager)
 ):
     """Get a specific buyer by their number."""
     entity_id = current_manager.entity_id
     return get_record_by_composite_key(db, Buyer, entity_id, buyer_number=buyer_number)
 
-@router.get("/buyers", response_model=List[BuyerResponse])
+@router.get("/buyers", response_model=List[BuyerWithStatsResponse])
 def get_buyers(
     limit: int = 0,
     offset: int = 0,
     created_by_manager_number: int = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_entity_or_manager)
 ):
-    """Get buyers for the current entity or manager. Manager: only their buyers. Entity: all buyers, can filter by manager."""
+    """
+    Get buyers for the current entity or manager. Manager: only their buyers. Entity: all buyers, can filter by manager.
+    Every buyer comes with the tickets they bought and their total spent.
+    """
     # Determine user type
     if isinstance(current_user, tuple):
         user, user_type = current_user
@@ -64,7 +221,43 @@ def get_buyers(
         filters = {}
         if created_by_manager_number is not None:
             filters["created_by_manager_number"] = created_by_manager_number
-    return get_records_filtered(db, Buyer, entity_id, filters, limit, offset)
+    # The totals come from buyer_stats in the same query: one primary key lookup per listed buyer
+    query = db.query(
+        *get_response_columns(Buyer, BuyerResponse),
+        func.coalesce(BuyerStats.tickets_bought, 0).label("tickets_bought"),
+        func.coalesce(BuyerStats.total_spent, 0).label("total_spent")
+    ).outerjoin(BuyerStats, and_(BuyerStats.entity_id == Buyer.entity_id,
+                                 BuyerStats.buyer_number == Buyer.buyer_number))
+    return [row._asdict() for row in apply_list_filters(query, Buyer, entity_id, filters, limit, offset)]
+
+@router.get("/buyer/{buyer_number}/raffles", response_model=List[RaffleResponse])
+def get_buyer_raffles(
+    buyer_number: int = Path(..., ge=1),
+    state: Optional[Literal["sold", "reserved"]] = None,
+    include_archived: bool = Query(False, description="Also list the raffles of archived projects"),
+    limit: int = 0,
+    offset: int = 0,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_entity_or_manager)
+):
+    """
+    A buyer's raffles across all projects, by project and raffle number.
+    Raffles of archived projects are only listed with include_archived, which reads every archive of the entity.
+    """
+    user, user_type = current_user
+    entity_id = user.entity_id if user_type == "manager" else user.id
+    get_record_by_composite_key(db, Buyer, entity_id, buyer_number=buyer_number)
+    filters = {"buyer_entity_id": entity_id, "buyer_number": buyer_number, "state": state}
+    if not include_archived:
+        return get_rows_filtered(db, Raffle, RaffleResponse, entity_id, filters, limit, offset)
+
+    raffles = get_rows_filtered(db, Raffle, RaffleResponse, entity_id, filters)
+    archived_projects = db.query(ProjectArchive.project_number).filter(ProjectArchive.entity_id == entity_id).all()
+    for project_number, in archived_projects:
+        archive = get_archived_project(db, entity_id, project_number)
+        raffles.extend(archive.raffles({name: value for name, value in filters.items() if value is not None}))
+    raffles.sort(key=lambda raffle: (raffle["project_number"], raffle["raffle_number"]))
+    return raffles[offset:offset + limit if limit > 0 else None]
 
 @router.put("/buyer", response_model=BuyerResponse)
 def update_buyer(
@@ -79,12 +272,12 @@ def update_buyer(
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    buyer = get_record_by_composite_key(db, Buyer, entity_id, buyer_number=buyer_update.buyer_number)
-    if user_type == "manager" and buyer.created_by_manager_number != user.manager_number:
-        raise HTTPException(status_code=403, detail="Managers can only update buyers they created.")
     pk_fields = {'buyer_number': buyer_update.buyer_number}
     updates = {k: v for k, v in buyer_update.model_dump(exclude_unset=True).items() if k != 'buyer_number'}
-    return update_record_by_composite_key(db, Buyer, entity_id, updates, **pk_fields)
+    return update_record_by_composite_key(db, Buyer, entity_id, updates,
+                                          conditions=_ownership_conditions(user, user_type),
+                                          denied_detail="Managers can only update buyers they created.",
+                                          **pk_fields)
 
 @router.delete("/buyer/{buyer_number}")
 def delete_buyer_by_number(
@@ -99,10 +292,7 @@ def delete_buyer_by_number(
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    buyer = get_record_by_composite_key(db, Buyer, entity_id, buyer_number=buyer_number)
-    if user_type == "manager" and buyer.created_by_manager_number != user.manager_number:
-        raise HTTPException(status_code=403, detail="Managers can only delete buyers they created.")
-    return delete_record(db, buyer, entity_id)
+    return _delete_buyer(db, entity_id, _ownership_conditions(user, user_type), buyer_number=buyer_number)
 
 @router.delete("/buyer/by-name-phone")
 def delete_buyer_by_name_phone(
@@ -117,7 +307,5 @@ def delete_buyer_by_name_phone(
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    buyer = get_buyer_by_name_phone(db, buyer_data.name, buyer_data.phone, entity_id)
-    if user_type == "manager" and buyer.created_by_manager_number != user.manager_number:
-        raise HTTPException(status_code=403, detail="Managers can only delete buyers they created.")
-    return delete_record(db, buyer, entity_id)
+    return _delete_buyer(db, entity_id, _ownership_conditions(user, user_type),
+                         name=buyer_data.name, phone=buyer_data.phone)
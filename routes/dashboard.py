@@ -0,0 +1,120 @@
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from database.connection import get_read_db
+from auth.services.entity_auth_service import get_current_entity_or_manager
+from models.project import Project
+from models.project_version import ProjectVersion
+from models.raffle import Raffle
+from models.raffleset import RaffleSet
+from schemas.project import ProjectDashboardResponse, ProjectResponse, RaffleSetSummary
+from routes.archive import get_archived_project
+from core.batch import after_commit
+from core.local_store import get_local_store
+from core.config_loader import settings
+
+router = APIRouter()
+
+SET_FIELDS = ["set_number", "name", "type", "init", "final", "unit_price"]
+STATES = ("available", "reserved", "sold")
+
+
+def count_raffle_sets(db: Session, entity_id: int, project_number: int) -> list:
+    """Raffle sets of a project with their raffles counted by state, in one GROUP BY"""
+    set_columns = [getattr(RaffleSet, name) for name in SET_FIELDS]
+    rows = db.execute(
+        select(*set_columns, Raffle.state, func.count(Raffle.raffle_number))
+        .select_from(RaffleSet)
+        .outerjoin(Raffle, and_(Raffle.entity_id == RaffleSet.entity_id,
+                                Raffle.project_number == RaffleSet.project_number,
+                                Raffle.set_number == RaffleSet.set_number))
+        .where(RaffleSet.entity_id == entity_id, RaffleSet.project_number == project_number)
+        .group_by(*set_columns, Raffle.state)
+        .order_by(RaffleSet.set_number)
+    ).all()
+
+    summaries = {}
+    for row in rows:
+        summary = summaries.get(row.set_number)
+        if summary is None:
+            summary = summaries[row.set_number] = dict(zip(SET_FIELDS, row), **{state: 0 for state in STATES})
+        if row.state in STATES:
+            summary[row.state] = row[-1]
+    return list(summaries.values())
+
+
+def count_archived_raffle_sets(archive) -> list:
+    """Same as count_raffle_sets, from a project's archive"""
+    counts = Counter(zip(archive.columns["set_number"], archive.columns["state"]))
+    return [dict({name: raffle_set[name] for name in SET_FIELDS},
+                 **{state: counts[(raffle_set["set_number"], state)] for state in STATES})
+            for raffle_set in archive.raffle_sets]
+
+
+def build_dashboard(db: Session, project: Project, version: int) -> ProjectDashboardResponse:
+    summaries = count_raffle_sets(db, project.entity_id, project.project_number)
+    archived = False
+    if not summaries:
+        archive = get_archived_project(db, project.entity_id, project.project_number)
+        if archive is not None:
+            summaries = count_archived_raffle_sets(archive)
+            archived = True
+
+    raffle_sets = [RaffleSetSummary(**summary, revenue=summary["sold"] * summary["unit_price"])
+                   for summary in summaries]
+    totals = {state: sum(getattr(raffle_set, state) for raffle_set in raffle_sets) for state in STATES}
+    return ProjectDashboardResponse(
+        project=ProjectResponse.model_validate(project),
+        version=version,
+        archived=archived,
+        raffles=sum(totals.values()),
+        revenue=sum(raffle_set.revenue for raffle_set in raffle_sets),
+        raffle_sets=raffle_sets,
+        **totals
+    )
+
+
+@router.get("/project/{project_number}/dashboard", response_model=ProjectDashboardResponse)
+def get_project_dashboard(
+    request: Request,
+    project_number: int = Path(..., ge=1),
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_entity_or_manager)
+):
+    """
+    A project, its raffle sets and how many of their raffles are available, reserved and sold, with revenue.
+    Cached until the project's data changes: send the ETag back in If-None-Match to get a 304 meanwhile.
+    """
+    user, user_type = current_user
+    entity_id = user.entity_id if user_type == "manager" else user.id
+
+    # The project and its data version in one query; a cache hit needs nothing else
+    row = db.execute(
+        select(Project, ProjectVersion.version)
+        .outerjoin(ProjectVersion, and_(ProjectVersion.entity_id == Project.entity_id,
+                                        ProjectVersion.project_number == Project.project_number))
+        .where(Project.entity_id == entity_id, Project.project_number == project_number)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    project, version = row[0], row[1] or 0
+
+    # Project numbers are reused after a delete: the creation time tells the old and new project apart
+    # (besides their versions, which restart from the creation time too)
+    created = int(project.created_at.timestamp()) if project.created_at else 0
+    etag = f'"{entity_id}-{project_number}-{created}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    # The version is read before the aggregates, so a cached dashboard is never older than its key
+    store = get_local_store()
+    key = f"dashboard:{entity_id}:{project_number}:{created}:{version}"
+    body = store.get(key)
+    if body is None:
+        body = build_dashboard(db, project, version).model_dump_json()
+        # Inside an all-or-nothing batch the version may still be rolled back: cache once committed
+        after_commit(lambda: store.set(key, body, settings.DASHBOARD_CACHE_SECONDS))
+    return Response(content=body, media_type="application/json", headers=headers)
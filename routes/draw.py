@@ -0,0 +1,161 @@
+from fastapi import APIRouter, Depends, Path, HTTPException
+from sqlalchemy import and_, or_, select, func
+from sqlalchemy.orm import Session, selectinload
+from database.connection import get_db, get_read_db
+from models.entity import Entity
+from models.project import Project
+from models.raffle import Raffle
+from models.draw import Draw, DrawWinner
+from schemas.draw import DrawCreate, DrawResponse
+from routes import apply_list_filters, create_record, get_record_by_composite_key, get_next_draw_number
+from typing import Dict, List, Optional, Tuple
+from auth.services.entity_auth_service import get_current_entity
+import random
+import secrets
+
+router = APIRouter()
+
+# Candidates are random raffle numbers checked by primary key; the first distinct sold ones win
+REJECTION_ALGORITHM = "rejection-v1"
+# Fallback for very sparse sales: random ranks among the sold raffles, by set and raffle number
+RANK_ALGORITHM = "rank-v1"
+
+MAX_CANDIDATE_BATCH = 5000
+MAX_CANDIDATES = 200000
+
+
+def draw_winners(db: Session, entity_id: int, project_number: int, set_number: Optional[int],
+                 winners: int, seed: str) -> Tuple[str, int, int, int, Dict[int, Optional[int]]]:
+    """
+    Pick distinct winners uniformly among the sold raffles in scope, without loading them.
+
+    random.Random(seed) yields raffle numbers in [range_start, range_end]; the winners are the
+    first `winners` distinct numbers of that sequence that are sold. Each batch of candidates is
+    a single primary key lookup, and the batch size adapts to the share of sold raffles. The
+    result doesn't depend on batch sizes, so anyone with the seed and the sold raffles can
+    reproduce it.
+
+    When sold raffles are too sparse for that, random.Random(seed).sample(range(sold_count), winners)
+    gives distinct ranks among the sold raffles ordered by set and raffle number, and each rank is
+    read from the index, walking it once in rank order.
+
+    Returns (algorithm, sold_count, range_start, range_end, {raffle_number: buyer_number}) with
+    winners in prize order.
+    """
+    scope = [Raffle.entity_id == entity_id, Raffle.project_number == project_number, Raffle.state == "sold"]
+    if set_number is not None:
+        scope.append(Raffle.set_number == set_number)
+
+    sold_count, range_start, range_end = db.execute(
+        select(func.count(), func.min(Raffle.raffle_number), func.max(Raffle.raffle_number)).where(*scope)
+    ).one()
+    if sold_count < winners:
+        raise HTTPException(status_code=400,
+                            detail=f"Not enough sold raffles: {sold_count} sold, {winners} winners requested")
+
+    rng = random.Random(seed)
+    span = range_end - range_start + 1
+    picked: Dict[int, Optional[int]] = {}
+    checked = set()
+    drawn = 0
+    while len(picked) < winners and drawn < MAX_CANDIDATES:
+        missing = winners - len(picked)
+        batch = min(MAX_CANDIDATE_BATCH, int(missing * span / sold_count * 1.25) + 8)
+        candidates = [rng.randint(range_start, range_end) for _ in range(batch)]
+        drawn += batch
+
+        # A sold number is picked the first time it's checked, so repeated numbers never need a lookup
+        fresh = [number for number in dict.fromkeys(candidates) if number not in checked]
+        checked.update(fresh)
+        sold = dict(db.execute(
+            select(Raffle.raffle_number, Raffle.buyer_number).where(*scope, Raffle.raffle_number.in_(fresh))
+        ).all()) if fresh else {}
+
+        for number in candidates:
+            if number in sold and number not in picked:
+                picked[number] = sold[number]
+                if len(picked) == winners:
+                    break
+
+    if len(picked) == winners:
+        return REJECTION_ALGORITHM, sold_count, range_start, range_end, picked
+
+    # Sold raffles are too sparse in their range for random probing
+    ranks = random.Random(seed).sample(range(sold_count), winners)
+    by_rank = {}
+    previous_rank, after = -1, None
+    for rank in sorted(ranks):
+        query = select(Raffle.set_number, Raffle.raffle_number, Raffle.buyer_number).where(*scope)
+        if after is not None:
+            query = query.where(or_(Raffle.set_number > after[0],
+                                    and_(Raffle.set_number == after[0], Raffle.raffle_number > after[1])))
+        row = db.execute(
+            query.order_by(Raffle.set_number, Raffle.raffle_number).offset(rank - previous_rank - 1).limit(1)
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=409, detail="Sales changed during the draw, try again")
+        by_rank[rank] = (row.raffle_number, row.buyer_number)
+        previous_rank, after = rank, (row.set_number, row.raffle_number)
+    picked = dict(by_rank[rank] for rank in ranks)
+    return RANK_ALGORITHM, sold_count, range_start, range_end, picked
+
+
+@router.post("/project/{project_number}/draw", response_model=DrawResponse)
+def create_draw(
+    project_number: int = Path(..., ge=1),
+    draw: DrawCreate = ...,
+    db: Session = Depends(get_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """Draw winners among the sold raffles of a project or one of its sets, and store the result."""
+    get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
+
+    seed = draw.seed or secrets.token_hex(16)
+    algorithm, sold_count, range_start, range_end, picked = draw_winners(
+        db, current_entity.id, project_number, draw.set_number, draw.winners, seed)
+
+    draw_number = get_next_draw_number(db, current_entity.id, project_number)
+    new_draw = Draw(
+        entity_id=current_entity.id,
+        project_number=project_number,
+        draw_number=draw_number,
+        set_number=draw.set_number,
+        seed=seed,
+        algorithm=algorithm,
+        winners_count=draw.winners,
+        sold_count=sold_count,
+        range_start=range_start,
+        range_end=range_end,
+        winners=[
+            DrawWinner(entity_id=current_entity.id, project_number=project_number, draw_number=draw_number,
+                       position=position, raffle_number=raffle_number, buyer_number=buyer_number)
+            for position, (raffle_number, buyer_number) in enumerate(picked.items(), start=1)
+        ]
+    )
+    return create_record(db, new_draw)
+
+
+@router.get("/project/{project_number}/draw/{draw_number}", response_model=DrawResponse)
+def get_draw(
+    project_number: int = Path(..., ge=1),
+    draw_number: int = Path(..., ge=1),
+    db: Session = Depends(get_read_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """Get a stored draw with its seed and winners."""
+    return get_record_by_composite_key(db, Draw, current_entity.id,
+                                       project_number=project_number, draw_number=draw_number)
+
+
+@router.get("/project/{project_number}/draws", response_model=List[DrawResponse])
+def get_draws(
+    project_number: int = Path(..., ge=1),
+    limit: int = 0,
+    offset: int = 0,
+    db: Session = Depends(get_read_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """Get all draws of a project."""
+    # Winners of every listed draw in one more query, not one per draw
+    query = db.query(Draw).options(selectinload(Draw.winners))
+    return apply_list_filters(query, Draw, current_entity.id, {"project_number": project_number}, limit, offset).all()
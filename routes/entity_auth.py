@@ -1,16 +1,19 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, open_entity_session
 from auth.services.entity_auth_service import (
-    authenticate_entity, authenticate_manager, create_access_token, get_current_active_manager, get_current_entity)
-from auth.models.token import Token
+    authenticate_entity, authenticate_manager, create_access_token, get_current_active_manager, get_current_entity,
+    get_current_manager, get_entity_by_id, get_manager_by_composite_key)
+from auth.models.token import RefreshRequest, Token
+from auth.refresh_tokens import issue_refresh_token, revoke_refresh_token, revoke_sessions, rotate_refresh_token
 from models.entity import Entity
 from models.manager import Manager
 from schemas.entity import EntityCreate, EntityResponse
 from schemas.manager import ManagerCreate, ManagerResponse, ManagerLogin
 from auth.utils import get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.throttle import check_login_allowed, record_login_failure, login_buckets
 import logging
 
 router = APIRouter()
@@ -51,8 +54,12 @@ def register_entity(entity_data: EntityCreate, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(new_entity)
 
+        # Place the entity's data on the least-loaded shard
+        from database.shards import place_new_entity
+        shard = place_new_entity(db, new_entity)
+
         # Success log
-        logger.info(f"New entity registered successfully: {entity_data.name}")
+        logger.info(f"New entity registered successfully: {entity_data.name} (shard {shard})")
 
         return {
             "message": "Registration completed successfully",
@@ -129,12 +136,17 @@ def register_manager(
         )
 
 @router.post("/entity/login", response_model=Token)
-def login_entity(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """Secure entity login without revealing if the entity exists."""
+def login_entity(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """Secure entity login without revealing if the entity exists. Throttled per client IP and entity."""
+    # Throttled attempts are rejected before any password hashing
+    throttle_buckets = login_buckets(form_data.username)
+    check_login_allowed(request, throttle_buckets)
+
     entity = authenticate_entity(db, form_data.username, form_data.password)
     if not entity:
         # Log failed attempt
         logger.warning(f"Failed entity login attempt for: {form_data.username}")
+        record_login_failure(throttle_buckets)
 
         # Generic message that doesn't reveal if entity exists or password is wrong
         raise HTTPException(
@@ -146,27 +158,35 @@ def login_entity(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     # Log successful login
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=entity.name, subject_type="entity", expires_delta=access_token_expires
+        subject=entity.name, subject_type="entity", entity_id=entity.id, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": issue_refresh_token(entity.id)}
 
 @router.post("/manager/login", response_model=Token)
 def login_manager(
+    request: Request,
     login_data: ManagerLogin,
     db: Session = Depends(get_db)
 ):
-    """Multi-tenant manager login: requires entity_name, username, password."""
+    """Multi-tenant manager login: requires entity_name, username, password. Throttled per client IP, manager and entity."""
+    # Throttled attempts are rejected before any password hashing
+    throttle_buckets = login_buckets(login_data.entity_name, login_data.username)
+    check_login_allowed(request, throttle_buckets)
+
     # Check if entity exists
     from auth.services.entity_auth_service import get_entity, get_manager_by_entity_and_username, authenticate_manager_by_entity
     entity = get_entity(db, login_data.entity_name)
     if not entity:
+        record_login_failure(throttle_buckets)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="The entity you entered does not exist in the database."
         )
-    # Authenticate manager by entity
-    manager = authenticate_manager_by_entity(db, entity.id, login_data.username, login_data.password)
+    # Authenticate manager by entity, on the shard holding the entity's managers
+    with open_entity_session(entity.id) as tenant_db:
+        manager = authenticate_manager_by_entity(tenant_db, entity.id, login_data.username, login_data.password)
     if not manager:
+        record_login_failure(throttle_buckets)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect manager username or password",
@@ -176,7 +196,62 @@ def login_manager(
     access_token = create_access_token(
         subject=manager.username, subject_type="manager", entity_id=entity.id, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = issue_refresh_token(entity.id, manager.manager_number)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+def refresh_session(refresh_data: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and the next refresh token, without a password.
+    Each refresh token works once: reusing one ends its session.
+    """
+    entity_id, manager_number, refresh_token = rotate_refresh_token(refresh_data.refresh_token)
+
+    if manager_number is None:
+        entity = get_entity_by_id(db, entity_id)
+        subject, subject_type = (entity.name if entity else None), "entity"
+    else:
+        with open_entity_session(entity_id) as tenant_db:
+            manager = get_manager_by_composite_key(tenant_db, entity_id, manager_number)
+        subject = manager.username if manager is not None and manager.is_active else None
+        subject_type = "manager"
+    if subject is None:
+        revoke_refresh_token(refresh_token)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    access_token = create_access_token(
+        subject=subject, subject_type=subject_type, entity_id=entity_id,
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout")
+def logout(refresh_data: RefreshRequest):
+    """End the session of a refresh token. Its access tokens stay valid until they expire."""
+    revoke_refresh_token(refresh_data.refresh_token)
+    return {"message": "Session ended"}
+
+@router.delete("/entity/sessions")
+def revoke_entity_sessions(current_entity: Entity = Depends(get_current_entity)):
+    """End every session of the current entity and of all its managers"""
+    revoked = revoke_sessions(current_entity.id, all_managers=True)
+    return {"message": "Sessions revoked", "revoked": revoked}
+
+@router.delete("/manager/sessions")
+def revoke_own_manager_sessions(current_manager: Manager = Depends(get_current_manager)):
+    """End every session of the current manager"""
+    revoked = revoke_sessions(current_manager.entity_id, current_manager.manager_number)
+    return {"message": "Sessions revoked", "revoked": revoked}
+
+@router.delete("/manager/{manager_number}/sessions")
+def revoke_manager_sessions(manager_number: int, current_entity: Entity = Depends(get_current_entity)):
+    """End every session of one of the current entity's managers"""
+    revoked = revoke_sessions(current_entity.id, manager_number)
+    return {"message": "Sessions revoked", "revoked": revoked}
 
 @router.get("/entity/me", response_model=EntityResponse)
 def get_current_entity_info(current_entity: Entity = Depends(get_current_entity)):
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
+from database.connection import get_token_entity_id, open_entity_session
+from models.project import Project
+from auth.services.entity_auth_service import get_principal
+from routes import get_record_by_composite_key
+from core.events import get_event_hub, project_channel
+from typing import Optional
+import asyncio
+
+router = APIRouter()
+
+
+def authorize_project_listener(credentials: str, project_number: int) -> int:
+    """Authenticate a listener and check the project belongs to its entity. Returns the entity id."""
+    # Short-lived session: a listener must not hold a pooled connection while it's open
+    with open_entity_session(get_token_entity_id(credentials)) as db:
+        user, user_type = get_principal(db, credentials)
+        entity_id = user.entity_id if user_type == "manager" else user.id
+        get_record_by_composite_key(db, Project, entity_id, project_number=project_number)
+        return entity_id
+
+
+@router.websocket("/project/{project_number}/events")
+async def project_events(
+    websocket: WebSocket,
+    project_number: int,
+    since: Optional[int] = None,
+    token: Optional[str] = None
+):
+    """
+    Live sale, reservation and state change events of a project.
+    Authenticate with an Authorization header or a `token` query parameter (browsers can't set headers).
+    Reconnecting clients pass the last event id they received as `since` to replay what they missed.
+    A `{"type": "resync"}` message means the client fell behind (or asked to replay events that are no
+    longer kept) and should reload the raffles.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    credentials = token or (authorization[7:] if authorization.lower().startswith("bearer ") else "")
+    try:
+        entity_id = await run_in_threadpool(authorize_project_listener, credentials, project_number)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    hub = get_event_hub()
+    subscription, backlog = await hub.subscribe(project_channel(entity_id, project_number), since)
+    receiver = asyncio.ensure_future(websocket.receive_text())
+    try:
+        if backlog is None:
+            await websocket.send_text('{"type":"resync"}')
+            await websocket.close()
+            return
+        for message in backlog:
+            await websocket.send_text(message)
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                receiver.result()  # Raises WebSocketDisconnect once the client leaves
+                receiver = asyncio.ensure_future(websocket.receive_text())
+                continue
+            message = getter.result()
+            if message is None:
+                await websocket.send_text('{"type":"resync"}')
+                await websocket.close()
+                return
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscription)
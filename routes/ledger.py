@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from database.connection import get_read_db
+from auth.services.entity_auth_service import get_current_entity, get_current_entity_or_manager
+from models.entity import Entity
+from models.project import Project
+from models.raffle_event import RaffleEvent
+from schemas.raffle import RaffleEventResponse
+from routes import get_record_by_composite_key
+from core.batch import after_commit
+from core.batch_writer import BatchWriter
+from core.config_loader import settings
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+router = APIRouter()
+
+MAX_LEDGER_PAGE = 10000
+
+_ledger_writer = BatchWriter(RaffleEvent.__table__, settings.LEDGER_BATCH_SIZE, settings.LEDGER_FLUSH_INTERVAL,
+                             settings.LEDGER_QUEUE_SIZE)
+
+
+def record_raffle_events(db: Session, entity_id: int, project_number: int, raffle_numbers: Iterable[int],
+                         event_type: str, state: str, payment_method: Optional[str] = None,
+                         buyer_number: Optional[int] = None, actor_manager_number: Optional[int] = None):
+    """
+    Append committed raffle changes to the sales ledger.
+    Written in the background on the session's database, so the request doesn't wait for it.
+    """
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    actor_type = "manager" if actor_manager_number is not None else "entity"
+    rows = [{
+        "entity_id": entity_id,
+        "project_number": project_number,
+        "raffle_number": raffle_number,
+        "event_type": event_type,
+        "state": state,
+        "payment_method": payment_method,
+        "buyer_number": buyer_number,
+        "actor_type": actor_type,
+        "actor_manager_number": actor_manager_number,
+        "created_at": created_at,
+    } for raffle_number in raffle_numbers]
+    # The session may be bound to a connection (all-or-nothing batches): write through its engine
+    engine = db.get_bind().engine
+    after_commit(lambda: _ledger_writer.add(engine, rows))
+
+
+def flush_ledger():
+    """Write queued ledger events before the process exits"""
+    _ledger_writer.close()
+
+
+@router.get("/project/{project_number}/raffle/{raffle_number}/history", response_model=List[RaffleEventResponse])
+def get_raffle_history(
+    project_number: int = Path(..., ge=1),
+    raffle_number: int = Path(..., ge=1),
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_entity_or_manager)
+):
+    """
+    Every sale, reservation and state change of a raffle, oldest first.
+    Changes show up here a fraction of a second after they're made.
+    """
+    user, user_type = current_user
+    entity_id = user.entity_id if user_type == "manager" else user.id
+    return db.query(RaffleEvent).filter(
+        RaffleEvent.entity_id == entity_id,
+        RaffleEvent.project_number == project_number,
+        RaffleEvent.raffle_number == raffle_number
+    ).order_by(RaffleEvent.created_at, RaffleEvent.id).all()
+
+
+@router.get("/project/{project_number}/ledger", response_model=List[RaffleEventResponse])
+def get_project_ledger(
+    project_number: int = Path(..., ge=1),
+    since: Optional[datetime] = Query(None, description="Start of the range (UTC, inclusive)"),
+    until: Optional[datetime] = Query(None, description="End of the range (UTC, exclusive)"),
+    after_id: Optional[int] = Query(None, description="Id of the last entry of the previous page; pass its created_at as since"),
+    limit: int = Query(1000, ge=1, le=MAX_LEDGER_PAGE),
+    db: Session = Depends(get_read_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """
+    Ledger entries of a project in a time range, in (created_at, id) order.
+    To get the next page, pass the last entry's created_at as `since` and its id as `after_id`.
+    """
+    get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
+    if after_id is not None and since is None:
+        raise HTTPException(status_code=400, detail="after_id requires since")
+
+    query = db.query(RaffleEvent).filter(RaffleEvent.entity_id == current_entity.id,
+                                         RaffleEvent.project_number == project_number)
+    if since is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None) if since.tzinfo else since
+        if after_id is not None:
+            query = query.filter(tuple_(RaffleEvent.created_at, RaffleEvent.id) > tuple_(since, after_id))
+        else:
+            query = query.filter(RaffleEvent.created_at >= since)
+    if until is not None:
+        until = until.astimezone(timezone.utc).replace(tzinfo=None) if until.tzinfo else until
+        query = query.filter(RaffleEvent.created_at < until)
+    return query.order_by(RaffleEvent.created_at, RaffleEvent.id).limit(limit).all()
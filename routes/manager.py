@@ -1,20 +1,24 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from models.entity import Entity
 from models.manager import Manager
+from models.raffle import Raffle
 from schemas.manager import ManagerUpdate, ManagerResponse
-from routes import (get_records_filtered, update_record_by_composite_key, delete_record,
+from routes import (get_rows_filtered, update_record_by_composite_key, delete_record_by_composite_key,
                    get_record_by_composite_key)
 from typing import List
 from auth.services.entity_auth_service import get_current_entity
+from auth.refresh_tokens import revoke_sessions
+from core.batch import after_commit
 
 router = APIRouter()
 
 @router.get("/manager/{manager_number}", response_model=ManagerResponse)
 def get_manager(
     manager_number: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
     """Get a specific manager by their number."""
@@ -24,11 +28,11 @@ def get_manager(
 def get_managers(
     limit: int = 0,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
     """Get all managers for the current entity."""
-    return get_records_filtered(db, Manager, current_entity.id, None, limit, offset)
+    return get_rows_filtered(db, Manager, ManagerResponse, current_entity.id, None, limit, offset)
 
 @router.put("/manager", response_model=ManagerResponse)
 def update_manager(
@@ -39,7 +43,11 @@ def update_manager(
     """Update an existing manager."""
     pk_fields = {'manager_number': manager_update.manager_number}
     updates = {k: v for k, v in manager_update.model_dump(exclude_unset=True).items() if k != 'manager_number'}
-    return update_record_by_composite_key(db, Manager, current_entity.id, updates, **pk_fields)
+    manager = update_record_by_composite_key(db, Manager, current_entity.id, updates, **pk_fields)
+    if updates.get('is_active') is False:
+        # A deactivated manager can't refresh their sessions anymore
+        after_commit(lambda: revoke_sessions(current_entity.id, manager_update.manager_number))
+    return manager
 
 @router.delete("/manager/{manager_number}")
 def delete_manager(
@@ -48,5 +56,13 @@ def delete_manager(
     current_entity: Entity = Depends(get_current_entity)
 ):
     """Delete a manager by number."""
-    manager = get_record_by_composite_key(db, Manager, current_entity.id, manager_number=manager_number)
-    return delete_record(db, manager, current_entity.id)
+    # Keep the sold raffles, forgetting who sold them
+    db.execute(
+        update(Raffle)
+        .where(Raffle.sold_by_entity_id == current_entity.id, Raffle.sold_by_manager_number == manager_number)
+        .values(sold_by_entity_id=None, sold_by_manager_number=None)
+        .execution_options(synchronize_session=False)
+    )
+    result = delete_record_by_composite_key(db, Manager, current_entity.id, manager_number=manager_number)
+    after_commit(lambda: revoke_sessions(current_entity.id, manager_number))
+    return result
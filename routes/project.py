@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from models.entity import Entity
 from models.project import Project
 from schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
-from routes import (get_records_filtered, create_record, update_record_by_composite_key, delete_record,
-                   get_record_by_composite_key, get_next_project_number)
+from models.raffle import Raffle
+from models.raffleset import RaffleSet
+from routes import (get_rows_filtered, create_record, update_record_by_composite_key,
+                   delete_record_by_composite_key, get_record_by_composite_key, get_next_project_number,
+                   bump_project_version)
+from routes.archive import get_archived_project
+from routes.buyer import get_buyer_purchases, get_archived_buyer_purchases, apply_buyer_purchases
 from typing import List
 from auth.services.entity_auth_service import get_current_entity, get_current_entity_or_manager
 
@@ -27,13 +33,16 @@ def create_project(
         name=project.name,
         description=project.description
     )
-    return create_record(db, new_project)
+    created = create_record(db, new_project)
+    # Start its versions now: a reused project number must not match a deleted project's cached dashboard
+    bump_project_version(db, current_entity.id, project_number)
+    return created
 
 
 @router.get("/project/{project_number}", response_model=ProjectResponse)
 def get_project(
     project_number: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
     """Get a specific project by its number."""
@@ -44,7 +53,7 @@ def get_project(
 def get_projects(
     limit: int = 0,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_entity_or_manager)
 ):
     """Get all projects for the current entity or manager's entity."""
@@ -55,7 +64,7 @@ def get_projects(
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    return get_records_filtered(db, Project, entity_id, None, limit, offset)
+    return get_rows_filtered(db, Project, ProjectResponse, entity_id, None, limit, offset)
 
 
 @router.put("/project", response_model=ProjectResponse)
@@ -67,7 +76,9 @@ def update_project(
     """Update an existing project."""
     pk_fields = {'project_number': project_update.project_number}
     updates = {k: v for k, v in project_update.model_dump(exclude_unset=True).items() if k != 'project_number'}
-    return update_record_by_composite_key(db, Project, current_entity.id, updates, **pk_fields)
+    project = update_record_by_composite_key(db, Project, current_entity.id, updates, **pk_fields)
+    bump_project_version(db, current_entity.id, project_update.project_number)
+    return project
 
 
 @router.delete("/project/{project_number}")
@@ -76,6 +87,18 @@ def delete_project(
     db: Session = Depends(get_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
-    """Delete a project and all its associated sets/raffles."""
-    project = get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
-    return delete_record(db, project, current_entity.id)
+    """Delete a project and all its associated sets/raffles, taking its sales out of the buyers' stats."""
+    entity_id = current_entity.id
+    archive = get_archived_project(db, entity_id, project_number)
+    if archive is not None:
+        removed = get_archived_buyer_purchases(archive)
+    else:
+        removed = get_buyer_purchases(db, entity_id, Raffle.project_number == project_number, lock=True)
+    # Databases created from older models have no ON DELETE CASCADE on raffle_sets and raffles:
+    # delete them in the same transaction, children first
+    for Model in (Raffle, RaffleSet):
+        db.execute(delete(Model).where(Model.entity_id == entity_id, Model.project_number == project_number)
+                   .execution_options(synchronize_session=False))
+    return delete_record_by_composite_key(db, Project, entity_id,
+                                          before_commit=lambda: apply_buyer_purchases(db, entity_id, removed=removed),
+                                          project_number=project_number)
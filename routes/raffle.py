@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, Path, HTTPException
+from fastapi import APIRouter, Depends, Path, HTTPException, Header, Query, Request
+from sqlalchemy import update, select, and_, or_, not_, func
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from auth.services.entity_auth_service import get_current_entity, get_current_entity_or_manager
 from models.entity import Entity
 from models.raffle import Raffle
@@ -8,36 +9,87 @@ from models.raffleset import RaffleSet
 from models.buyer import Buyer
 from models.project import Project
 from models.manager import Manager
-from schemas.raffle import RaffleUpdate, RaffleResponse, RaffleSell, RaffleFilters
-from routes import get_record_by_composite_key, update_record_by_composite_key, get_records_filtered
-from typing import List, Union
+from schemas.raffle import (RaffleUpdate, RaffleResponse, RaffleSell, RaffleFilters, RaffleBulkUpdate,
+                            RaffleBulkResult, RaffleBulkConflict, MAX_BULK_RAFFLES)
+from routes import (get_record_by_composite_key, update_record_by_composite_key, get_rows_filtered, get_key_conditions,
+                    bump_project_version)
+from routes.archive import get_archived_project
+from routes.buyer import get_buyer_purchases, apply_buyer_purchases
+from routes.sales import get_sales, record_sales
+from routes.ledger import record_raffle_events
+from core.events import publish_project_event
+from core.idempotency import run_idempotent
+from core.response_encoding import parse_fields, encode_rows, LIST_ENCODING_RESPONSES
+from typing import List, Optional, Tuple, Union
 
 router = APIRouter()
 
+
+def merge_raffle_selection(raffle_numbers: List[int], ranges) -> List[Tuple[int, int]]:
+    """Merge single numbers and ranges into sorted, non-overlapping inclusive intervals"""
+    intervals = sorted([(number, number) for number in set(raffle_numbers)] +
+                       [(r.start, r.end) for r in ranges])
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def raffle_selection_condition(intervals: List[Tuple[int, int]]):
+    """BETWEEN for every run of consecutive numbers, one IN for the isolated ones"""
+    singles = [start for start, end in intervals if start == end]
+    clauses = [Raffle.raffle_number.between(start, end) for start, end in intervals if start != end]
+    if singles:
+        clauses.append(Raffle.raffle_number.in_(singles))
+    return or_(*clauses)
+
 @router.get("/project/{project_number}/raffle/{raffle_number}", response_model=RaffleResponse)
 def get_raffle(
     project_number: int = Path(..., ge=1),
     raffle_number: int = Path(..., ge=1),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_entity_or_manager)
 ):
-    """Get a specific raffle by its number within a project. Managers and entities can view any raffle."""
+    """
+    Get a specific raffle by its number within a project. Managers and entities can view any raffle.
+    Raffles of archived projects are served from the archive.
+    """
     if isinstance(current_user, tuple):
         user, user_type = current_user
     else:
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    return get_record_by_composite_key(db, Raffle, entity_id, project_number=project_number, raffle_number=raffle_number)
+    raffle = db.query(Raffle).filter(*get_key_conditions(Raffle, entity_id, project_number=project_number,
+                                                          raffle_number=raffle_number)).first()
+    if raffle is None:
+        archive = get_archived_project(db, entity_id, project_number)
+        raffle = archive.raffle(raffle_number) if archive else None
+        if raffle is None:
+            raise HTTPException(status_code=404, detail="Raffle not found")
+    return raffle
 
-@router.post("/project/{project_number}/raffles", response_model=List[RaffleResponse])
+@router.post("/project/{project_number}/raffles", response_model=List[RaffleResponse],
+             responses=LIST_ENCODING_RESPONSES)
 def get_raffles_filtered(
     project_number: int,
     filters: RaffleFilters,
-    db: Session = Depends(get_db),
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. raffle_number,state"),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_entity_or_manager)
 ):
-    """Get raffles with specific filters. Managers and entities can view all raffles in their entity."""
+    """
+    Get raffles with specific filters. Managers and entities can view all raffles in their entity.
+    Raffles of archived projects are served from the archive.
+
+    `fields` narrows both the query and the payload. Large listings can also be requested in a
+    columnar layout (one array per field) and/or MessagePack through the Accept header.
+    """
+    selected_fields = parse_fields(fields, RaffleResponse)
     if isinstance(current_user, tuple):
         user, user_type = current_user
     else:
@@ -49,7 +101,13 @@ def get_raffles_filtered(
     # Build filters dict from RaffleFilters, excluding None and pagination fields
     filter_dict = {k: v for k, v in filters.model_dump().items() if v is not None and k not in ["limit", "offset"]}
     filter_dict["project_number"] = project_number  # Always filter by project_number
-    return get_records_filtered(db, Raffle, entity_id, filter_dict, filters.limit, filters.offset)
+    raffles = get_rows_filtered(db, Raffle, RaffleResponse, entity_id, filter_dict, filters.limit, filters.offset,
+                                selected_fields)
+    if not raffles:
+        archive = get_archived_project(db, entity_id, project_number)
+        if archive is not None:
+            raffles = archive.raffles(filter_dict, filters.limit, filters.offset)
+    return encode_rows(request, raffles, RaffleResponse, selected_fields) or raffles
 
 @router.put("/project/{project_number}/raffle", response_model=RaffleResponse)
 def update_raffle(
@@ -65,59 +123,189 @@ def update_raffle(
         user = current_user
         user_type = "entity"
     entity_id = user.entity_id if user_type == "manager" else user.id
-    raffle = get_record_by_composite_key(db, Raffle, entity_id, project_number=project_number, raffle_number=raffle_update.raffle_number)
-    if user_type == "manager" and raffle.sold_by_manager_number != user.manager_number:
-        raise HTTPException(status_code=403, detail="Managers can only update raffles they sold.")
+    # Managers can only touch raffles they sold: enforced inside the UPDATE itself
+    conditions = []
+    if user_type == "manager":
+        conditions.append(Raffle.sold_by_manager_number == user.manager_number)
     pk_fields = {'project_number': project_number, 'raffle_number': raffle_update.raffle_number}
     updates = {k: v for k, v in raffle_update.model_dump(exclude_unset=True).items()
                if k not in {'project_number', 'raffle_number'}}
-    return update_record_by_composite_key(db, Raffle, entity_id, updates, **pk_fields)
+    # A changed state, buyer or payment method moves the ticket in the buyers' stats and sales rollups
+    # (a revert takes it back)
+    in_raffle = (Raffle.project_number == project_number, Raffle.raffle_number == raffle_update.raffle_number)
+    purchases = get_buyer_purchases(db, entity_id, *in_raffle, lock=True)
+    sales = get_sales(db, entity_id, *in_raffle)
+
+    def record_change(_):
+        apply_buyer_purchases(db, entity_id, added=get_buyer_purchases(db, entity_id, *in_raffle), removed=purchases)
+        record_sales(db, entity_id, added=get_sales(db, entity_id, *in_raffle), removed=sales)
+
+    raffle = update_record_by_composite_key(db, Raffle, entity_id, updates, conditions=conditions,
+                                            denied_detail="Managers can only update raffles they sold.",
+                                            before_commit=record_change, **pk_fields)
+    bump_project_version(db, entity_id, project_number)
+    event_type = "reservation" if raffle.state == "reserved" else "state"
+    record_raffle_events(db, entity_id, project_number, [raffle.raffle_number], event_type, raffle.state,
+                         raffle.payment_method, raffle.buyer_number,
+                         user.manager_number if user_type == "manager" else None)
+    publish_project_event(entity_id, project_number, event_type,
+                          raffle_number=raffle.raffle_number, state=raffle.state,
+                          payment_method=raffle.payment_method, buyer_number=raffle.buyer_number)
+    return raffle
+
+def sell(db: Session, entity_id: int, project_number: int, raffle_number: int, sale_data: RaffleSell,
+         sold_by_manager_number: Optional[int], actor_manager_number: Optional[int] = None):
+    """Sell an available or reserved raffle, record it in the ledger and publish the sale"""
+    # Verify that the buyer belongs to the entity
+    get_record_by_composite_key(db, Buyer, entity_id, buyer_number=sale_data.buyer_number)
+
+    # Sale data
+    updates = {
+        "buyer_entity_id": entity_id,
+        "buyer_number": sale_data.buyer_number,
+        "payment_method": sale_data.payment_method,
+        "state": "sold"
+    }
+
+    # Track which manager made the sale
+    if sold_by_manager_number:
+        updates["sold_by_entity_id"] = entity_id
+        updates["sold_by_manager_number"] = sold_by_manager_number
+
+    # The buyer's stats and the sales rollups change in the sale's own transaction
+    in_raffle = (Raffle.project_number == project_number, Raffle.raffle_number == raffle_number)
+
+    def record_sale(_):
+        apply_buyer_purchases(db, entity_id, added=get_buyer_purchases(db, entity_id, *in_raffle))
+        record_sales(db, entity_id, added=get_sales(db, entity_id, *in_raffle))
+
+    # The availability check is part of the UPDATE, so two concurrent sales can't both win
+    raffle = update_record_by_composite_key(db, Raffle, entity_id, updates,
+                                            conditions=[Raffle.state.in_(["available", "reserved"])],
+                                            denied_status=400, denied_detail="Raffle is not available for sale",
+                                            before_commit=record_sale,
+                                            project_number=project_number, raffle_number=raffle_number)
+    bump_project_version(db, entity_id, project_number)
+    record_raffle_events(db, entity_id, project_number, [raffle_number], "sale", raffle.state,
+                         raffle.payment_method, raffle.buyer_number, actor_manager_number)
+    publish_project_event(entity_id, project_number, "sale", raffle_number=raffle_number,
+                          set_number=raffle.set_number, buyer_number=raffle.buyer_number,
+                          payment_method=raffle.payment_method, manager_number=raffle.sold_by_manager_number)
+    return raffle
+
 
 @router.post("/project/{project_number}/raffle/{raffle_number}/sell", response_model=RaffleResponse)
 def sell_raffle(
     project_number: int,
     raffle_number: int,
     sale_data: RaffleSell,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_entity_or_manager),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Sell a raffle assigning it to a buyer.
     Can be called by either entities or managers.
     If called by a manager, it automatically tracks who made the sale.
+    Send an Idempotency-Key header to make retries safe.
     """
-    # Get current user (entity or manager)
-    current_user, user_type = get_current_entity_or_manager(db=db)
+    user, user_type = current_user
 
     if user_type == "entity":
-        entity_id = current_user.id
+        entity_id = user.id
         sold_by_manager_number = sale_data.sold_by_manager_number  # Manual assignment
     elif user_type == "manager":
-        entity_id = current_user.entity_id
-        sold_by_manager_number = current_user.manager_number  # Auto-track the selling manager
+        entity_id = user.entity_id
+        sold_by_manager_number = user.manager_number  # Auto-track the selling manager
     else:
         raise HTTPException(status_code=403, detail="Invalid user type")
 
-    # Verify that the raffle belongs to the entity
-    raffle = get_record_by_composite_key(db, Raffle, entity_id,
-                                        project_number=project_number, raffle_number=raffle_number)
+    # Retries with the same Idempotency-Key replay the first sale's response
+    principal = f"{entity_id}:{user.manager_number if user_type == 'manager' else 0}"
+    return run_idempotent(idempotency_key, f"{principal}:sell:{project_number}:{raffle_number}", sale_data,
+                          RaffleResponse, lambda: sell(db, entity_id, project_number, raffle_number, sale_data,
+                                                       sold_by_manager_number,
+                                                       user.manager_number if user_type == "manager" else None))
 
-    # Verify that the buyer belongs to the entity
-    get_record_by_composite_key(db, Buyer, entity_id, buyer_number=sale_data.buyer_number)
 
-    if raffle.state not in ["available", "reserved"]:
-        raise HTTPException(status_code=400, detail="Raffle is not available for sale")
+@router.put("/project/{project_number}/raffles", response_model=RaffleBulkResult)
+def bulk_update_raffles(
+    project_number: int = Path(..., ge=1),
+    bulk_update: RaffleBulkUpdate = ...,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_entity_or_manager)
+):
+    """
+    Update many raffles of a project with a single UPDATE.
+    Setting a state reserves or releases unsold raffles; setting a payment method corrects sold ones.
+    Managers can only update raffles they sold. Raffles that couldn't be updated are reported as conflicts.
+    """
+    user, user_type = current_user
+    entity_id = user.entity_id if user_type == "manager" else user.id
 
-    # Update the raffle with sale data
-    raffle.buyer_entity_id = entity_id
-    raffle.buyer_number = sale_data.buyer_number
-    raffle.payment_method = sale_data.payment_method
-    raffle.state = "sold"
+    intervals = merge_raffle_selection(bulk_update.raffle_numbers, bulk_update.ranges)
+    requested = sum(end - start + 1 for start, end in intervals)
+    if requested > MAX_BULK_RAFFLES:
+        raise HTTPException(status_code=400, detail=f"You can update up to {MAX_BULK_RAFFLES} raffles at once")
 
-    # Track which manager made the sale
-    if sold_by_manager_number:
-        raffle.sold_by_entity_id = entity_id
-        raffle.sold_by_manager_number = sold_by_manager_number
+    selection = [Raffle.entity_id == entity_id, Raffle.project_number == project_number,
+                 raffle_selection_condition(intervals)]
+    if bulk_update.state:
+        values = {"state": bulk_update.state}
+        eligible = [Raffle.state.in_(["available", "reserved"])]
+    else:
+        values = {"payment_method": bulk_update.payment_method}
+        eligible = [Raffle.state == "sold"]
+    if user_type == "manager":
+        eligible.append(func.coalesce(Raffle.sold_by_manager_number, 0) == user.manager_number)
+
+    # Corrected payment methods move the sales between the rollups' payment methods
+    sales = get_sales(db, entity_id, *selection, *eligible, lock=True) if bulk_update.payment_method else None
 
+    result = db.execute(update(Raffle).where(*selection, *eligible).values(**values)
+                        .execution_options(synchronize_session=False))
+    updated = result.rowcount
+
+    # Conflicts are only looked up when some selected raffle wasn't updated
+    conflicts = []
+    if updated < requested:
+        rejected = db.execute(
+            select(Raffle.raffle_number, Raffle.state).where(*selection, not_(and_(*eligible)))
+        ).all()
+        for raffle_number, state in rejected:
+            if bulk_update.state:
+                reason = "sold" if state == "sold" else "forbidden"
+            else:
+                reason = "not_sold" if state != "sold" else "forbidden"
+            conflicts.append(RaffleBulkConflict(raffle_number=raffle_number, reason=reason))
+
+        if updated + len(rejected) < requested:
+            existing = set(db.execute(select(Raffle.raffle_number).where(*selection)).scalars())
+            conflicts.extend(RaffleBulkConflict(raffle_number=number, reason="not_found")
+                             for start, end in intervals for number in range(start, end + 1)
+                             if number not in existing)
+        conflicts.sort(key=lambda conflict: conflict.raffle_number)
+
+    if conflicts and bulk_update.all_or_nothing:
+        db.rollback()
+        raise HTTPException(status_code=409, detail={
+            "message": "Some raffles can't be updated, nothing was changed",
+            "conflicts": [conflict.model_dump() for conflict in conflicts]
+        })
+
+    if sales:
+        record_sales(db, entity_id, added=get_sales(db, entity_id, *selection, *eligible), removed=sales)
     db.commit()
-    db.refresh(raffle)
-    return raffle
+    if updated:
+        bump_project_version(db, entity_id, project_number)
+        event_type = {"reserved": "reservation", "available": "state"}.get(bulk_update.state, "payment")
+        rejected_numbers = {conflict.raffle_number for conflict in conflicts}
+        record_raffle_events(db, entity_id, project_number,
+                             (number for start, end in intervals for number in range(start, end + 1)
+                              if number not in rejected_numbers),
+                             event_type, bulk_update.state or "sold", bulk_update.payment_method,
+                             actor_manager_number=user.manager_number if user_type == "manager" else None)
+        publish_project_event(entity_id, project_number, event_type,
+                              ranges=[[start, end] for start, end in intervals], updated=updated,
+                              state=bulk_update.state, payment_method=bulk_update.payment_method)
+    return RaffleBulkResult(requested=requested, updated=updated, conflicts=conflicts)
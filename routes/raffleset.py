@@ -1,91 +1,127 @@
-from fastapi import APIRouter, Depends, Path, HTTPException
+from fastapi import APIRouter, Depends, Path, HTTPException, Header
+from sqlalchemy import delete, exists
 from sqlalchemy.orm import Session
-from database.connection import get_db
+from database.connection import get_db, get_read_db
 from models.entity import Entity
 from models.raffleset import RaffleSet
 from models.raffle import Raffle
 from models.project import Project
 from schemas.raffleset import RaffleSetCreate, RaffleSetUpdate, RaffleSetResponse
-from routes import (get_records_filtered, create_record, update_record_by_composite_key, delete_record,
-                   get_record_by_composite_key, get_next_set_number, get_next_raffle_number)
-from typing import List
+from routes import (get_rows_filtered, create_record, update_record_by_composite_key,
+                   delete_record_by_composite_key, get_record_by_composite_key, get_next_set_number,
+                   get_next_raffle_number, get_key_conditions, bump_project_version)
+from typing import List, Optional
 from auth.services.entity_auth_service import get_current_entity
+from core.idempotency import run_idempotent
+from routes.archive import get_archived_project, is_project_archived
+from routes.buyer import get_buyer_purchases, apply_buyer_purchases
+from routes.sales import delete_set_sales
 
 router = APIRouter()
 
+
+def remove_set_sales(db: Session, entity_id: int, project_number: int, set_number: int, purchases):
+    """Take a deleted set's sales out of its buyers' stats and the sales rollups"""
+    apply_buyer_purchases(db, entity_id, removed=purchases)
+    delete_set_sales(db, entity_id, project_number, set_number)
+
+
 @router.post("/project/{project_number}/raffleset", response_model=RaffleSetResponse)
 def create_raffle_set(
     project_number: int = Path(..., ge=1),
     raffle_set: RaffleSetCreate = ...,
     db: Session = Depends(get_db),
-    current_entity: Entity = Depends(get_current_entity)
+    current_entity: Entity = Depends(get_current_entity),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Create a new raffle set and its associated raffles."""
-    # Verify that the project belongs to the entity
-    get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
+    """
+    Create a new raffle set and its associated raffles.
+    Send an Idempotency-Key header to make retries safe.
+    """
+    def create():
+        # Verify that the project belongs to the entity
+        get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
+        if is_project_archived(db, current_entity.id, project_number):
+            raise HTTPException(status_code=409, detail="Project is archived")
+
+        # Get next set number for this project
+        set_number = get_next_set_number(db, current_entity.id, project_number)
 
-    # Get next set number for this project
-    set_number = get_next_set_number(db, current_entity.id, project_number)
-
-    # Calculate init and final based on existing raffles in this project
-    last_raffle_number = get_next_raffle_number(db, current_entity.id, project_number) - 1
-    init_number = last_raffle_number + 1
-    final_number = init_number + raffle_set.quantity - 1
-
-    # Create the raffle set
-    new_raffle_set = RaffleSet(
-        entity_id=current_entity.id,
-        project_number=project_number,
-        set_number=set_number,
-        name=raffle_set.name,
-        type=raffle_set.type,
-        init=init_number,
-        final=final_number,
-        unit_price=raffle_set.unit_price
-    )
-
-    created_set = create_record(db, new_raffle_set)
-
-    # Create individual raffles for this set
-    for raffle_num in range(init_number, final_number + 1):
-        new_raffle = Raffle(
+        # Calculate init and final based on existing raffles in this project
+        last_raffle_number = get_next_raffle_number(db, current_entity.id, project_number) - 1
+        init_number = last_raffle_number + 1
+        final_number = init_number + raffle_set.quantity - 1
+
+        # Create the raffle set
+        new_raffle_set = RaffleSet(
             entity_id=current_entity.id,
             project_number=project_number,
-            raffle_number=raffle_num,
             set_number=set_number,
-            state="available"
+            name=raffle_set.name,
+            type=raffle_set.type,
+            init=init_number,
+            final=final_number,
+            unit_price=raffle_set.unit_price
         )
-        db.add(new_raffle)
 
-    db.commit()
-    return created_set
+        created_set = create_record(db, new_raffle_set)
+
+        # Create individual raffles for this set
+        for raffle_num in range(init_number, final_number + 1):
+            new_raffle = Raffle(
+                entity_id=current_entity.id,
+                project_number=project_number,
+                raffle_number=raffle_num,
+                set_number=set_number,
+                state="available"
+            )
+            db.add(new_raffle)
+
+        db.commit()
+        bump_project_version(db, current_entity.id, project_number)
+        return created_set
+
+    return run_idempotent(idempotency_key, f"{current_entity.id}:0:create_raffle_set:{project_number}", raffle_set,
+                          RaffleSetResponse, create)
 
 @router.get("/project/{project_number}/raffleset/{set_number}", response_model=RaffleSetResponse)
 def get_raffle_set(
     project_number: int = Path(..., ge=1),
     set_number: int = Path(..., ge=1),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
-    """Get a specific raffle set by project and set number."""
-    return get_record_by_composite_key(db, RaffleSet, current_entity.id,
-                                      project_number=project_number, set_number=set_number)
+    """Get a specific raffle set by project and set number. Sets of archived projects are served from the archive."""
+    raffle_set = db.query(RaffleSet).filter(*get_key_conditions(RaffleSet, current_entity.id,
+                                                                 project_number=project_number,
+                                                                 set_number=set_number)).first()
+    if raffle_set is None:
+        archive = get_archived_project(db, current_entity.id, project_number)
+        raffle_set = archive.raffle_set(set_number) if archive else None
+        if raffle_set is None:
+            raise HTTPException(status_code=404, detail="RaffleSet not found")
+    return raffle_set
 
 @router.get("/project/{project_number}/rafflesets", response_model=List[RaffleSetResponse])
 def get_raffle_sets_by_project(
     project_number: int = Path(..., ge=1),
     limit: int = 0,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
-    """Get all raffle sets for a specific project."""
+    """Get all raffle sets for a specific project. Sets of archived projects are served from the archive."""
     # Verify project belongs to entity
     get_record_by_composite_key(db, Project, current_entity.id, project_number=project_number)
 
     # Get raffle sets with project filter
-    return get_records_filtered(db, RaffleSet, current_entity.id,
-                               {"project_number": project_number}, limit, offset)
+    raffle_sets = get_rows_filtered(db, RaffleSet, RaffleSetResponse, current_entity.id,
+                                    {"project_number": project_number}, limit, offset)
+    if not raffle_sets:
+        archive = get_archived_project(db, current_entity.id, project_number)
+        if archive is not None:
+            return archive.raffle_sets[offset:offset + limit if limit > 0 else None]
+    return raffle_sets
 
 @router.put("/project/{project_number}/raffleset", response_model=RaffleSetResponse)
 def update_raffle_set(
@@ -94,11 +130,25 @@ def update_raffle_set(
     db: Session = Depends(get_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
-    """Update an existing raffle set."""
+    """
+    Update an existing raffle set. The unit price can't change once raffles are sold: buyers' stats
+    and sales rollups keep the amounts sales were made for.
+    """
     pk_fields = {'project_number': project_number, 'set_number': raffle_set_update.set_number}
     updates = {k: v for k, v in raffle_set_update.model_dump(exclude_unset=True).items()
                if k not in {'project_number', 'set_number'}}
-    return update_record_by_composite_key(db, RaffleSet, current_entity.id, updates, **pk_fields)
+    conditions = []
+    if "unit_price" in updates:
+        conditions.append(~exists().where(Raffle.entity_id == RaffleSet.entity_id,
+                                          Raffle.project_number == RaffleSet.project_number,
+                                          Raffle.set_number == RaffleSet.set_number, Raffle.state == "sold"))
+    raffle_set = update_record_by_composite_key(db, RaffleSet, current_entity.id, updates, conditions=conditions,
+                                                denied_status=409,
+                                                denied_detail="The raffle set has sold raffles, its unit price "
+                                                              "can't change",
+                                                **pk_fields)
+    bump_project_version(db, current_entity.id, project_number)
+    return raffle_set
 
 @router.delete("/project/{project_number}/raffleset/{set_number}")
 def delete_raffle_set(
@@ -107,7 +157,15 @@ def delete_raffle_set(
     db: Session = Depends(get_db),
     current_entity: Entity = Depends(get_current_entity)
 ):
-    """Delete a raffle set and all its associated raffles."""
-    raffle_set = get_record_by_composite_key(db, RaffleSet, current_entity.id,
-                                            project_number=project_number, set_number=set_number)
-    return delete_record(db, raffle_set, current_entity.id)
+    """Delete a raffle set and all its associated raffles, taking its sales out of buyers' stats and sales reports."""
+    purchases = get_buyer_purchases(db, current_entity.id, Raffle.project_number == project_number,
+                                    Raffle.set_number == set_number, lock=True)
+    # Databases created from older models have no ON DELETE CASCADE here: delete the raffles in the same transaction
+    db.execute(delete(Raffle).where(Raffle.entity_id == current_entity.id, Raffle.project_number == project_number,
+                                    Raffle.set_number == set_number).execution_options(synchronize_session=False))
+    result = delete_record_by_composite_key(
+        db, RaffleSet, current_entity.id,
+        before_commit=lambda: remove_set_sales(db, current_entity.id, project_number, set_number, purchases),
+        project_number=project_number, set_number=set_number)
+    bump_project_version(db, current_entity.id, project_number)
+    return result
@@ -0,0 +1,144 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database.connection import get_read_db
+from auth.services.entity_auth_service import get_current_entity
+from models.entity import Entity
+from models.raffle import Raffle
+from models.raffleset import RaffleSet
+from models.sales_rollup import SalesRollup
+from schemas.raffle import SalesBucketResponse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Literal, Optional, Tuple
+
+router = APIRouter()
+
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+DIMENSIONS = ("project_number", "set_number", "manager_number", "payment_method")
+
+# Upper bound of buckets in one report (a year of hours)
+MAX_REPORT_BUCKETS = 24 * 366
+
+# project_number, set_number, manager_number (0: the entity), payment_method ('': none)
+SalesKey = Tuple[int, int, int, str]
+
+
+def get_sales(db: Session, entity_id: int, *conditions, lock: bool = False) -> Dict[SalesKey, Tuple[int, int]]:
+    """Tickets and amount of the entity's sold raffles matching the conditions, per rollup dimensions"""
+    key = (Raffle.project_number, Raffle.set_number, func.coalesce(Raffle.sold_by_manager_number, 0),
+           func.coalesce(Raffle.payment_method, ""))
+    query = (
+        select(*key, func.count(), func.sum(RaffleSet.unit_price))
+        .join(RaffleSet, and_(RaffleSet.entity_id == Raffle.entity_id,
+                              RaffleSet.project_number == Raffle.project_number,
+                              RaffleSet.set_number == Raffle.set_number))
+        .where(Raffle.entity_id == entity_id, Raffle.state == "sold", *conditions)
+        .group_by(*key)
+    )
+    if lock:
+        query = query.with_for_update()
+    return {tuple(row[:4]): (row[4], int(row[5] or 0)) for row in db.execute(query)}
+
+
+def get_bucket_start(moment: datetime, period: str) -> datetime:
+    """Start of the hour or day (UTC) a moment falls in"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if period == "day" else moment
+
+
+def record_sales(db: Session, entity_id: int, added: Optional[Dict[SalesKey, Tuple[int, int]]] = None,
+                 removed: Optional[Dict[SalesKey, Tuple[int, int]]] = None):
+    """
+    Add sales, and take back reverted ones, in the current hour and day buckets.
+    Runs in the caller's transaction, so the rollups only change when the raffles do.
+    """
+    changes = defaultdict(lambda: [0, 0])
+    for sign, sales in ((1, added or {}), (-1, removed or {})):
+        for key, (tickets, amount) in sales.items():
+            changes[key][0] += sign * tickets
+            changes[key][1] += sign * amount
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for (project_number, set_number, manager_number, payment_method), (tickets, amount) in changes.items():
+        if not tickets and not amount:
+            continue
+        for period in PERIODS:
+            bucket = {"entity_id": entity_id, "period": period, "bucket_start": get_bucket_start(now, period),
+                      "project_number": project_number, "set_number": set_number,
+                      "manager_number": manager_number, "payment_method": payment_method}
+            add = (update(SalesRollup)
+                   .where(*(getattr(SalesRollup, name) == value for name, value in bucket.items()))
+                   .values(tickets=SalesRollup.tickets + tickets, amount=SalesRollup.amount + amount)
+                   .execution_options(synchronize_session=False))
+            if db.execute(add).rowcount:
+                continue
+            try:
+                with db.begin_nested():
+                    db.add(SalesRollup(**bucket, tickets=tickets, amount=amount))
+            except IntegrityError:
+                # Created by another transaction meanwhile: add to it instead
+                db.execute(add)
+
+
+def delete_set_sales(db: Session, entity_id: int, project_number: int, set_number: int):
+    """Forget a deleted raffle set's sales in every bucket, in the caller's transaction"""
+    db.execute(delete(SalesRollup).where(SalesRollup.entity_id == entity_id,
+                                         SalesRollup.project_number == project_number,
+                                         SalesRollup.set_number == set_number)
+               .execution_options(synchronize_session=False))
+
+
+@router.get("/sales", response_model=List[SalesBucketResponse])
+def get_sales_report(
+    since: datetime = Query(..., description="Start of the range (UTC, inclusive)"),
+    until: datetime = Query(..., description="End of the range (UTC, exclusive)"),
+    period: Literal["hour", "day"] = "day",
+    group_by: Optional[str] = Query(None, description="Comma-separated dimensions to split by: "
+                                                     "project_number, set_number, manager_number, payment_method"),
+    project_number: Optional[int] = Query(None, ge=1),
+    set_number: Optional[int] = Query(None, ge=1),
+    manager_number: Optional[int] = Query(None, ge=0, description="0 for sales made by the entity itself"),
+    payment_method: Optional[Literal["cash", "card", "transfer"]] = None,
+    db: Session = Depends(get_read_db),
+    current_entity: Entity = Depends(get_current_entity)
+):
+    """
+    Net tickets and amount sold per hour or day (UTC) in buckets starting within a range, optionally
+    split by project, set, manager and payment method. Reverted sales count in the bucket they were reverted in.
+    Only the range's rollup rows are read, so the cost grows with the buckets, not with the raffles sold.
+    Buckets without sales are left out.
+    """
+    dimensions = [name.strip() for name in (group_by or "").split(",") if name.strip()]
+    unknown = [name for name in dimensions if name not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimensions: {', '.join(unknown)}")
+    since, until = [moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+                    for moment in (since, until)]
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if (until - since) / PERIODS[period] > MAX_REPORT_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"A report can span up to {MAX_REPORT_BUCKETS} buckets")
+
+    filters = [SalesRollup.entity_id == current_entity.id, SalesRollup.period == period,
+               SalesRollup.bucket_start >= since, SalesRollup.bucket_start < until]
+    for name, value in (("project_number", project_number), ("set_number", set_number),
+                        ("manager_number", manager_number), ("payment_method", payment_method)):
+        if value is not None:
+            filters.append(getattr(SalesRollup, name) == value)
+
+    columns = [SalesRollup.bucket_start] + [getattr(SalesRollup, name) for name in DIMENSIONS if name in dimensions]
+    rows = db.query(
+        *columns,
+        func.sum(SalesRollup.tickets).label("tickets"),
+        func.sum(SalesRollup.amount).label("amount")
+    ).filter(*filters).group_by(*columns).order_by(*columns)
+
+    report = []
+    for row in rows:
+        bucket = row._asdict()
+        if bucket.get("payment_method") == "":
+            bucket["payment_method"] = None
+        report.append(bucket)
+    return report
@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional
+
+# Upper bound for the operations of a single batch
+MAX_BATCH_OPERATIONS = 50
+
+class BatchOperation(BaseModel):
+    """A request to one of the API's routes, run as part of a batch"""
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    path: str = Field(..., pattern=r"^/", max_length=2000, description="Path and query string, e.g. /project/1/raffles?fields=state")
+    body: Optional[Any] = None
+    idempotency_key: Optional[str] = Field(None, max_length=255, description="Sent as the Idempotency-Key header")
+
+class BatchRequest(BaseModel):
+    """Schema for running several operations with one principal and one database session"""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
+    all_or_nothing: bool = Field(False, description="Run every operation in one transaction, stopping at the first failure")
+
+class BatchResult(BaseModel):
+    """Status and body of one operation"""
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    """Schema for batch response, with one result per operation in order"""
+    committed: bool
+    results: List[BatchResult]
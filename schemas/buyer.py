@@ -39,4 +39,9 @@ class BuyerResponse(BaseModel):
     created_by_manager_number: Optional[int]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BuyerWithStatsResponse(BuyerResponse):
+    """Schema for buyer listings: the buyer plus their purchase totals"""
+    tickets_bought: int = 0
+    total_spent: int = 0
@@ -0,0 +1,40 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+# Upper bound of winners per draw
+MAX_DRAW_WINNERS = 1000
+
+class DrawCreate(BaseModel):
+    """Schema for running a new draw"""
+    winners: int = Field(1, ge=1, le=MAX_DRAW_WINNERS, description="Number of distinct winning raffles")
+    set_number: Optional[int] = Field(None, ge=1, description="Draw only among this set's sold raffles")
+    seed: Optional[str] = Field(None, min_length=8, max_length=64, pattern=r'^[A-Za-z0-9_\-]+$',
+                                description="Seed to use, e.g. published beforehand. Random if omitted")
+
+class DrawWinnerResponse(BaseModel):
+    """Schema for a draw winner"""
+    position: int
+    raffle_number: int
+    buyer_number: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+class DrawResponse(BaseModel):
+    """Schema for draw response"""
+    entity_id: int
+    project_number: int
+    draw_number: int
+    set_number: Optional[int]
+    seed: str
+    algorithm: str
+    winners_count: int
+    sold_count: int
+    range_start: int
+    range_end: int
+    created_at: datetime
+    winners: List[DrawWinnerResponse]
+
+    class Config:
+        from_attributes = True
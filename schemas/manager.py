@@ -15,7 +15,7 @@ class ManagerUpdate(BaseModel):
 
     @model_validator(mode="after")
     def check_valid_fields(self):
-        if not any([self.username, self.is_active]):
+        if not self.username and self.is_active is None:
             raise ValueError("You must modify/update at least one value.")
         return self
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ProjectCreate(BaseModel):
@@ -30,3 +30,41 @@ class ProjectResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ProjectArchiveResponse(BaseModel):
+    """Schema for an archived project's summary"""
+    entity_id: int
+    project_number: int
+    format: str
+    raffle_sets_count: int
+    raffles_count: int
+    size_bytes: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class RaffleSetSummary(BaseModel):
+    """A raffle set with its raffles counted by state"""
+    set_number: int
+    name: str
+    type: str
+    init: int
+    final: int
+    unit_price: int
+    available: int
+    reserved: int
+    sold: int
+    revenue: int  # sold * unit_price
+
+class ProjectDashboardResponse(BaseModel):
+    """Schema for a project with its sets and sales progress, in one response"""
+    project: ProjectResponse
+    version: int  # Changes whenever the project's sets or raffles do
+    archived: bool
+    raffles: int
+    available: int
+    reserved: int
+    sold: int
+    revenue: int
+    raffle_sets: List[RaffleSetSummary]
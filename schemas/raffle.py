@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime
 
 class RaffleCreate(BaseModel):
@@ -57,3 +57,76 @@ class RaffleResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class RaffleEventResponse(BaseModel):
+    """Schema for a sales ledger entry"""
+    id: int
+    project_number: int
+    raffle_number: int
+    event_type: str
+    state: str
+    payment_method: Optional[str]
+    buyer_number: Optional[int]
+    actor_type: str
+    actor_manager_number: Optional[int]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class SalesBucketResponse(BaseModel):
+    """Schema for one bucket of a sales report: dimensions it isn't split by are null"""
+    bucket_start: datetime
+    project_number: Optional[int] = None
+    set_number: Optional[int] = None
+    manager_number: Optional[int] = None  # 0 for sales made by the entity itself
+    payment_method: Optional[str] = None
+    tickets: int
+    amount: int
+
+# Upper bound for a single bulk operation (a few 10k-ticket booklets)
+MAX_BULK_RAFFLES = 50000
+# Upper bound for the ranges of a single bulk operation, checked before merging them
+MAX_BULK_RANGES = 1000
+
+class RaffleRange(BaseModel):
+    """Inclusive range of raffle numbers"""
+    start: int = Field(..., ge=1)
+    end: int = Field(..., ge=1)
+
+    @model_validator(mode="after")
+    def check_valid_range(self):
+        if self.start > self.end:
+            raise ValueError("Range start must be lower or equal than range end.")
+        return self
+
+class RaffleBulkUpdate(BaseModel):
+    """Schema for updating many raffles of a project at once"""
+    raffle_numbers: List[int] = Field(default_factory=list, max_length=MAX_BULK_RAFFLES,
+                                      description="Individual raffle numbers")
+    ranges: List[RaffleRange] = Field(default_factory=list, max_length=MAX_BULK_RANGES,
+                                      description="Inclusive raffle number ranges")
+    state: Optional[Literal["available", "reserved"]] = Field(None, description="Target state for unsold raffles")
+    payment_method: Optional[Literal["cash", "card", "transfer"]] = Field(None, description="Payment method for sold raffles")
+    all_or_nothing: bool = Field(False, description="Don't update anything if any raffle conflicts")
+
+    @model_validator(mode="after")
+    def check_valid_fields(self):
+        if not self.raffle_numbers and not self.ranges:
+            raise ValueError("You must select at least one raffle number or range.")
+        if bool(self.state) == bool(self.payment_method):
+            raise ValueError("You must set either a state or a payment method.")
+        if any(number < 1 for number in self.raffle_numbers):
+            raise ValueError("Raffle numbers must be greater than 0.")
+        return self
+
+class RaffleBulkConflict(BaseModel):
+    """A selected raffle that couldn't be updated"""
+    raffle_number: int
+    reason: Literal["not_found", "sold", "not_sold", "forbidden"]
+
+class RaffleBulkResult(BaseModel):
+    """Schema for bulk update response"""
+    requested: int
+    updated: int
+    conflicts: List[RaffleBulkConflict]